@@ -0,0 +1,93 @@
+"""
+専門エージェントが呼び出せるツール定義
+Claude の tool use で計算処理をモデルではなくコード側で決定的に行う
+"""
+import json
+import logging
+from typing import Dict
+
+import deadline_calculator
+import subsidy_calculator
+
+logger = logging.getLogger(__name__)
+
+CALCULATE_DEADLINE_TOOL = {
+    "name": "calculate_deadline",
+    "description": (
+        "助成金の申請期限・期間を民法の期間計算（初日不算入、応当日の前日満了、応当日がない月は末日満了）に従って計算する。"
+        "期限・期間・前日・翌日に関する日付は必ずこのツールで計算し、結果の日付をそのまま回答に使うこと。"
+        "operation: within=基準日から○ヶ月/○日以内, window=基準日から○ヶ月経過後○ヶ月以内, "
+        "add_months=○ヶ月後の応当日, previous_day=前日, next_day=翌日"
+    ),
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "operation": {
+                "type": "string",
+                "enum": ["within", "window", "add_months", "previous_day", "next_day"]
+            },
+            "base_date": {"type": "string", "description": "基準日（YYYY-MM-DD）"},
+            "months": {"type": "integer", "description": "within/add_months の月数"},
+            "days": {"type": "integer", "description": "within の日数"},
+            "after_months": {"type": "integer", "description": "window の「○ヶ月経過後」の月数"},
+            "within_months": {"type": "integer", "description": "window の「○ヶ月以内」の月数"},
+            "include_base_day": {"type": "boolean", "description": "基準日当日を期間に含める場合はtrue（「○日から起算して」等）"}
+        },
+        "required": ["operation", "base_date"]
+    }
+}
+
+CALCULATE_SUBSIDY_AMOUNT_TOOL = {
+    "name": "calculate_subsidy_amount",
+    "description": (
+        "令和7年度の業務改善助成金・キャリアアップ助成金の支給額・上限額を交付要綱・支給要領の支給額表に基づいて計算する。"
+        "支給額・上限額・助成率に関する質問では必ずこのツールで計算し、結果の金額をそのまま回答に使うこと。"
+        "subsidy=gyoumukaizen: wage_increase, raised_workers, workplace_employees が必須（current_min_wage, eligible_cost, special_business は任意）。"
+        "subsidy=career_up: course（seishain/chingin_kaitei/kyotsuka/shoyo_taishoku）が必須"
+    ),
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "subsidy": {"type": "string", "enum": ["gyoumukaizen", "career_up"]},
+            "wage_increase": {"type": "integer", "description": "事業場内最低賃金の引上げ額（円）"},
+            "raised_workers": {"type": "integer", "description": "引上げ労働者数"},
+            "workplace_employees": {"type": "integer", "description": "事業場規模（事業場の労働者数）"},
+            "current_min_wage": {"type": "integer", "description": "引上げ前の事業場内最低賃金（円）"},
+            "eligible_cost": {"type": "integer", "description": "助成対象経費（円）"},
+            "special_business": {"type": "boolean", "description": "特例事業者に該当する場合はtrue"},
+            "course": {"type": "string", "enum": ["seishain", "chingin_kaitei", "kyotsuka", "shoyo_taishoku"]},
+            "is_sme": {"type": "boolean", "description": "中小企業事業主ならtrue"},
+            "workers": {"type": "integer", "description": "対象労働者数"},
+            "conversion_type": {"type": "string", "enum": ["yuki", "muki"], "description": "有期→正規はyuki、無期→正規はmuki"},
+            "priority_target": {"type": "boolean", "description": "重点支援対象者ならtrue"},
+            "raise_rate": {"type": "number", "description": "賃金規定等の増額改定率（%）"},
+            "additions": {
+                "type": "array",
+                "items": {"type": "string", "enum": ["new_conversion_system", "diverse_regular_system", "job_evaluation", "raise_system", "both_introduced"]}
+            }
+        },
+        "required": ["subsidy"]
+    }
+}
+
+AGENT_TOOLS = [CALCULATE_DEADLINE_TOOL, CALCULATE_SUBSIDY_AMOUNT_TOOL]
+
+_TOOL_HANDLERS = {
+    "calculate_deadline": lambda tool_input: deadline_calculator.calculate(**tool_input),
+    "calculate_subsidy_amount": lambda tool_input: subsidy_calculator.calculate(**tool_input),
+}
+
+
+def execute_tool(name: str, tool_input: Dict) -> str:
+    """ツールを実行し、tool_result に渡すJSON文字列を返す（失敗時はエラー内容を返す）"""
+    handler = _TOOL_HANDLERS.get(name)
+    if handler is None:
+        return json.dumps({"error": f"Unknown tool: {name}"}, ensure_ascii=False)
+
+    try:
+        result = handler(tool_input or {})
+        logger.info(f"Tool executed: {name}")
+        return json.dumps(result, ensure_ascii=False)
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Tool {name} failed: {str(e)}")
+        return json.dumps({"error": str(e)}, ensure_ascii=False)
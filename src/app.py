@@ -1,8 +1,11 @@
-from flask import Flask, render_template, request, jsonify, session, send_from_directory, redirect
+from flask import Flask, render_template, request, jsonify, session, send_from_directory, redirect, Response, stream_with_context, g
 from flask_cors import CORS
 import os
 import sys
+import re
 import time
+import uuid
+import json
 from dotenv import load_dotenv
 # srcディレクトリをPythonパスに追加
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -10,11 +13,14 @@ import logging
 
 load_dotenv()
 
-logging.basicConfig(level=logging.INFO)
+from logging_config import configure_logging, init_request_id, log_event
+from request_pipeline import RequestPipeline, SERVER_TIMING_HEADER
+from write_behind import write_behind
+configure_logging()
 logger = logging.getLogger(__name__)
 
 try:
-    from auth_middleware import require_auth, check_usage_limit, get_current_user, get_usage_stats, AuthService
+    from auth_middleware import require_auth, check_usage_limit, get_current_user, get_usage_stats, get_current_subscription, commit_question_usage, check_usage_limit_deferred, reserve_question_usage, activate_question_usage, commit_reservation, AuthService
     from stripe_service import StripeService
     from models.subscription import SubscriptionService
     from firebase_config import firebase_service
@@ -35,9 +41,22 @@ except Exception as e:
         return {'user_id': 'guest', 'id': 'guest', 'email': 'guest@example.com'}
     def get_usage_stats():
         return {'current_usage': 0, 'limit': 1000, 'reset_date': None}
+    def get_current_subscription():
+        return None
+    def commit_question_usage():
+        return get_usage_stats()
+    def check_usage_limit_deferred(f):
+        return f
+    def reserve_question_usage(user):
+        return {'success': True, 'committed': True, 'usage_stats': get_usage_stats()}
+    def activate_question_usage(reservation):
+        return None
+    def commit_reservation(reservation):
+        return reservation['usage_stats']
 
 app = Flask(__name__, template_folder='../templates', static_folder='../static')
 app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-here')
+init_request_id(app)
 
 # CORS設定
 CORS(app, resources={r"/api/*": {"origins": "*"}})
@@ -133,36 +152,78 @@ def debug_auth_status():
     
     return jsonify(debug_info)
 
-# サービスの遅延初期化
-claude_service = None
-auth_service = None
-stripe_service = None
-subscription_service = None
+# サービスはプロセスごとに1回だけ生成して共有（service_container 参照）
+from service_container import services, warm_services_on_boot
 
 def get_claude_service():
-    global claude_service
-    if claude_service is None:
-        from claude_service import ClaudeService
-        claude_service = ClaudeService()
-    return claude_service
+    return services.get('claude')
+
+def is_error_response(response):
+    """AIの応答が ClaudeService のエラー案内文かどうか（質問枠の確定・会話保存の判定用）"""
+    from claude_service import is_error_response as _is_error_response
+    return _is_error_response(response)
 
 def get_auth_service():
-    global auth_service
-    if auth_service is None:
-        auth_service = AuthService()
-    return auth_service
+    return services.get('auth')
 
 def get_stripe_service():
-    global stripe_service
-    if stripe_service is None:
-        stripe_service = StripeService()
-    return stripe_service
+    return services.get('stripe')
 
 def get_subscription_service():
-    global subscription_service
-    if subscription_service is None:
-        subscription_service = SubscriptionService(firebase_service)
-    return subscription_service
+    return services.get('subscription')
+
+def get_user_service():
+    return services.get('user')
+
+def get_subsidy_service():
+    return services.get('subsidy')
+
+def get_conversation_service():
+    return services.get('conversation')
+
+if AUTH_ENABLED:
+    # 初回リクエストで import・クライアント生成が走らないよう起動時に生成しておく
+    warm_services_on_boot()
+
+# レート制限（同一コンテナ内の全ワーカーで共有。rate_limiter 参照）
+from rate_limiter import rate_limiter
+
+def _rate_limit_uid():
+    """認証済みエンドポイントはユーザーごとに制限（require_auth の後に適用する）"""
+    return getattr(g, 'uid', None)
+
+# 決済セッション作成は全エンドポイント合計でユーザーごとに10分20回まで
+checkout_rate_limit = rate_limiter.limit(20, 600, scope='checkout', key_func=_rate_limit_uid)
+
+# 条件付きGET（ダッシュボードが繰り返し取得する一覧APIは、変更がなければ 304 を返す）
+from conditional_response import conditional_get, counter_version
+from resource_versions import CONVERSATIONS, SUBSIDIES, AI_RESULTS
+
+def _subsidies_version():
+    """助成金メモは Firebase UID とデータベースのユーザーIDの両方で保存されている場合がある"""
+    current_user = get_current_user()
+    versions = services.get('resource_versions')
+    user_ids = dict.fromkeys(filter(None, [current_user.get('user_id'), current_user.get('id')]))
+    parts = [versions.get(user_id, SUBSIDIES) for user_id in user_ids]
+    return None if not parts or None in parts else '-'.join(str(part) for part in parts)
+
+def _auth_user_version():
+    """認証時に取得済みのユーザー情報と、サブスクリプションの更新時刻"""
+    import hashlib
+    current_user = get_current_user()
+    user_id = current_user.get('user_id') or current_user.get('id')
+    subscription_version = get_subscription_service().get_subscription_version(
+        user_id, current_user.get('active_subscription_id')
+    )
+    if subscription_version is None:
+        return None
+    user_digest = hashlib.sha1(json.dumps(current_user, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return f"{user_digest}-{subscription_version}"
+
+def _forms_version():
+    """申請書類情報は subsidy_forms.json から作るのでファイルの更新時刻とサイズ"""
+    stat = os.stat(os.path.join(os.path.dirname(__file__), 'subsidy_forms.json'))
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
 
 @app.route('/')
 def index():
@@ -223,14 +284,10 @@ def chat():
         # Claude APIに質問を送信（エージェントタイプも渡す）
         response = get_claude_service().get_grant_consultation(company_info, question, agent_type)
         
-        # 質問使用回数を増加
-        result = get_subscription_service().use_question(current_user.get('user_id') or current_user['id'])
-        
-        if not result['success']:
-            logger.error(f"Failed to record question usage: {result.get('error')}")
-        
-        # 最新の使用状況を取得
-        updated_usage = get_subscription_service().get_usage_stats(current_user.get('user_id') or current_user['id'])
+        # AIエラーでなければ仮押さえした質問枠を確定（エラー時は check_usage_limit が解除）
+        updated_usage = usage_stats
+        if not is_error_response(response):
+            updated_usage = commit_question_usage()
         
         return jsonify({
             'response': response,
@@ -287,220 +344,141 @@ def grant_check():
         logger.error(f"Error in grant check endpoint: {str(e)}")
         return jsonify({'error': 'サーバーエラーが発生しました'}), 500
 
-# 削除済み: _load_joseikin_knowledge() 関数は不正確なハードコードデータを使用していたため削除
+# 一括スクリーニング（社労士事務所向け・LLM不使用）
+try:
+    from bulk_screening import BulkScreeningService
+    bulk_screening_service = BulkScreeningService()
+    BULK_SCREENING_ENABLED = True
+except Exception as e:
+    logger.error(f"Bulk screening module failed to load: {str(e)}")
+    BULK_SCREENING_ENABLED = False
 
-# 利用制限管理（メモリベース、本格運用時はRedis推奨）
-diagnosis_rate_limit = {}
+@app.route('/api/grant-check/bulk', methods=['POST'])
+@require_auth
+def grant_check_bulk():
+    """顧問先企業の一括助成金判定（CSV/JSONLを受け取り結果表をストリーミング返却）"""
+    if not BULK_SCREENING_ENABLED:
+        return jsonify({'error': '一括スクリーニング機能が利用できません'}), 500
 
-def _check_diagnosis_rate_limit(client_ip):
-    """診断の利用制限チェック（1日あたり5回まで）"""
-    import time
-    current_time = time.time()
-    
-    # 1日以上前の記録を削除
-    if client_ip in diagnosis_rate_limit:
-        diagnosis_rate_limit[client_ip] = [
-            timestamp for timestamp in diagnosis_rate_limit[client_ip] 
-            if current_time - timestamp < 86400  # 1日 = 86400秒
-        ]
-    
-    # 現在の利用回数をチェック
-    usage_count = len(diagnosis_rate_limit.get(client_ip, []))
-    
-    if usage_count >= 5:  # 1日あたり5回制限
-        return False
-    
-    # 利用記録を追加
-    if client_ip not in diagnosis_rate_limit:
-        diagnosis_rate_limit[client_ip] = []
-    diagnosis_rate_limit[client_ip].append(current_time)
-    
-    return True
+    try:
+        # multipartのファイルアップロードと生ボディの両方に対応
+        upload = request.files.get('file')
+        if upload:
+            text = upload.read().decode('utf-8-sig')
+        else:
+            text = request.get_data(as_text=True)
 
-def _format_diagnosis_response(text):
-    """診断結果の改行を強制的に整理"""
-    import re
-    
-    # 助成金名の前に改行を強制挿入
-    text = re.sub(r'(\d+\.)\s*([^-\n]+助成金)', r'\n\n\1 \2\n', text)
-    
-    # 項目（-で始まる行）の前に適切な改行
-    text = re.sub(r'([^\n])\s*-\s*(支給額|適用要件|申請準備|専門エージェント)', r'\1\n- \2', text)
-    
-    # カテゴリ見出し（【】で囲まれた部分）の前後に改行
-    text = re.sub(r'([^\n])【([^】]+)】', r'\1\n\n【\2】\n', text)
-    
-    # 連続する改行を整理（3個以上の改行を2個に）
-    text = re.sub(r'\n{3,}', '\n\n', text)
-    
-    # 先頭と末尾の余分な改行を削除
-    text = text.strip()
-    
-    return text
+        if not text.strip():
+            return jsonify({'error': '企業プロファイルのファイルが必要です'}), 400
+
+        input_format = request.args.get('input_format')
+        if not input_format and request.content_type:
+            if 'jsonl' in request.content_type or 'ndjson' in request.content_type:
+                input_format = 'jsonl'
+            elif 'csv' in request.content_type:
+                input_format = 'csv'
+
+        output_format = request.args.get('format', 'csv')
+        if output_format not in ['csv', 'jsonl']:
+            return jsonify({'error': '無効な出力形式です'}), 400
+
+        chunks = bulk_screening_service.stream_results(text, input_format, output_format)
+        mimetype = 'text/csv' if output_format == 'csv' else 'application/x-ndjson'
+
+        return Response(stream_with_context(chunks), mimetype=f'{mimetype}; charset=utf-8')
+
+    except ValueError as e:
+        logger.warning(f"Invalid bulk screening input: {str(e)}")
+        return jsonify({'error': f'入力ファイルの形式が正しくありません: {str(e)}'}), 400
+    except Exception as e:
+        logger.error(f"Error in bulk grant check endpoint: {str(e)}")
+        return jsonify({'error': 'サーバーエラーが発生しました'}), 500
+
+from subsidy_calculator import calculate as calculate_subsidy
+
+@app.route('/api/calc', methods=['POST'])
+def subsidy_calc():
+    """助成金額の即時計算（支給額表に基づく決定的な計算・AI不使用）"""
+    try:
+        data = request.get_json(silent=True) or {}
+        subsidy = data.pop('subsidy', None)
+        if not subsidy:
+            return jsonify({'error': '助成金の種類（subsidy）を指定してください'}), 400
+
+        result = calculate_subsidy(subsidy, **data)
+        return jsonify({'result': result, 'status': 'success'})
+
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'入力内容が正しくありません: {str(e)}'}), 400
+    except Exception as e:
+        logger.error(f"Error in subsidy calc endpoint: {str(e)}")
+        return jsonify({'error': 'サーバーエラーが発生しました'}), 500
+
+# 賃金台帳の集計（賃金要件チェック・LLM不使用）
+try:
+    from payroll_analytics import PayrollAnalyzer, format_payroll_summary, validate_payroll_summary
+    PAYROLL_ANALYTICS_ENABLED = True
+except Exception as e:
+    logger.error(f"Payroll analytics module failed to load: {str(e)}")
+    PAYROLL_ANALYTICS_ENABLED = False
+
+@app.route('/api/payroll/analyze', methods=['POST'])
+@require_auth
+def payroll_analyze():
+    """賃金台帳CSVを受け取り、事業場内最低賃金・コース別の引上げ対象者数・賃上げ率を集計"""
+    if not PAYROLL_ANALYTICS_ENABLED:
+        return jsonify({'error': '賃金台帳の集計機能が利用できません'}), 500
+
+    try:
+        import io
+
+        def optional_float(name):
+            value = request.args.get(name) or request.form.get(name)
+            return float(value) if value else None
+
+        analyzer = PayrollAnalyzer(
+            default_daily_hours=optional_float('daily_hours') or 8.0,
+            default_monthly_hours=optional_float('monthly_hours')
+        )
+
+        # アップロードを一括で読み込まずにストリームとしてCSVパーサーに渡す
+        upload = request.files.get('file')
+        raw_stream = upload.stream if upload else request.stream
+        stream = io.TextIOWrapper(raw_stream, encoding='utf-8-sig', newline='')
+
+        summary = analyzer.analyze(stream, regional_min_wage=optional_float('regional_min_wage'))
+
+        return jsonify({
+            'summary': summary,
+            'agent_summary': format_payroll_summary(summary),
+            'status': 'success'
+        })
+
+    except (ValueError, UnicodeDecodeError) as e:
+        logger.warning(f"Invalid payroll input: {str(e)}")
+        return jsonify({'error': f'賃金台帳の形式が正しくありません: {str(e)}'}), 400
+    except Exception as e:
+        logger.error(f"Error in payroll analyze endpoint: {str(e)}")
+        return jsonify({'error': 'サーバーエラーが発生しました'}), 500
+
+# 削除済み: _load_joseikin_knowledge() 関数は不正確なハードコードデータを使用していたため削除
+from diagnosis_prompt import build_diagnosis_prompt, clean_diagnosis_response
 
 @app.route('/api/joseikin-diagnosis', methods=['POST'])
+@rate_limiter.limit(5, 86400, scope='diagnosis',
+                    error_message='1日の利用制限（5回）に達しました。明日再度お試しください。',
+                    extra={'message': 'より詳しい相談は専門AIエージェントをご利用ください。'})
 def joseikin_diagnosis():
     try:
-        # 利用制限チェック
-        client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR', ''))
-        if not _check_diagnosis_rate_limit(client_ip):
-            return jsonify({
-                'error': '1日の利用制限（5回）に達しました。明日再度お試しください。',
-                'message': 'より詳しい相談は専門AIエージェントをご利用ください。'
-            }), 429
-        
         data = request.json
         diagnosis_data = data.get('diagnosis_data', {})
         
-        # データの前処理と解釈
-        # 業種を日本語に変換
-        industry_map = {
-            'construction': '建設業',
-            'manufacturing': '製造業',
-            'service': 'サービス業',
-            'it': 'IT・通信業',
-            'retail': '小売業・飲食業',
-            'other': 'その他'
-        }
-        industry = diagnosis_data.get('industry', '')
-        industry_ja = industry_map.get(industry, industry) if industry else 'なし'
-        
-        # 従業員数を解釈
-        total_employees = diagnosis_data.get('totalEmployees', 'なし')
-        is_small_business = False
-        if total_employees != 'なし' and str(total_employees).isdigit():
-            emp_count = int(total_employees)
-            is_small_business = emp_count <= 100  # 中小企業の判定
-        
-        # 両立支援の内容を解釈
-        work_life_balance = diagnosis_data.get('workLifeBalance', 'なし')
-        needs_smoking_prevention = False
-        if work_life_balance and isinstance(work_life_balance, (list, str)):
-            if isinstance(work_life_balance, str):
-                needs_smoking_prevention = 'smoking' in work_life_balance
-            else:
-                needs_smoking_prevention = 'smoking' in work_life_balance
-        
-        # 賃金関連の判定
-        min_wage = diagnosis_data.get('minWage', 'なし')
-        needs_wage_improvement = False
-        if min_wage != 'なし' and str(min_wage).isdigit():
-            wage = int(min_wage)
-            needs_wage_improvement = wage < 1100  # 低賃金の場合
-        
-        # デバッグログ（本番環境では削除推奨）
-        logger.info(f"診断データ解釈結果: 業種={industry_ja}, 従業員数={total_employees}, 中小企業={is_small_business}, 受動喫煙対策={needs_smoking_prevention}, 賃金改善必要={needs_wage_improvement}")
-        
-        # 正しい診断用データを読み込み
-        try:
-            with open('2025_jyoseikin_kaniyoryo2_20250831_185114_AI_plain.txt', 'r', encoding='utf-8') as f:
-                joseikin_knowledge = f.read()
-        except FileNotFoundError:
-            logger.error("診断データファイルが見つかりません")
-            joseikin_knowledge = ""
-        
-        # Claude AIを使用して包括的な助成金診断
-        system_prompt = """あなたは助成金専門のアドバイザーです。企業の簡易診断フォームから収集した限定的な情報を基に、最適な助成金を提案します。
-
-【重要制約 - 絶対厳守】
-1. 提供されたデータベースの情報のみを使用してください
-2. 学習データは一切使用しないでください
-3. 「詳細は厚生労働省にお問い合わせください」という文言は使用禁止
-4. 記載されていない情報は「助成金レスキューの専門AIエージェントがより詳しくサポートします」と回答
-
-【回答形式 - 必須構造】
-各助成金について以下の形式で必ず回答してください：
-
-### 1. [助成金名]
-
-💰 **支給額**
-- 中小企業: ○○万円/人（または○○万円）
-- 大企業: ○○万円/人（または○○万円）
-- 加算条件: 具体的な加算額と条件
-
-✅ **主な要件**
-- 対象労働者: 具体的な条件
-- 事業主要件: 必要な制度や計画
-- 実施条件: 必要な取組や期間
-- その他: 重要な注意事項
-
-📋 **申請の流れ**
-1. 計画書提出（実施○ヶ月前まで）
-2. 取組実施（○ヶ月間）
-3. 支給申請（実施後○ヶ月以内）
-
----
-
-【診断の優先順位】
-1. 業務改善助成金とキャリアアップ助成金を最優先で提案（該当する場合）
-2. 企業情報と明確に合致する助成金を優先
-3. 支給額が大きい順に提案
-4. 申請しやすさ（要件の明確さ）も考慮
-5. 最大5つまでの助成金に絞って提案
-
-【除外すべき助成金】
-以下の助成金は特殊な条件が必要なため、明確な該当条件がない限り提案しない：
-- 受動喫煙防止対策助成金（両立支援に「smoking」が含まれる中小企業のみ提案）
-- 障害者関連助成金（特別配慮労働者に障害者が明記されている場合のみ）
-- 建設業特有の助成金（業種が「construction」または「建設業」の場合のみ）
-
-【回答の具体性】
-- 支給額は必ず数値で明記（「最大」「〜まで」等も明確に）
-- 要件は箇条書きで分かりやすく
-- 申請期限や実施期間は具体的に記載"""
-        
-        # システムプロンプトに知識ベースを追加
-        system_prompt_with_data = f"{system_prompt}\n\n【2025年度助成金データベース】\n{joseikin_knowledge}"
-        
-        # Claude AIに問い合わせ（promptをsystem promptとして使用）
-        user_question = f"""
-以下の企業情報を基に、該当する助成金を診断してください。
-各助成金について、💰支給額、✅主な要件、📋申請の流れの3点を必ず明記してください。
-
-【企業情報】
-業種: {industry_ja}
-従業員数: {total_employees}人
-企業規模: {'中小企業' if is_small_business else '大企業' if total_employees != 'なし' else '不明'}
-雇用保険被保険者数: {diagnosis_data.get('insuredEmployees', 'なし')}
-有期契約労働者数: {diagnosis_data.get('temporaryEmployees', 'なし')}
-短時間労働者数: {diagnosis_data.get('partTimeEmployees', 'なし')}
-年齢構成: {diagnosis_data.get('ageGroups', 'なし')}
-特別配慮労働者: {diagnosis_data.get('specialNeeds', 'なし')}
-経営状況: {diagnosis_data.get('businessSituation', 'なし')}
-事業場内最低賃金: {min_wage}円/時{'（改善が必要）' if needs_wage_improvement else ''}
-賃金・処遇改善: {diagnosis_data.get('wageImprovement', 'なし')}
-投資・改善予定: {diagnosis_data.get('investments', 'なし')}
-両立支援: {work_life_balance}{'（受動喫煙防止対策を含む）' if needs_smoking_prevention else ''}
-
-【重要】
-- 業務改善助成金とキャリアアップ助成金を優先的に検討し、該当する場合は必ず上位に提案してください
-- この企業の状況から判断して、最も可能性が高い助成金を最大5つまで提案してください
-- 各助成金の支給額は必ず具体的な金額で示してください
-- 要件は企業情報と照らし合わせて、該当/非該当の判断材料を明確に示してください
-
-【判定の注意点】
-- 「なし」と記載された項目は、その条件に該当しないと判断してください
-- 例：特別配慮労働者が「なし」→ 障害者関連助成金は提案しない
-- 例：投資・改善予定が「なし」→ 設備投資が必要な助成金は慎重に判断
-- 例：両立支援が「なし」または「smoking」を含まない → 受動喫煙防止対策助成金は提案しない
-- 提供された情報から確実に該当すると判断できる助成金のみを提案してください
-- 受動喫煙防止対策助成金は中小企業が対象で、飲食店は助成率2/3、その他業種は1/2、上限100万円です
-"""
+        # プロンプト組み立て（一括診断ランナーと共通）
+        user_question, system_prompt_with_data = build_diagnosis_prompt(diagnosis_data)
         raw_response = get_claude_service().chat_diagnosis_haiku(user_question, system_prompt_with_data)
         
-        # 強制的に改行を整理
-        response = _format_diagnosis_response(raw_response)
-        
-        # 厚生労働省への問い合わせ文言を強制的に削除
-        import re
-        response = re.sub(r'詳細は厚生労働省.*?ください[。\n]?', '', response)
-        response = re.sub(r'厚生労働省.*?お問い合わせ.*?[。\n]?', '', response)
-        response = re.sub(r'労働局.*?お問い合わせ.*?[。\n]?', '', response)
-        response = re.sub(r'ハローワーク.*?お問い合わせ.*?[。\n]?', '', response)
-        response = re.sub(r'詳しくは.*?ご確認ください[。\n]?', '詳しくは助成金レスキューの専門AIエージェントがサポートします。', response)
-        # 不完全な文章を削除
-        response = re.sub(r'詳細な手続きや申請方法については、最寄りの[。\n]?', '', response)
-        response = re.sub(r'詳細な.*?については、最寄りの[。\n]?', '', response)
+        # 改行整理・問い合わせ誘導文言の除去
+        response = clean_diagnosis_response(raw_response)
         
         # レスポンスを構造化
         applicable_grants = [{
@@ -524,6 +502,7 @@ def joseikin_diagnosis():
 
 @app.route('/api/auth/user', methods=['GET'])
 @require_auth
+@conditional_get(_auth_user_version)
 def get_user():
     """現在のユーザー情報と使用状況を取得"""
     try:
@@ -567,6 +546,7 @@ def debug_create_subscription():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/auth/register', methods=['POST'])
+@rate_limiter.limit(10, 3600, scope='register')
 def register():
     """新規ユーザー登録（Firebase認証後）"""
     try:
@@ -653,8 +633,7 @@ def register():
             logger.error(f"Error creating user with Stripe: {str(inner_e)}")
             # Stripeエラーの場合でも、ユーザー作成は試みる
             try:
-                from models.user import User
-                user_service = User(firebase_service)
+                user_service = get_user_service()
                 user_id = user_service.create_user({
                     'uid': uid,
                     'email': email,
@@ -681,6 +660,7 @@ def register():
 
 @app.route('/api/payment/basic-plan', methods=['POST'])
 @require_auth
+@checkout_rate_limit
 def create_basic_plan_checkout():
     """基本プラン（月額3,000円）の決済セッションを作成"""
     try:
@@ -725,6 +705,7 @@ def create_basic_plan_checkout():
 
 @app.route('/api/payment/additional-pack', methods=['POST'])
 @require_auth
+@checkout_rate_limit
 def create_additional_pack_checkout():
     """追加パック（2,000円）の決済セッションを作成"""
     try:
@@ -771,18 +752,21 @@ def create_additional_pack_checkout():
 
 @app.route('/api/payment/light-plan', methods=['POST'])
 @require_auth
+@checkout_rate_limit
 def create_light_plan_checkout():
     """ライトプラン（1,480円/月）の決済セッションを作成"""
     return _create_subscription_checkout('light')
 
 @app.route('/api/payment/regular-plan', methods=['POST'])
 @require_auth 
+@checkout_rate_limit
 def create_regular_plan_checkout():
     """レギュラープラン（3,300円/月）の決済セッションを作成"""
     return _create_subscription_checkout('regular')
 
 @app.route('/api/payment/heavy-plan', methods=['POST'])
 @require_auth
+@checkout_rate_limit
 def create_heavy_plan_checkout():
     """ヘビープラン（5,500円/月）の決済セッションを作成"""
     return _create_subscription_checkout('heavy')
@@ -855,18 +839,21 @@ def _create_subscription_checkout(plan_type: str):
 
 @app.route('/api/payment/pack-20', methods=['POST'])
 @require_auth
+@checkout_rate_limit
 def create_pack_20_checkout():
     """20回追加パック（1,480円）の決済セッションを作成"""
     return _create_pack_checkout('pack_20', 20)
 
 @app.route('/api/payment/pack-40', methods=['POST'])
 @require_auth
+@checkout_rate_limit
 def create_pack_40_checkout():
     """40回追加パック（2,680円）の決済セッションを作成"""
     return _create_pack_checkout('pack_40', 40)
 
 @app.route('/api/payment/pack-90', methods=['POST'])
 @require_auth
+@checkout_rate_limit
 def create_pack_90_checkout():
     """90回追加パック（5,500円）の決済セッションを作成"""
     return _create_pack_checkout('pack_90', 90)
@@ -874,18 +861,21 @@ def create_pack_90_checkout():
 # 新しいURL形式でのエンドポイント（pricing.htmlから呼び出される）
 @app.route('/api/payment/additional-pack-20', methods=['POST'])
 @require_auth
+@checkout_rate_limit
 def create_additional_pack_20_checkout():
     """20回追加パック（1,480円）の決済セッションを作成"""
     return _create_pack_checkout('pack_20', 20)
 
 @app.route('/api/payment/additional-pack-40', methods=['POST'])
 @require_auth
+@checkout_rate_limit
 def create_additional_pack_40_checkout():
     """40回追加パック（2,680円）の決済セッションを作成"""
     return _create_pack_checkout('pack_40', 40)
 
 @app.route('/api/payment/additional-pack-90', methods=['POST'])
 @require_auth
+@checkout_rate_limit
 def create_additional_pack_90_checkout():
     """90回追加パック（5,500円）の決済セッションを作成"""
     return _create_pack_checkout('pack_90', 90)
@@ -894,6 +884,7 @@ def create_additional_pack_90_checkout():
 
 @app.route('/api/payment/consultation', methods=['POST'])
 @require_auth
+@checkout_rate_limit
 def create_consultation_payment():
     """専門家相談の決済セッションを作成"""
     try:
@@ -1147,8 +1138,7 @@ def force_plan_update():
         if plan_type in ['light', 'regular', 'heavy', 'basic']:
             # Session IDから実際のSubscription IDを取得を試行
             if session_id != 'manual_update':
-                from .stripe_service import StripeService
-                stripe_service = StripeService()
+                stripe_service = get_stripe_service()
                 actual_subscription_id = stripe_service.get_subscription_from_session(session_id)
                 
                 if actual_subscription_id:
@@ -1276,27 +1266,23 @@ def subsidy_memo_page():
 
 @app.route('/api/subsidies', methods=['GET'])
 @require_auth
+@conditional_get(_subsidies_version)
 def get_subsidies():
     """ユーザーの助成金メモ一覧を取得"""
     try:
         current_user = get_current_user()
         uid = current_user.get('user_id', 'Unknown')
         user_id = current_user.get('id', 'Unknown')
-        logger.info(f"API GET: current_user keys: {list(current_user.keys())}")
-        logger.info(f"API GET: Firebase UID: {uid}")
-        logger.info(f"API GET: Database User ID: {user_id}")
-        logger.info(f"API GET: Email: {current_user.get('email', 'Unknown')}")
-        
-        from subsidy_service import SubsidyService
+        logger.debug("API GET subsidies: uid=%s user_id=%s", uid, user_id)
         
-        service = SubsidyService(firebase_service.get_db())
+        service = get_subsidy_service()
         # まずFirebase UIDで試し、見つからない場合はDatabase User IDでも試す
         subsidies = service.get_user_subsidies(current_user['user_id'])
         if not subsidies and current_user.get('id'):
             logger.info(f"No subsidies found with Firebase UID, trying database user ID: {current_user['id']}")
             subsidies = service.get_user_subsidies(current_user['id'])
         
-        logger.info(f"API GET: Found {len(subsidies)} subsidies for user")
+        log_event(logger, 'subsidies.listed', level=logging.DEBUG, uid=uid, count=len(subsidies))
         
         result = [s.to_dict() for s in subsidies]
         return jsonify(result)
@@ -1322,8 +1308,7 @@ def create_subsidy():
         logger.info(f"API POST: Email: {current_user.get('email', 'Unknown')}")
         logger.info(f"API POST: Received data keys: {list(data.keys()) if data else 'None'}")
         
-        from subsidy_service import SubsidyService
-        service = SubsidyService(firebase_service.get_db())
+        service = get_subsidy_service()
         
         # Firebase UIDを優先的に使用（取得時と一貫性を保つため）
         user_id_for_save = current_user['user_id']
@@ -1347,8 +1332,7 @@ def update_subsidy(subsidy_id):
         current_user = get_current_user()
         data = request.json
         
-        from subsidy_service import SubsidyService
-        service = SubsidyService(firebase_service.get_db())
+        service = get_subsidy_service()
         
         success = service.update_subsidy_memo(current_user['user_id'], subsidy_id, data)
         
@@ -1373,10 +1357,11 @@ def add_chat_history(subsidy_id):
         if not content:
             return jsonify({'error': 'メモ内容が必要です'}), 400
         
-        from subsidy_service import SubsidyService
-        service = SubsidyService(firebase_service.get_db())
+        service = get_subsidy_service()
         
-        success = service.add_chat_history(current_user['user_id'], subsidy_id, content)
+        # 書き込みはレスポンス送信後に行う（同じメモへの追加は投入順に保存）
+        success = write_behind.submit('subsidy.chat_history', service.add_chat_history,
+                                      current_user['user_id'], subsidy_id, content, key=subsidy_id)
         
         if success:
             return jsonify({'status': 'success'})
@@ -1394,8 +1379,7 @@ def delete_subsidy(subsidy_id):
     try:
         current_user = get_current_user()
         
-        from subsidy_service import SubsidyService
-        service = SubsidyService(firebase_service.get_db())
+        service = get_subsidy_service()
         
         success = service.delete_subsidy_memo(current_user['user_id'], subsidy_id)
         
@@ -1416,8 +1400,7 @@ def get_deadlines():
         current_user = get_current_user()
         days = request.args.get('days', 30, type=int)
         
-        from subsidy_service import SubsidyService
-        service = SubsidyService(firebase_service.get_db())
+        service = get_subsidy_service()
         
         # Firebase UIDを使用（他のAPIと一貫性を保つため）
         deadlines = service.get_upcoming_deadlines(current_user['user_id'], days)
@@ -1434,8 +1417,7 @@ def save_temp_diagnosis():
     try:
         data = request.json
         
-        from subsidy_service import SubsidyService
-        service = SubsidyService(firebase_service.get_db())
+        service = get_subsidy_service()
         
         session_id = service.save_temp_diagnosis(data)
         
@@ -1447,9 +1429,68 @@ def save_temp_diagnosis():
 
 # ===== AIエージェント関連API =====
 
+def _build_agent_prompt(message, conversation_history, payroll_summary=None):
+    """エージェントチャットのプロンプトを会話履歴（最新10件）と賃金台帳の要約から組み立て"""
+    context_messages = []
+    for msg in conversation_history[-10:]:  # 最新10件まで（トークンコスト削減）
+        role = '次の質問例' if msg['sender'] == 'user' else 'assistant'
+        context_messages.append(f"{role}: {msg['message']}")
+    
+    full_prompt = f"""
+これまでの会話:
+{chr(10).join(context_messages) if context_messages else '新しい会話です'}
+
+ユーザー: {message}
+"""
+
+    # 賃金台帳の集計結果が添付されている場合は要約のみをプロンプトに含める
+    if payroll_summary and PAYROLL_ANALYTICS_ENABLED:
+        full_prompt = f"""
+賃金台帳の集計結果（システムで計算済み）:
+{format_payroll_summary(payroll_summary)}
+{full_prompt}"""
+    return full_prompt
+
+def _generate_agent_answer(prompt, agent_id):
+    """エージェントの応答を生成し、(応答, エラー案内文かどうか) を返す"""
+    response = get_claude_service().get_agent_response(prompt, agent_id)
+    
+    # デバッグ: レスポンス内容をログ出力（質問ボタン調査用）
+    logger.debug("Raw Claude response preview: %.500s", response)
+    
+    # エラーメッセージかどうかを判定（ClaudeService の案内文と完全一致）
+    if is_error_response(response):
+        return response, True
+    
+    # 応答から会話履歴の混入を削除（「ユーザー:」「次の質問例:」以降の部分を削除）
+    response = re.sub(r'(ユーザー:|次の質問例:).*$', '', response, flags=re.DOTALL).strip()
+    
+    # 質問ボタンのHTMLも除去（限定的・安全な対策）
+    # 明確にボタンタグのみを削除（他の要素への影響を最小限に）
+    response = re.sub(r'<button[^>]*>[^<]*(?:見積|質問|について|ですか)[^<]*</button>', '', response, flags=re.IGNORECASE)
+    return response, False
+
+def _save_agent_turn(user_id, conversation_id, agent_id, agent_name, message, response):
+    """統合会話履歴への保存を書き込みキューに積み、会話IDを返す（保存はレスポンス送信後、失敗時は再試行）"""
+    conv_service = get_conversation_service()
+    
+    if not conversation_id:
+        # 新しい会話を最初の1往復ごと作成（1回のバッチ書き込み）。会話IDは先に採番して返す
+        conversation_id = str(uuid.uuid4())
+        write_behind.submit('conversation.create', conv_service.create_conversation,
+                            user_id, agent_id, agent_name, message, response,
+                            conversation_id=conversation_id, key=conversation_id)
+    else:
+        # 既存の会話に質問と応答をまとめて追記（1回のトランザクション）。
+        # コミットの成否が不明なまま再試行しても二重に追記されないよう、リクエストごとのターンIDを渡す
+        write_behind.submit('conversation.append_turn', conv_service.append_turn,
+                            conversation_id, user_id, message, response,
+                            turn_id=uuid.uuid4().hex, key=conversation_id)
+    return conversation_id
+
 @app.route('/api/agent/chat', methods=['POST'])
 @require_auth
-@check_usage_limit
+@check_usage_limit_deferred
 def agent_chat():
     """AIエージェントとのチャット"""
     try:
@@ -1546,97 +1587,62 @@ def agent_chat():
         if agent_id not in agent_info:
             return jsonify({'error': '無効なエージェントIDです'}), 400
         
-        # Claude APIを使用してレスポンスを生成（元の方式に戻す）
-        claude_service = get_claude_service()
-        
-        # 会話履歴を含むコンテキストを構築
-        context_messages = []
-        for msg in conversation_history[-10:]:  # 最新10件まで（トークンコスト削減）
-            role = '次の質問例' if msg['sender'] == 'user' else 'assistant'
-            context_messages.append(f"{role}: {msg['message']}")
-        
-        full_prompt = f"""
-これまでの会話:
-{chr(10).join(context_messages) if context_messages else '新しい会話です'}
-
-ユーザー: {message}
-"""
-        
-        # 元のclaude_serviceを使用（エージェント別のファイルを読み込む）
-        response = claude_service.get_agent_response(full_prompt, agent_id)
-        
-        # デバッグ: レスポンス内容をログ出力（質問ボタン調査用）
-        logger.info(f"Raw Claude response preview: {response[:500]}...")
-        
-        # エラーメッセージかどうかを判定
-        is_error_response = (
-            "申し訳ございません" in response and 
-            ("サーバーが込み合っています" in response or 
-             "時間がかかりすぎています" in response or 
-             "サーバーが混雑しています" in response or 
-             "認証に問題が発生しています" in response or 
-             "一時的な問題が発生している" in response)
-        )
-        
-        # 応答から会話履歴の混入を削除（エラーでない場合のみ）
-        if not is_error_response:
-            # 「ユーザー:」「次の質問例:」以降の部分を削除
-            import re
-            response = re.sub(r'(ユーザー:|次の質問例:).*$', '', response, flags=re.DOTALL).strip()
-            
-            # 質問ボタンのHTMLも除去（限定的・安全な対策）
-            # 明確にボタンタグのみを削除（他の要素への影響を最小限に）
-            response = re.sub(r'<button[^>]*>[^<]*(?:見積|質問|について|ですか)[^<]*</button>', '', response, flags=re.IGNORECASE)
-        
-        import time
+        # 賃金台帳の集計結果はクライアントから送られるため、要約に使う項目と型を検証してから使う
+        payroll_summary = None
+        if data.get('payroll_summary') and PAYROLL_ANALYTICS_ENABLED:
+            try:
+                payroll_summary = validate_payroll_summary(data['payroll_summary'])
+            except ValueError as e:
+                return jsonify({'error': f'賃金台帳の集計結果が正しくありません: {str(e)}'}), 400
         
-        # 統合会話履歴に保存
+        agent_name = agent_info[agent_id]['name']
         conversation_id = data.get('conversation_id')
-        try:
-            from integrated_conversation_service import IntegratedConversationService
-            conv_service = IntegratedConversationService(firebase_service.get_db())
-            
-            if not conversation_id:
-                # 新しい会話を作成
-                conversation = conv_service.create_conversation(
-                    current_user['user_id'],
-                    agent_id,
-                    agent_info[agent_id]['name'],
-                    message
-                )
-                conversation_id = conversation['id']
-                
-                # アシスタントの応答も追加
-                conv_service.add_message(conversation_id, current_user['user_id'], response, 'assistant')
-            else:
-                # 既存の会話にメッセージを追加
-                conv_service.add_message(conversation_id, current_user['user_id'], message, 'user')
-                conv_service.add_message(conversation_id, current_user['user_id'], response, 'assistant')
-        
-        except Exception as e:
-            logger.error(f"Error saving conversation: {str(e)}")
-            # 保存エラーがあっても応答は返す
         
-        # エラーでない場合のみ質問使用回数を増加
-        if not is_error_response:
-            result = get_subscription_service().use_question(current_user.get('user_id') or current_user['id'])
-            
-            if not result['success']:
-                logger.error(f"Failed to record question usage: {result.get('error')}")
+        # 互いに依存しない処理は並行実行（ワーカースレッドでは g を使わないため値を渡す）
+        pipeline = RequestPipeline()
+        pipeline.stage('prompt', lambda results: _build_agent_prompt(message, conversation_history, payroll_summary))
+        pipeline.stage('quota', lambda results: reserve_question_usage(current_user))
+        try:
+            results = pipeline.run()
+        except Exception:
+            # プロンプト組み立てが失敗しても仮押さえは完了しているため、check_usage_limit_deferred が解除できるよう設定してから再送出
+            reservation = pipeline.results.get('quota')
+            if reservation and reservation.get('success'):
+                activate_question_usage(reservation)
+            raise
+
+        # 上限超過なら AI を呼ばずに返す
+        error_response = activate_question_usage(results['quota'])
+        if error_response:
+            return error_response
+        reservation = results['quota']
         
-        # 最新の使用状況を取得
-        updated_usage = get_subscription_service().get_usage_stats(current_user.get('user_id') or current_user['id'])
+        # 元のclaude_serviceを使用（エージェント別のファイルを読み込む）
+        pipeline.stage('llm', lambda results: _generate_agent_answer(results['prompt'], agent_id), 'prompt')
+        pipeline.run()
+        response, is_error = pipeline.results['llm']
+        
+        # 会話履歴への保存と質問枠の確定（エラーでない場合のみ。エラー時は check_usage_limit_deferred が解除）を並行実行
+        pipeline.stage('conversation', lambda results: _save_agent_turn(
+            current_user['user_id'], conversation_id, agent_id, agent_name, message, response
+        ), 'llm')
+        pipeline.stage('quota_commit', lambda results: (
+            reservation['usage_stats'] if is_error else commit_reservation(reservation)
+        ), 'llm')
+        results = pipeline.run()
         
         # レスポンスを保存
         response_data = {
             'message': response,
-            'agent_name': agent_info[agent_id]['name'],
+            'agent_name': agent_name,
             'timestamp': int(time.time() * 1000),
-            'conversation_id': conversation_id,
-            'usage_stats': updated_usage
+            'conversation_id': results['conversation'],
+            'usage_stats': results['quota_commit']
         }
         
-        return jsonify(response_data)
+        http_response = jsonify(response_data)
+        http_response.headers[SERVER_TIMING_HEADER] = pipeline.server_timing()
+        return http_response
         
     except Exception as e:
         import traceback
@@ -1649,17 +1655,27 @@ def agent_chat():
 
 @app.route('/api/conversations', methods=['GET'])
 @require_auth
+@conditional_get(lambda: counter_version(CONVERSATIONS))
 def get_conversations():
-    """ユーザーの統合会話一覧を取得"""
+    """ユーザーの統合会話一覧を取得（?limit=件数&cursor=X-Next-Cursor の値）"""
     try:
         current_user = get_current_user()
         
-        from integrated_conversation_service import IntegratedConversationService
-        service = IntegratedConversationService(firebase_service.get_db())
+        limit = min(max(request.args.get('limit', 30, type=int), 1), 100)
+        
+        service = get_conversation_service()
         
-        conversations = service.get_conversations(current_user['user_id'])
+        try:
+            page = service.list_conversations(current_user['user_id'], limit=limit,
+                                              cursor=request.args.get('cursor'))
+        except ValueError:
+            return jsonify({'error': '無効なカーソルです'}), 400
         
-        return jsonify(conversations)
+        # 本文は従来どおり配列のまま返し、次のページのカーソルはヘッダーで返す
+        response = jsonify(page['conversations'])
+        if page['next_cursor']:
+            response.headers['X-Next-Cursor'] = page['next_cursor']
+        return response
         
     except Exception as e:
         logger.error(f"Error getting conversations: {str(e)}")
@@ -1680,8 +1696,7 @@ def create_conversation():
         if not agent_id or not agent_name:
             return jsonify({'error': 'エージェントIDとエージェント名が必要です'}), 400
         
-        from integrated_conversation_service import IntegratedConversationService
-        service = IntegratedConversationService(firebase_service.get_db())
+        service = get_conversation_service()
         
         conversation = service.create_conversation(
             current_user['user_id'], 
@@ -1696,6 +1711,27 @@ def create_conversation():
         logger.error(f"Error creating conversation: {str(e)}")
         return jsonify({'error': '会話の作成に失敗しました'}), 500
 
+@app.route('/api/conversations/search', methods=['GET'])
+@require_auth
+@rate_limiter.limit(30, 60, scope='conversation_search', key_func=_rate_limit_uid)
+def search_conversations():
+    """会話履歴の全文検索（?q=検索語&limit=件数）。一致箇所の前後のみを返す"""
+    try:
+        current_user = get_current_user()
+
+        query = (request.args.get('q') or '').strip()
+        if len(query) < 2 or len(query) > 100:
+            return jsonify({'error': '検索語は2文字以上100文字以内で入力してください'}), 400
+
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+        results = get_conversation_service().search(current_user['user_id'], query, limit=limit)
+
+        return jsonify({'query': query, 'results': results})
+
+    except Exception as e:
+        logger.error(f"Error searching conversations: {str(e)}")
+        return jsonify({'error': '会話履歴の検索に失敗しました'}), 500
+
 @app.route('/api/conversations/<conversation_id>', methods=['GET'])
 @require_auth  
 def get_conversation(conversation_id):
@@ -1703,8 +1739,7 @@ def get_conversation(conversation_id):
     try:
         current_user = get_current_user()
         
-        from integrated_conversation_service import IntegratedConversationService
-        service = IntegratedConversationService(firebase_service.get_db())
+        service = get_conversation_service()
         
         conversation = service.get_conversation(conversation_id, current_user['user_id'])
         
@@ -1717,6 +1752,29 @@ def get_conversation(conversation_id):
         logger.error(f"Error getting conversation {conversation_id}: {str(e)}")
         return jsonify({'error': '会話の取得に失敗しました'}), 500
 
+@app.route('/api/conversations/<conversation_id>/messages', methods=['GET'])
+@require_auth
+def get_conversation_messages(conversation_id):
+    """会話のメッセージ履歴をページ単位で取得（?limit=件数&before=このseqより前）"""
+    try:
+        current_user = get_current_user()
+        
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+        before = request.args.get('before', type=int)
+        
+        page = get_conversation_service().get_messages(
+            conversation_id, current_user['user_id'], limit=limit, before_seq=before
+        )
+        
+        if page is None:
+            return jsonify({'error': '会話が見つかりません'}), 404
+        
+        return jsonify(page)
+        
+    except Exception as e:
+        logger.error(f"Error getting messages for conversation {conversation_id}: {str(e)}")
+        return jsonify({'error': 'メッセージ履歴の取得に失敗しました'}), 500
+
 @app.route('/api/conversations/<conversation_id>/messages', methods=['POST'])
 @require_auth
 def add_message_to_conversation(conversation_id):
@@ -1734,8 +1792,7 @@ def add_message_to_conversation(conversation_id):
         if sender not in ['user', 'assistant']:
             return jsonify({'error': '無効な送信者です'}), 400
         
-        from integrated_conversation_service import IntegratedConversationService
-        service = IntegratedConversationService(firebase_service.get_db())
+        service = get_conversation_service()
         
         success = service.add_message(
             conversation_id, 
@@ -1765,8 +1822,7 @@ def update_conversation_title(conversation_id):
         if not title:
             return jsonify({'error': 'タイトルが必要です'}), 400
         
-        from integrated_conversation_service import IntegratedConversationService
-        service = IntegratedConversationService(firebase_service.get_db())
+        service = get_conversation_service()
         
         success = service.update_conversation_title(
             conversation_id,
@@ -1790,8 +1846,7 @@ def delete_conversation(conversation_id):
     try:
         current_user = get_current_user()
         
-        from integrated_conversation_service import IntegratedConversationService
-        service = IntegratedConversationService(firebase_service.get_db())
+        service = get_conversation_service()
         
         success = service.delete_conversation(conversation_id, current_user['user_id'])
         
@@ -1811,8 +1866,7 @@ def convert_diagnosis(session_id):
     try:
         current_user = get_current_user()
         
-        from subsidy_service import SubsidyService
-        service = SubsidyService(firebase_service.get_db())
+        service = get_subsidy_service()
         
         memo = service.convert_temp_to_memo(session_id, current_user['user_id'])
         
@@ -1827,14 +1881,14 @@ def convert_diagnosis(session_id):
 
 @app.route('/api/ai-results', methods=['GET', 'POST'])
 @require_auth
+@conditional_get(lambda: counter_version(AI_RESULTS) if request.method == 'GET' else None)
 def ai_results():
     """AI診断結果の取得・保存"""
     try:
         current_user = get_current_user()
         user_id = current_user['user_id']
         
-        from subsidy_service import SubsidyService
-        service = SubsidyService(firebase_service.get_db())
+        service = get_subsidy_service()
         
         if request.method == 'GET':
             # AI診断結果を取得
@@ -1844,14 +1898,66 @@ def ai_results():
         elif request.method == 'POST':
             # 新しいAI診断結果を保存
             data = request.json
-            result_id = service.save_ai_result(user_id, data)
+            # IDを先に採番し、保存はレスポンス送信後に行う
+            result_id = str(uuid.uuid4())
+            write_behind.submit('ai_result.save', service.save_ai_result, user_id, data, result_id=result_id)
             return jsonify({'id': result_id, 'message': '診断結果を保存しました'})
             
     except Exception as e:
         logger.error(f"Error handling AI results: {str(e)}")
         return jsonify({'error': 'AI診断結果の処理に失敗しました'}), 500
 
+# ユーザーデータのエクスポート（会話・助成金メモ・AI診断結果）
+try:
+    from data_export import UserDataExporter, decode_cursor, DEFAULT_MAX_RECORDS
+    DATA_EXPORT_ENABLED = True
+except Exception as e:
+    logger.error(f"Data export module failed to load: {str(e)}")
+    DATA_EXPORT_ENABLED = False
+
+@app.route('/api/export', methods=['GET'])
+@require_auth
+@rate_limiter.limit(10, 3600, scope='export', key_func=_rate_limit_uid)
+def export_user_data():
+    """全データを NDJSON / ZIP でストリーミング返却（?format=ndjson|zip&cursor=継続トークン&max_records=件数）"""
+    if not DATA_EXPORT_ENABLED:
+        return jsonify({'error': 'エクスポート機能が利用できません'}), 500
+
+    try:
+        current_user = get_current_user()
+
+        output_format = request.args.get('format', 'ndjson')
+        if output_format not in ['ndjson', 'zip']:
+            return jsonify({'error': '無効な出力形式です'}), 400
+
+        cursor = request.args.get('cursor') or None
+        if cursor:
+            try:
+                decode_cursor(cursor)
+            except ValueError:
+                return jsonify({'error': '無効な継続トークンです'}), 400
+
+        max_records = min(max(request.args.get('max_records', DEFAULT_MAX_RECORDS, type=int), 1), DEFAULT_MAX_RECORDS)
+
+        from datetime import datetime
+        from firebase_config import firebase_service
+        exporter = UserDataExporter(firebase_service.get_db(), current_user['user_id'])
+        filename = f"jyoseikin-export-{datetime.now().strftime('%Y%m%d')}.{output_format}"
+
+        if output_format == 'zip':
+            response = Response(stream_with_context(exporter.zip_chunks(cursor, max_records)), mimetype='application/zip')
+        else:
+            response = Response(stream_with_context(exporter.ndjson_lines(cursor, max_records)),
+                                mimetype='application/x-ndjson; charset=utf-8')
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    except Exception as e:
+        logger.error(f"Error starting data export: {str(e)}")
+        return jsonify({'error': 'エクスポートの開始に失敗しました'}), 500
+
 @app.route('/api/forms', methods=['GET'])
+@conditional_get(_forms_version)
 def get_application_forms():
     """全助成金の申請書類情報を取得"""
     debug_info = {
@@ -2398,6 +2504,64 @@ def admin_dashboard():
     """管理者ダッシュボード"""
     return render_template('admin_dashboard.html')
 
+@app.route('/admin/api/metrics')
+@require_admin
+def admin_metrics():
+    """ワーカープロセス内のキャッシュ等の稼働指標"""
+    from auth_middleware import token_cache
+
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'token_cache': token_cache.get_stats(),
+        'rate_limiter': rate_limiter.get_stats(),
+        'write_behind': write_behind.get_stats(),
+        'timestamp': time.time()
+    })
+
+@app.route('/admin/api/users/<user_id>/status', methods=['POST'])
+@require_admin
+def admin_set_user_status(user_id):
+    """ユーザーの利用停止（blocked）・解除（active）
+
+    このワーカーのユーザーキャッシュは即時に破棄され、他のワーカーでも USER_CACHE_TTL_SECONDS 以内に反映される
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        status = data.get('status')
+        if status not in ('blocked', 'active'):
+            return jsonify({'success': False, 'error': "status は 'blocked' または 'active' を指定してください"}), 400
+
+        user_service = get_user_service()
+        if not user_service.get_user_by_uid(user_id):
+            return jsonify({'success': False, 'error': 'ユーザーが見つかりません'}), 404
+        if not user_service.set_user_status(user_id, status, reason=str(data.get('reason') or '')[:500]):
+            return jsonify({'success': False, 'error': '利用状態の変更に失敗しました'}), 500
+
+        logger.warning(f"User status changed by admin: {user_id} -> {status}")
+        return jsonify({'success': True, 'user_id': user_id, 'status': status})
+
+    except Exception as e:
+        logger.error(f"Admin user status error: {e}")
+        return jsonify({'success': False, 'error': 'システムエラーが発生しました'}), 500
+
+@app.route('/admin/api/jobs/reset-quotas', methods=['POST'])
+def admin_reset_quotas_job():
+    """質問回数の月次リセットジョブ（Cloud Scheduler から X-Job-Secret ヘッダー付きで呼び出す）"""
+    try:
+        from quota_reset_job import run_quota_reset, is_valid_job_secret, JOB_SECRET_HEADER
+
+        if not is_valid_job_secret(request.headers.get(JOB_SECRET_HEADER)):
+            return jsonify({'success': False, 'error': '認証に失敗しました'}), 403
+
+        dry_run = request.args.get('dry_run') == '1'
+        stats = run_quota_reset(dry_run=dry_run)
+        return jsonify({'success': True, 'dry_run': dry_run, 'stats': stats})
+
+    except Exception as e:
+        logger.error(f"Quota reset job error: {e}")
+        return jsonify({'success': False, 'error': 'システムエラーが発生しました'}), 500
+
 # =============================================================================
 # 専門家相談システム
 # =============================================================================
@@ -2419,13 +2583,9 @@ def get_user_info():
         current_user = get_current_user()
         user_id = current_user.get('user_id') or current_user.get('id')
 
-        # Firestoreからユーザーデータを取得
-        db = firebase_service.get_db()
-        user_ref = db.collection('users').document(user_id)
-        user_doc = user_ref.get()
-
-        if user_doc.exists:
-            user_data = user_doc.to_dict()
+        # require_auth で users/{uid} から取得済みのユーザーデータを使用（追加の読み取りなし）
+        if current_user.get('id') == user_id:
+            user_data = current_user
             return jsonify({
                 'id': user_id,
                 'email': current_user.get('email', ''),
@@ -2748,6 +2908,7 @@ def create_temp_reservation():
 
 @app.route('/api/expert-consultation/create-payment', methods=['POST'])
 @require_auth
+@checkout_rate_limit
 def create_payment_with_temp_reservation():
     """仮予約に基づいて決済セッションを作成"""
     if not EXPERT_CONSULTATION_ENABLED:
@@ -1,12 +1,16 @@
 from functools import wraps
 from flask import request, jsonify, g
 from firebase_config import firebase_service
-from models.user import User
-from models.subscription import SubscriptionService
+from token_cache import create_token_cache
+from service_container import services
+from logging_config import log_event
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 検証済みIDトークンのキャッシュ（ワーカープロセスごと）
+token_cache = create_token_cache(firebase_service.verify_token)
+
 def require_auth(f):
     """認証が必要なエンドポイント用のデコレータ"""
     @wraps(f)
@@ -23,12 +27,9 @@ def require_auth(f):
                 }), 401
             
             id_token = auth_header.split(' ')[1]
-            logger.info(f"Extracted token length: {len(id_token)}")
             
-            # Firebase ID token を検証
-            logger.info("Attempting to verify Firebase token...")
-            decoded_token = firebase_service.verify_token(id_token)
-            logger.info(f"Token verification result: {decoded_token is not None}")
+            # Firebase ID token を検証（有効期限内の検証済みトークンはキャッシュから）
+            decoded_token = token_cache.verify(id_token)
             
             if not decoded_token:
                 return jsonify({
@@ -37,15 +38,11 @@ def require_auth(f):
                 }), 401
             
             # ユーザー情報を取得
-            logger.info(f"Decoded token: {decoded_token}")
             uid = decoded_token.get('uid') or decoded_token.get('user_id') or decoded_token.get('sub')
-            logger.info(f"Extracted UID: {uid}")
             
-            logger.info("Creating User service...")
-            user_service = User(firebase_service)
-            logger.info("User service created, getting user by UID...")
+            # users/{uid} のポイント読み取り（ワーカー内の短期キャッシュあり）
+            user_service = services.get('user')
             user = user_service.get_user_by_uid(uid)
-            logger.info(f"get_user_by_uid result: {user is not None}")
             
             if not user:
                 # 新規ユーザーの場合は自動作成
@@ -56,14 +53,11 @@ def require_auth(f):
                         'email': decoded_token.get('email'),
                         'display_name': decoded_token.get('name', '')
                     })
-                    logger.info(f"User creation returned ID: {user_id}")
                     
                     # 初回サブスクリプションを作成
                     user_service.create_initial_subscription(uid)
-                    logger.info(f"Initial subscription created for uid: {uid}")
                     
                     user = user_service.get_user_by_id(user_id)
-                    logger.info(f"Retrieved created user: {user is not None}")
                 except Exception as e:
                     logger.error(f"Error creating user: {str(e)}")
                     return jsonify({
@@ -80,13 +74,12 @@ def require_auth(f):
                 }), 403
 
             # グローバル変数に設定
-            logger.info(f"Setting current user in g: {user is not None}")
             # user_idフィールドを確実に設定
             if user and 'user_id' not in user:
                 user['user_id'] = uid
             g.current_user = user
             g.uid = uid
-            logger.info("Auth middleware completed successfully")
+            log_event(logger, 'auth.ok', sample_rate=0.01, uid=uid)
             
             return f(*args, **kwargs)
             
@@ -99,8 +92,46 @@ def require_auth(f):
     
     return decorated_function
 
+def reserve_question_usage(user: dict) -> dict:
+    """ユーザーの質問枠を1つ仮押さえ（Flask のコンテキストを使わないのでワーカースレッドからも呼べる）"""
+    # user_idフィールドを使用（ドキュメントIDではなく）
+    user_id = user.get('user_id') or user.get('uid') or user['id']
+    # ユーザードキュメントのポインタがあればサブスクリプションをポイント読み取り
+    return services.get('subscription').reserve_question(
+        user_id, subscription_id=user.get('active_subscription_id')
+    )
+
+def activate_question_usage(reservation: dict):
+    """仮押さえの結果を現在のリクエストに設定。上限超過・エラー時は返すべきエラーレスポンスを返す"""
+    if not reservation['success']:
+        if reservation.get('code') == 'error':
+            logger.error(f"Subscription error: {reservation.get('error')}")
+            return jsonify({
+                'error': 'サブスクリプション情報の取得に失敗しました',
+                'code': 'SUBSCRIPTION_ERROR'
+            }), 500
+        
+        return jsonify({
+            'error': '質問回数の上限に達しています',
+            'code': 'LIMIT_EXCEEDED',
+            'usage_stats': reservation.get('usage_stats'),
+            'upgrade_required': True
+        }), 403
+    
+    # 使用状況をグローバル変数に設定
+    g.quota_reservation = reservation
+    g.usage_stats = reservation['usage_stats']
+    g.subscription = reservation['subscription']
+    return None
+
+def _release_uncommitted_reservation():
+    # エンドポイントで確定されなかった仮押さえ（AIエラー・例外）は解除
+    reservation = getattr(g, 'quota_reservation', None)
+    if reservation and not reservation.get('committed'):
+        services.get('subscription').release_question(reservation['subscription_id'], reservation['hold_id'])
+
 def check_usage_limit(f):
-    """使用制限をチェックするデコレータ"""
+    """使用制限をチェックするデコレータ（AI呼び出しの前に質問枠を仮押さえ）"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
         try:
@@ -110,37 +141,15 @@ def check_usage_limit(f):
                     'code': 'AUTH_REQUIRED'
                 }), 401
             
-            # user_idフィールドを使用（ドキュメントIDではなく）
-            user_id = g.current_user.get('user_id') or g.current_user.get('uid') or g.current_user['id']
-            subscription_service = SubscriptionService(firebase_service)
-            
-            # 使用状況を確認
-            usage_stats = subscription_service.get_usage_stats(user_id)
-            logger.info(f"User {user_id} usage stats: {usage_stats}")
-            
-            if usage_stats.get('error'):
-                logger.error(f"Subscription error for user {user_id}: {usage_stats.get('error')}")
-                return jsonify({
-                    'error': 'サブスクリプション情報の取得に失敗しました',
-                    'code': 'SUBSCRIPTION_ERROR'
-                }), 500
-            
-            # 質問回数の制限チェック
-            remaining = usage_stats.get('remaining', 0)
-            logger.info(f"User {user_id} has {remaining} questions remaining")
-            
-            if remaining <= 0:
-                return jsonify({
-                    'error': '質問回数の上限に達しています',
-                    'code': 'LIMIT_EXCEEDED',
-                    'usage_stats': usage_stats,
-                    'upgrade_required': True
-                }), 403
-            
-            # 使用状況をグローバル変数に設定
-            g.usage_stats = usage_stats
+            # 同時リクエストでも上限を超えないよう質問枠を仮押さえ
+            error_response = activate_question_usage(reserve_question_usage(g.current_user))
+            if error_response:
+                return error_response
             
-            return f(*args, **kwargs)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                _release_uncommitted_reservation()
             
         except Exception as e:
             logger.error(f"Usage limit check error: {str(e)}")
@@ -151,6 +160,26 @@ def check_usage_limit(f):
     
     return decorated_function
 
+def check_usage_limit_deferred(f):
+    """仮押さえをエンドポイント側で行うデコレータ（プロンプト組み立て等と並行して仮押さえする場合）
+
+    エンドポイントは reserve_question_usage → activate_question_usage を呼ぶこと。
+    確定されなかった仮押さえの解除はこのデコレータが行う
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not hasattr(g, 'current_user') or not g.current_user:
+            return jsonify({
+                'error': '認証が必要です',
+                'code': 'AUTH_REQUIRED'
+            }), 401
+        try:
+            return f(*args, **kwargs)
+        finally:
+            _release_uncommitted_reservation()
+    
+    return decorated_function
+
 def get_current_user():
     """現在認証されているユーザーを取得"""
     return getattr(g, 'current_user', None)
@@ -159,13 +188,34 @@ def get_usage_stats():
     """現在のユーザーの使用状況を取得"""
     return getattr(g, 'usage_stats', None)
 
+def commit_reservation(reservation: dict):
+    """仮押さえした質問枠を確定し、確定後の使用状況を返す（使用状況の再読み込みなし・ワーカースレッドからも呼べる）"""
+    if not reservation.get('committed'):
+        reservation['committed'] = services.get('subscription').commit_question(
+            reservation['subscription_id'], reservation['hold_id']
+        )
+        if not reservation['committed']:
+            logger.error(f"Failed to commit question usage for subscription {reservation['subscription_id']}")
+    return reservation['usage_stats']
+
+def commit_question_usage():
+    """check_usage_limit で仮押さえした質問枠を確定し、確定後の使用状況を返す（使用状況の再読み込みなし）"""
+    reservation = getattr(g, 'quota_reservation', None)
+    if not reservation:
+        return get_usage_stats()
+    return commit_reservation(reservation)
+
+def get_current_subscription():
+    """check_usage_limit で取得済みのアクティブなサブスクリプションを取得"""
+    return getattr(g, 'subscription', None)
+
 class AuthService:
     """認証関連のサービス"""
     
     def __init__(self):
         self.firebase_service = firebase_service
-        self.user_service = User(firebase_service)
-        self.subscription_service = SubscriptionService(firebase_service)
+        self.user_service = services.get('user')
+        self.subscription_service = services.get('subscription')
     
     def create_user_with_stripe(self, user_data: dict, stripe_customer_id: str) -> dict:
         """ユーザー作成とStripe連携"""
@@ -0,0 +1,109 @@
+"""
+メッセージ本文の圧縮（message_codec）のベンチマーク
+助成金ガイドラインのテキスト（リポジトリ直下の career-up_*.txt 等）からアシスタントの回答に近い
+Markdown の本文を作り、保存サイズと読み出し時間（転送時間の見積もり＋展開時間）を比較する。
+
+使い方:
+    python src/benchmark_message_codec.py
+    python src/benchmark_message_codec.py --samples 500 --bandwidth-mbps 50 --min-bytes 512
+    python src/benchmark_message_codec.py --files ../career-up_common.txt
+"""
+import os
+import glob
+import time
+import random
+from typing import Dict, List
+
+from message_codec import MessageCodec, ZSTD_ENABLED
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_FILES = os.path.join(REPO_ROOT, 'career-up_*.txt')
+
+
+def build_answers(paths: List[str], samples: int, seed: int = 0) -> List[str]:
+    """ガイドラインの抜粋を見出し・箇条書きで組み立てた回答（1,500〜6,000文字程度）を作る"""
+    rng = random.Random(seed)
+    lines = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            lines.extend(line.strip() for line in f if line.strip())
+    if not lines:
+        raise ValueError("No source text found")
+
+    answers = []
+    for _ in range(samples):
+        target = rng.randint(1500, 6000)
+        parts = ["## ご質問への回答", ""]
+        length = 0
+        start = rng.randrange(len(lines))
+        index = start
+        while length < target:
+            line = lines[index % len(lines)]
+            index += 1
+            if index % 12 == 0:
+                parts.extend(["", f"### {line[:30]}", ""])
+            else:
+                parts.append(f"- {line}")
+            length += len(line)
+        parts.extend(["", "※最新の要件は必ず厚生労働省の公式資料でご確認ください。"])
+        answers.append('\n'.join(parts))
+    return answers
+
+
+def run_benchmark(answers: List[str], codec: MessageCodec, bandwidth_mbps: float) -> Dict[str, float]:
+    raw_sizes = [len(answer.encode('utf-8')) for answer in answers]
+
+    started = time.perf_counter()
+    encoded = [codec.encode(answer) for answer in answers]
+    encode_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    decoded = [codec.decode(value) for value in encoded]
+    decode_seconds = time.perf_counter() - started
+    assert decoded == answers
+
+    stored_sizes = [len(value) if isinstance(value, bytes) else len(value.encode('utf-8')) for value in encoded]
+    bytes_per_second = bandwidth_mbps * 1_000_000 / 8
+    count = len(answers)
+    raw_total = sum(raw_sizes)
+    stored_total = sum(stored_sizes)
+    return {
+        'raw_kb_avg': raw_total / count / 1024,
+        'stored_kb_avg': stored_total / count / 1024,
+        'ratio': stored_total / raw_total,
+        'encode_us': encode_seconds / count * 1_000_000,
+        'decode_us': decode_seconds / count * 1_000_000,
+        # 読み出し1件あたり: 転送時間（帯域からの見積もり）＋展開時間
+        'read_ms_raw': raw_total / count / bytes_per_second * 1000,
+        'read_ms_stored': (stored_total / count / bytes_per_second + decode_seconds / count) * 1000,
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='メッセージ本文の圧縮のベンチマーク')
+    parser.add_argument('--files', nargs='*', help='回答の元にするテキストファイル（既定: リポジトリ直下の career-up_*.txt）')
+    parser.add_argument('--samples', type=int, default=200, help='回答の件数')
+    parser.add_argument('--min-bytes', type=int, default=1024, help='圧縮するしきい値（バイト）')
+    parser.add_argument('--bandwidth-mbps', type=float, default=100.0, help='読み出し時間の見積もりに使う帯域（Mbps）')
+    args = parser.parse_args()
+
+    answers = build_answers(args.files or sorted(glob.glob(DEFAULT_FILES)), args.samples)
+
+    algorithms = ['none', 'zlib'] + (['zstd'] if ZSTD_ENABLED else [])
+    print(f"samples={len(answers)} min_bytes={args.min_bytes} bandwidth={args.bandwidth_mbps}Mbps")
+    print(f"{'codec':<6} {'raw KB':>8} {'stored KB':>10} {'ratio':>6} {'enc us':>8} {'dec us':>8} "
+          f"{'read ms (raw)':>14} {'read ms':>8}")
+    for algorithm in algorithms:
+        codec = MessageCodec(algorithm=algorithm, min_bytes=args.min_bytes)
+        result = run_benchmark(answers, codec, args.bandwidth_mbps)
+        print(f"{algorithm:<6} {result['raw_kb_avg']:>8.1f} {result['stored_kb_avg']:>10.1f} {result['ratio']:>6.2f} "
+              f"{result['encode_us']:>8.0f} {result['decode_us']:>8.0f} "
+              f"{result['read_ms_raw']:>14.3f} {result['read_ms_stored']:>8.3f}")
+    if not ZSTD_ENABLED:
+        print("(zstandard is not installed; zstd skipped)")
+
+
+if __name__ == "__main__":
+    main()
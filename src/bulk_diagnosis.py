@@ -0,0 +1,218 @@
+"""
+AI助成金診断の一括実行ランナー（オフライン用）
+Web版の診断プロンプトと ClaudeService.chat_diagnosis_haiku を再利用し、
+スレッドプールで並列実行・レート制御・JSONLチェックポイントによる再開に対応
+"""
+import csv
+import io
+import json
+import os
+import sys
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set
+
+from diagnosis_prompt import build_diagnosis_prompt, clean_diagnosis_response
+
+logger = logging.getLogger(__name__)
+
+# chat_diagnosis_haiku はエラー時も例外ではなく案内文を返すため、先頭で判定する
+ERROR_RESPONSE_PREFIX = "申し訳ございません。"
+
+
+class RequestRateLimiter:
+    """1分あたりのリクエスト数を一定間隔に均して制御するスレッドセーフなリミッター"""
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def acquire(self):
+        if self.interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait_seconds = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+
+    def backoff(self, seconds: float):
+        """サーバー混雑時に後続リクエストの開始をまとめて遅らせる"""
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+class StubDiagnosisClient:
+    """ドライラン用のスタブ（APIを呼ばずに固定応答を返す）"""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+
+    def chat_diagnosis_haiku(self, prompt: str, context: str = "") -> str:
+        time.sleep(self.latency)
+        return f"【ドライラン】診断プロンプト {len(prompt)} 文字 / システムプロンプト {len(context)} 文字"
+
+
+class CheckpointStore:
+    """完了済みの診断結果をJSONLに追記し、再実行時にスキップするためのストア"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def completed_ids(self) -> Set[str]:
+        completed = set()
+        if not os.path.exists(self.path):
+            return completed
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    completed.add(str(json.loads(line)['id']))
+                except (ValueError, KeyError):
+                    # 中断時に書きかけになった最終行などは無視
+                    continue
+        return completed
+
+    def append(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def load_rows(path: str) -> List[Dict]:
+    """入力ファイル（JSONL/CSV）を読み込み。各行は id と diagnosis_data（またはフォーム項目そのもの）を持つ"""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        text = f.read()
+
+    if path.endswith('.csv'):
+        records = list(csv.DictReader(io.StringIO(text)))
+    else:
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    rows = []
+    for index, record in enumerate(records):
+        row_id = str(record.get('id') or record.get('company_id') or index + 1)
+        diagnosis_data = record.get('diagnosis_data')
+        if diagnosis_data is None:
+            diagnosis_data = {k: v for k, v in record.items() if k not in ('id', 'company_id')}
+        rows.append({'id': row_id, 'diagnosis_data': diagnosis_data})
+    return rows
+
+
+class BulkDiagnosisRunner:
+    """診断の一括実行"""
+
+    def __init__(self, client, checkpoint_path: str, workers: int = 4,
+                 requests_per_minute: float = 40, max_retries: int = 3, retry_backoff: float = 20.0):
+        self.client = client
+        self.checkpoint = CheckpointStore(checkpoint_path)
+        self.workers = max(1, workers)
+        self.rate_limiter = RequestRateLimiter(requests_per_minute)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.stats = {'completed': 0, 'skipped': 0, 'failed': 0}
+        self._stats_lock = threading.Lock()
+
+    def _diagnose(self, row: Dict) -> Optional[Dict]:
+        user_question, system_prompt = build_diagnosis_prompt(row['diagnosis_data'])
+
+        for attempt in range(1, self.max_retries + 1):
+            self.rate_limiter.acquire()
+            raw_response = self.client.chat_diagnosis_haiku(user_question, system_prompt)
+
+            if not raw_response.startswith(ERROR_RESPONSE_PREFIX):
+                return {
+                    'id': row['id'],
+                    'response': clean_diagnosis_response(raw_response),
+                    'completed_at': datetime.now().isoformat()
+                }
+
+            logger.warning(f"Diagnosis failed for row {row['id']} (attempt {attempt}/{self.max_retries}): {raw_response}")
+            # 全ワーカーの送信を遅らせてAPIの混雑・レート制限から回復させる
+            self.rate_limiter.backoff(self.retry_backoff * attempt)
+
+        return None
+
+    def _process(self, row: Dict):
+        try:
+            record = self._diagnose(row)
+        except Exception as e:
+            logger.error(f"Unexpected error for row {row['id']}: {str(e)}")
+            record = None
+
+        with self._stats_lock:
+            if record:
+                self.checkpoint.append(record)
+                self.stats['completed'] += 1
+            else:
+                self.stats['failed'] += 1
+
+    def _pending(self, rows: List[Dict]) -> Iterator[Dict]:
+        completed = self.checkpoint.completed_ids()
+        for row in rows:
+            if row['id'] in completed:
+                self.stats['skipped'] += 1
+                continue
+            yield row
+
+    def run(self, rows: List[Dict]) -> Dict[str, int]:
+        """未完了の行のみ実行。投入済みタスクをワーカー数の2倍までに抑えてメモリを一定に保つ"""
+        max_in_flight = self.workers * 2
+        in_flight = set()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for row in self._pending(rows):
+                if len(in_flight) >= max_in_flight:
+                    _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                in_flight.add(executor.submit(self._process, row))
+            wait(in_flight)
+
+        logger.info(f"Bulk diagnosis finished: {self.stats}")
+        return dict(self.stats)
+
+
+def main():
+    """CLI: python src/bulk_diagnosis.py clients.jsonl --checkpoint results.jsonl [--dry-run]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='AI助成金診断の一括実行')
+    parser.add_argument('input', help='診断データ（JSONLまたはCSV）')
+    parser.add_argument('--checkpoint', required=True, help='結果の追記先JSONL（再実行時は完了済みをスキップ）')
+    parser.add_argument('--workers', type=int, default=4, help='同時実行数')
+    parser.add_argument('--rpm', type=float, default=40, help='1分あたりの最大リクエスト数')
+    parser.add_argument('--max-retries', type=int, default=3, help='1件あたりの最大試行回数')
+    parser.add_argument('--dry-run', action='store_true', help='APIを呼ばずスタブで実行')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.dry_run:
+        client = StubDiagnosisClient()
+    else:
+        from claude_service import ClaudeService
+        client = ClaudeService()
+
+    runner = BulkDiagnosisRunner(
+        client,
+        args.checkpoint,
+        workers=args.workers,
+        requests_per_minute=args.rpm,
+        max_retries=args.max_retries
+    )
+    stats = runner.run(load_rows(args.input))
+
+    print(f"completed={stats['completed']} skipped={stats['skipped']} failed={stats['failed']}")
+    if stats['failed']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+助成金一括スクリーニング
+社労士事務所向けに、多数の顧問先企業プロファイル（CSV/JSONL）を
+LLMを使わずにNumPyの列演算でまとめて判定する
+"""
+import csv
+import io
+import json
+import sys
+import logging
+from typing import Dict, Iterable, Iterator, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 判定ルールの閾値（ClaudeService._check_business_improvement / _check_career_up_possibility と同一）
+SME_EMPLOYEE_LIMIT = 300      # 中小企業要件（簡易判定）
+SMALL_WORKPLACE_LIMIT = 30    # 事業場規模 30人未満/30人以上
+
+# 入力列名のゆらぎ吸収（/api/grant-check と無料診断フォームの両方に対応）
+COLUMN_ALIASES = {
+    'company_id': ['company_id', 'id', '企業ID', '顧問先ID'],
+    'company_name': ['company_name', 'name', '会社名', '企業名'],
+    'employee_count': ['employee_count', 'totalEmployees', '従業員数'],
+    'industry': ['industry', '業種'],
+    'current_min_wage': ['current_min_wage', 'minWage', '事業場内最低賃金'],
+}
+
+OUTPUT_COLUMNS = [
+    'company_id',
+    'company_name',
+    'employee_count',
+    'workplace_size',
+    'gyoumukaizen_status',
+    'career_up_status',
+    'recommended_agents',
+]
+
+# 出力時に何行ずつまとめてストリームに流すか
+STREAM_CHUNK_ROWS = 500
+
+
+class BulkScreeningService:
+    """企業プロファイルの一括助成金判定"""
+
+    def parse_profiles(self, text: str, input_format: str = None) -> Dict[str, List]:
+        """CSV/JSONLテキストを列指向の辞書に変換"""
+        if input_format is None:
+            input_format = 'jsonl' if text.lstrip().startswith('{') else 'csv'
+
+        if input_format == 'jsonl':
+            records = [json.loads(line) for line in text.splitlines() if line.strip()]
+        elif input_format == 'csv':
+            # Excel出力のBOM付きCSVにも対応
+            records = list(csv.DictReader(io.StringIO(text.lstrip('\ufeff'))))
+        else:
+            raise ValueError(f"Unsupported input format: {input_format}")
+
+        columns = {}
+        for canonical, aliases in COLUMN_ALIASES.items():
+            columns[canonical] = [self._pick(record, aliases) for record in records]
+
+        # 企業IDが無い行は行番号で補完
+        columns['company_id'] = [
+            value if value not in (None, '') else str(index + 1)
+            for index, value in enumerate(columns['company_id'])
+        ]
+        return columns
+
+    def _pick(self, record: Dict, aliases: List[str]):
+        for alias in aliases:
+            if alias in record and record[alias] not in (None, ''):
+                return record[alias]
+        return None
+
+    def _to_numeric(self, values: List) -> np.ndarray:
+        """数値列に変換（未入力・不正値は0として扱う: 単体判定と同じ挙動）"""
+        numeric = np.zeros(len(values), dtype=np.float64)
+        for index, value in enumerate(values):
+            if value is None:
+                continue
+            try:
+                numeric[index] = float(str(value).replace(',', '').replace('人', ''))
+            except ValueError:
+                continue
+        return numeric
+
+    def evaluate(self, columns: Dict[str, List]) -> Dict[str, np.ndarray]:
+        """ルールセットを列単位で評価"""
+        employees = self._to_numeric(columns['employee_count'])
+
+        # 業務改善助成金: 中小企業要件
+        gyoumukaizen_ok = employees <= SME_EMPLOYEE_LIMIT
+        small_workplace = employees < SMALL_WORKPLACE_LIMIT
+
+        # キャリアアップ助成金: 従業員がいれば可能性あり
+        career_up_ok = employees > 0
+
+        return {
+            'employee_count': employees,
+            'workplace_size': np.where(small_workplace, '30人未満', '30人以上'),
+            'gyoumukaizen_status': np.where(gyoumukaizen_ok, '適用可能', '要件不適合'),
+            'career_up_status': np.where(career_up_ok, '可能性あり', '情報不足'),
+            'recommended_agents': np.where(
+                gyoumukaizen_ok & career_up_ok, 'gyoumukaizen career-up',
+                np.where(gyoumukaizen_ok, 'gyoumukaizen', np.where(career_up_ok, 'career-up', ''))
+            ),
+        }
+
+    def iter_results(self, columns: Dict[str, List], evaluated: Dict[str, np.ndarray]) -> Iterator[Dict]:
+        """判定結果を1企業ずつ辞書として返す"""
+        for index in range(len(columns['company_id'])):
+            yield {
+                'company_id': columns['company_id'][index],
+                'company_name': columns['company_name'][index] or '',
+                'employee_count': int(evaluated['employee_count'][index]),
+                'workplace_size': str(evaluated['workplace_size'][index]),
+                'gyoumukaizen_status': str(evaluated['gyoumukaizen_status'][index]),
+                'career_up_status': str(evaluated['career_up_status'][index]),
+                'recommended_agents': str(evaluated['recommended_agents'][index]),
+            }
+
+    def stream_results(self, text: str, input_format: str = None, output_format: str = 'csv') -> Iterator[str]:
+        """入力を判定し、結果表をチャンク単位の文字列として順次返す"""
+        columns = self.parse_profiles(text, input_format)
+        evaluated = self.evaluate(columns)
+        logger.info(f"Bulk screening evaluated {len(columns['company_id'])} companies")
+
+        rows = self.iter_results(columns, evaluated)
+        if output_format == 'jsonl':
+            return self._chunked(json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+        if output_format == 'csv':
+            return self._chunked(self._csv_lines(rows))
+        raise ValueError(f"Unsupported output format: {output_format}")
+
+    def _csv_lines(self, rows: Iterable[Dict]) -> Iterator[str]:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=OUTPUT_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        if buffer.getvalue():
+            yield buffer.getvalue()
+
+    def _chunked(self, lines: Iterable[str]) -> Iterator[str]:
+        chunk = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) >= STREAM_CHUNK_ROWS:
+                yield ''.join(chunk)
+                chunk = []
+        if chunk:
+            yield ''.join(chunk)
+
+
+def main():
+    """CLI: python src/bulk_screening.py companies.csv [-o result.csv] [--format csv|jsonl]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='顧問先企業の助成金一括スクリーニング')
+    parser.add_argument('input', help='企業プロファイル（CSVまたはJSONL）')
+    parser.add_argument('-o', '--output', help='出力先ファイル（省略時は標準出力）')
+    parser.add_argument('--input-format', choices=['csv', 'jsonl'], help='入力形式（省略時は自動判定）')
+    parser.add_argument('--format', dest='output_format', choices=['csv', 'jsonl'], default='csv', help='出力形式')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    with open(args.input, 'r', encoding='utf-8-sig') as f:
+        text = f.read()
+
+    service = BulkScreeningService()
+    chunks = service.stream_results(text, args.input_format, args.output_format)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as out:
+            for chunk in chunks:
+                out.write(chunk)
+    else:
+        for chunk in chunks:
+            sys.stdout.write(chunk)
+
+
+if __name__ == "__main__":
+    main()
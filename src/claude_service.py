@@ -2,10 +2,30 @@ import os
 import anthropic
 from typing import Dict, List
 import logging
+from logging_config import log_event
 from forms_manager import FormsManager
+from agent_tools import AGENT_TOOLS, execute_tool
+from subsidy_calculator import gyoumukaizen_course_summary
 
 logger = logging.getLogger(__name__)
 
+# API呼び出し失敗時にユーザーへ返す案内文（この文言と完全一致する応答は課金・保存の対象外）
+ERROR_MESSAGES = {
+    'rate_limit': "申し訳ございません。Claude側のサーバーが込み合っています。少し時間をおいて再度質問してください。",
+    'timeout': "申し訳ございません。応答に時間がかかりすぎています。少し時間をおいて再度質問してください。",
+    'overloaded': "申し訳ございません。Claude側のサーバーが混雑しています。しばらく時間をおいて再度お試しください。",
+    'authentication': "申し訳ございません。システムの認証に問題が発生しています。管理者にお問い合わせください。",
+    'unknown': "申し訳ございません。Claude側で一時的な問題が発生している可能性があります。少し時間をおいて再度お試しください。",
+}
+
+_ERROR_MESSAGE_SET = frozenset(ERROR_MESSAGES.values())
+
+
+def is_error_response(response: str) -> bool:
+    """ClaudeService がAPIエラー時に返した案内文かどうか"""
+    return response in _ERROR_MESSAGE_SET
+
+
 class ClaudeService:
     # クラスレベルの定数定義（__init__の前に移動）
 
@@ -19,7 +39,7 @@ class ClaudeService:
             if file_path in self._file_cache:
                 cached_content, cached_mtime = self._file_cache[file_path]
                 if cached_mtime == file_mtime:
-                    logger.info(f"Loaded from cache: {os.path.basename(file_path)}")
+                    logger.debug("Loaded from cache: %s", file_path)
                     return cached_content
                 else:
                     logger.info(f"File updated, refreshing cache: {os.path.basename(file_path)}")
@@ -62,8 +82,7 @@ class ClaudeService:
     
     COMMON_DATE_EXPRESSIONS = """
 【日付表現の厳密な理解 - 必須】
-・「前日」= その日の1日前（例：4月1日の前日 = 3月31日）
-・「翌日」= その日の1日後（例：3月31日の翌日 = 4月1日）
+・「前日」「翌日」の具体的な日付は calculate_deadline ツールで求める
 ・「全日」= その日の0時から24時まで（例：3月31日の全日 = 3月31日の0時～24時）
 ・日付は絶対に勝手に変更しない"""
 
@@ -86,14 +105,14 @@ class ClaudeService:
    - 例：「正社員転換から6ヶ月後」→転換日が基準日
    - 例：「賃上げ実施から」→賃上げ実施日が基準日
 
-3. 【期間計算の厳密性】
-   - 「6ヶ月経過後2ヶ月以内」= 基準日＋6ヶ月＋1日～基準日＋8ヶ月
+3. 【期間計算はツールで行う】
+   - 基準日が特定できたら calculate_deadline ツールで期限を計算し、自分で日付を計算しない
    - 「速やかに」= 通常1ヶ月以内（要領で具体的期間を確認）
-   - 月数計算は日付ベースで厳密に（2024年1月15日＋6ヶ月 = 2024年7月15日）
+   - 業務改善助成金・キャリアアップ助成金の支給額・上限額は calculate_subsidy_amount ツールで計算する
 
 4. 【回答前の確認】
    - 要綱・要領の両方から期限情報を確認済みであることを明示
-   - 計算過程を明示
+   - ツールの計算結果（explanation）を計算過程として明示
    - 「基準日：○年○月○日、期限：○年○月○日～○年○月○日」形式で回答
    - 要領から得た詳細情報を必ず含める
 
@@ -140,6 +159,87 @@ class ClaudeService:
 {self.COMMON_TIMELINE_UNDERSTANDING}
 """
 
+    def _error_message(self, error: Exception) -> str:
+        """Claude APIのエラータイプに応じてユーザーフレンドリーなメッセージを返す"""
+        error_str = str(error).lower()
+
+        if 'rate_limit' in error_str or 'rate limit' in error_str:
+            return ERROR_MESSAGES['rate_limit']
+        elif 'timeout' in error_str or 'timed out' in error_str:
+            return ERROR_MESSAGES['timeout']
+        elif 'overloaded' in error_str or 'busy' in error_str:
+            return ERROR_MESSAGES['overloaded']
+        elif 'api_key' in error_str or 'authentication' in error_str:
+            return ERROR_MESSAGES['authentication']
+        else:
+            return ERROR_MESSAGES['unknown']
+
+    # ツール呼び出しの最大往復回数（無限ループ防止）
+    MAX_TOOL_ROUNDS = 5
+
+    def _create_message_with_tools(self, system_prompt: str, user_prompt: str) -> str:
+        """期限計算などのツールを使えるようにしてメッセージを生成し、最終的なテキスト回答を返す"""
+        messages = [{"role": "user", "content": user_prompt}]
+
+        for _ in range(self.MAX_TOOL_ROUNDS):
+            message = self.client.messages.create(
+                model=self.model,
+                max_tokens=4000,
+                temperature=0.3,
+                system=system_prompt,
+                tools=AGENT_TOOLS,
+                messages=messages
+            )
+
+            if message.stop_reason != "tool_use":
+                break
+
+            assistant_content = []
+            tool_results = []
+            for block in message.content:
+                if block.type == "text":
+                    assistant_content.append({"type": "text", "text": block.text})
+                elif block.type == "tool_use":
+                    assistant_content.append({"type": "tool_use", "id": block.id, "name": block.name, "input": block.input})
+                    tool_results.append({
+                        "type": "tool_result",
+                        "tool_use_id": block.id,
+                        "content": execute_tool(block.name, block.input)
+                    })
+
+            messages.append({"role": "assistant", "content": assistant_content})
+            messages.append({"role": "user", "content": tool_results})
+        else:
+            return self._finish_after_tool_rounds(system_prompt, messages)
+
+        return "".join(block.text for block in message.content if block.type == "text")
+
+    # 往復回数の上限に達したときに最後のツール結果へ添える指示
+    TOOL_ROUNDS_EXHAUSTED_PROMPT = "ツールの呼び出し回数の上限に達しました。これ以上ツールは使わず、ここまでの結果をもとに回答してください。"
+
+    def _finish_after_tool_rounds(self, system_prompt: str, messages: List[Dict]) -> str:
+        """ツールの往復が上限に達した場合に、ツールを使わない最終回答を1回だけ求める
+
+        tool_use を含む履歴には tools の定義が必要なため tools は渡したまま指示で止める。
+        それでもツールを呼んだ・本文が空の場合はエラー案内文を返す（質問枠の確定・会話保存の対象外）
+        """
+        logger.warning(f"Tool use did not finish within {self.MAX_TOOL_ROUNDS} rounds")
+        messages[-1]["content"].append({"type": "text", "text": self.TOOL_ROUNDS_EXHAUSTED_PROMPT})
+
+        message = self.client.messages.create(
+            model=self.model,
+            max_tokens=4000,
+            temperature=0.3,
+            system=system_prompt,
+            tools=AGENT_TOOLS,
+            messages=messages
+        )
+        text = "".join(block.text for block in message.content if block.type == "text")
+        if message.stop_reason == "tool_use" or not text.strip():
+            logger.error("No final answer after tool rounds were exhausted")
+            return ERROR_MESSAGES['unknown']
+        return text
+
     def _get_agent_prompt(self, agent_name: str, folder_path: str) -> str:
         """汎用エージェントプロンプト生成（フォルダ内全ファイル読み込み）"""
         try:
@@ -891,20 +991,7 @@ class ClaudeService:
 上記の企業情報を踏まえて、専門的なアドバイスをお願いします。
 """
             
-            message = self.client.messages.create(
-                model=self.model,
-                max_tokens=4000,
-                temperature=0.3,
-                system=system_prompt,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": user_prompt
-                    }
-                ]
-            )
-            
-            response = message.content[0].text
+            response = self._create_message_with_tools(system_prompt, user_prompt)
             
             # 様式URL情報を追加（必要に応じて）
             response = self._include_form_urls(agent_type, response, question)
@@ -913,19 +1000,7 @@ class ClaudeService:
             
         except Exception as e:
             logger.error(f"Claude API error: {str(e)}")
-            error_str = str(e).lower()
-            
-            # Claude APIのエラータイプに応じてユーザーフレンドリーなメッセージを返す
-            if 'rate_limit' in error_str or 'rate limit' in error_str:
-                return "申し訳ございません。Claude側のサーバーが込み合っています。少し時間をおいて再度質問してください。"
-            elif 'timeout' in error_str or 'time' in error_str:
-                return "申し訳ございません。応答に時間がかかりすぎています。少し時間をおいて再度質問してください。"
-            elif 'overloaded' in error_str or 'busy' in error_str:
-                return "申し訳ございません。Claude側のサーバーが混雑しています。しばらく時間をおいて再度お試しください。"
-            elif 'api_key' in error_str or 'authentication' in error_str:
-                return "申し訳ございません。システムの認証に問題が発生しています。管理者にお問い合わせください。"
-            else:
-                return "申し訳ございません。Claude側で一時的な問題が発生している可能性があります。少し時間をおいて再度お試しください。"
+            return self._error_message(e)
     
     def check_available_grants(self, company_info: Dict) -> List[Dict]:
         """
@@ -967,6 +1042,7 @@ class ClaudeService:
         if is_sme:
             # 事業場規模による助成額区分
             size_info = "30人未満" if employee_count < 30 else "30人以上"
+            course_ranges = '\n'.join(f"・{line}" for line in gyoumukaizen_course_summary(employee_count))
 
             # 短縮版（未登録ユーザー向け）
             short_description = f"""✅ 業務改善助成金: 申請可能
@@ -979,10 +1055,7 @@ class ClaudeService:
 
 【令和7年度 助成額】
 📊 最大600万円まで支給可能（賃金引上げ額・人数により決定）
-・30円コース: 30～130万円
-・45円コース: 45～180万円
-・60円コース: 60～300万円
-・90円コース: 90～600万円 ← 最高額はこちら
+{course_ranges} ← 最高額はこちら
 
 🚗 設備投資対象の拡大
 生産性向上設備、IT機器、車両購入なども対象となる場合があります
@@ -1117,19 +1190,7 @@ ANTHROPIC_API_KEYが設定されていないため、実際のAI診断は行え
             
         except Exception as e:
             logger.error(f"Claude diagnosis (Haiku) error: {str(e)}")
-            error_str = str(e).lower()
-            
-            # 各種エラーパターンでユーザーフレンドリーなメッセージ
-            if 'rate' in error_str and 'limit' in error_str:
-                return "申し訳ございません。Claude側のサーバーが込み合っています。少し時間をおいて再度質問してください。"
-            elif 'timeout' in error_str:
-                return "申し訳ございません。応答に時間がかかりすぎています。少し時間をおいて再度質問してください。"
-            elif 'overloaded' in error_str:
-                return "申し訳ございません。Claude側のサーバーが混雑しています。しばらく時間をおいて再度お試しください。"
-            elif 'authentication' in error_str or 'api' in error_str and 'key' in error_str:
-                return "申し訳ございません。システムの認証に問題が発生しています。管理者にお問い合わせください。"
-            else:
-                return "申し訳ございません。Claude側で一時的な問題が発生している可能性があります。少し時間をおいて再度お試しください。"
+            return self._error_message(e)
     
     def chat(self, prompt: str, context: str = "") -> str:
         """
@@ -1183,26 +1244,14 @@ ANTHROPIC_API_KEYが設定されていないため、実際のAI診断は行え
             
         except Exception as e:
             logger.error(f"Claude chat error: {str(e)}")
-            error_str = str(e).lower()
-            
-            # Claude APIのエラータイプに応じてユーザーフレンドリーなメッセージを返す
-            if 'rate_limit' in error_str or 'rate limit' in error_str:
-                return "申し訳ございません。Claude側のサーバーが込み合っています。少し時間をおいて再度質問してください。"
-            elif 'timeout' in error_str or 'time' in error_str:
-                return "申し訳ございません。応答に時間がかかりすぎています。少し時間をおいて再度質問してください。"
-            elif 'overloaded' in error_str or 'busy' in error_str:
-                return "申し訳ございません。Claude側のサーバーが混雑しています。しばらく時間をおいて再度お試しください。"
-            elif 'api_key' in error_str or 'authentication' in error_str:
-                return "申し訳ございません。システムの認証に問題が発生しています。管理者にお問い合わせください。"
-            else:
-                return "申し訳ございません。Claude側で一時的な問題が発生している可能性があります。少し時間をおいて再度お試しください。"
+            return self._error_message(e)
     
     def get_agent_response(self, prompt: str, agent_id: str) -> str:
         """
         専門エージェント用のレスポンス生成（個別ファイル読み込み方式）
         """
-        # デバッグログを最小限に削減
-        logger.info(f"Agent response for: {agent_id}, mock_mode: {self.mock_mode}")
+        log_event(logger, 'agent.response', sample_rate=0.1,
+                  agent_id=agent_id, mock_mode=self.mock_mode)
         
         try:
             # モックモードの場合
@@ -1228,20 +1277,7 @@ CLAUDE_API_KEYが設定されていないため、実際のAI相談は行えま
             # エージェントタイプに応じてシステムプロンプトを取得
             system_prompt = self._select_system_prompt_by_agent(agent_id, prompt)
             
-            message = self.client.messages.create(
-                model=self.model,
-                max_tokens=4000,
-                temperature=0.3,
-                system=system_prompt,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            )
-            
-            response = message.content[0].text
+            response = self._create_message_with_tools(system_prompt, prompt)
             
             # 様式URL情報を追加（必要に応じて）
             response = self._include_form_urls(agent_id, response, prompt)
@@ -1250,16 +1286,4 @@ CLAUDE_API_KEYが設定されていないため、実際のAI相談は行えま
             
         except Exception as e:
             logger.error(f"Agent response error: {str(e)}")
-            error_str = str(e).lower()
-            
-            # Claude APIのエラータイプに応じてユーザーフレンドリーなメッセージを返す
-            if 'rate_limit' in error_str or 'rate limit' in error_str:
-                return "申し訳ございません。Claude側のサーバーが込み合っています。少し時間をおいて再度質問してください。"
-            elif 'timeout' in error_str or 'time' in error_str:
-                return "申し訳ございません。応答に時間がかかりすぎています。少し時間をおいて再度質問してください。"
-            elif 'overloaded' in error_str or 'busy' in error_str:
-                return "申し訳ございません。Claude側のサーバーが混雑しています。しばらく時間をおいて再度お試しください。"
-            elif 'api_key' in error_str or 'authentication' in error_str:
-                return "申し訳ございません。システムの認証に問題が発生しています。管理者にお問い合わせください。"
-            else:
-                return "申し訳ございません。Claude側で一時的な問題が発生している可能性があります。少し時間をおいて再度お試しください。"
\ No newline at end of file
+            return self._error_message(e)
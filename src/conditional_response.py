@@ -0,0 +1,72 @@
+"""
+条件付きGET（ETag / If-None-Match）
+ハンドラを実行する前にリソースのバージョン（変更カウンタ・更新日時など）だけを取得して ETag を決め、
+クライアントの If-None-Match と一致すればFirestoreの一覧読み取りもJSONの組み立ても行わずに 304 を返す。
+
+ETag はユーザーID・リクエストのパスとクエリ・バージョンから作る（同じブラウザでアカウントを
+切り替えた場合に他のユーザーのキャッシュが有効と判定されないように）。
+
+    @app.route('/api/subsidies', methods=['GET'])
+    @require_auth
+    @conditional_get(lambda: counter_version(SUBSIDIES))
+    def get_subsidies(): ...
+"""
+import hashlib
+import logging
+from functools import wraps
+from typing import Callable, Optional
+
+from flask import request, g, make_response, Response
+
+logger = logging.getLogger(__name__)
+
+
+def make_etag(version: str) -> str:
+    uid = getattr(g, 'uid', None) or ''
+    source = f"{uid}|{request.full_path}|{version}"
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()[:24]
+
+
+def conditional_get(version_func: Callable[[], Optional[str]]):
+    """エンドポイント用デコレータ（require_auth の後に適用する）
+
+    version_func が None を返した場合（バージョンを取得できない等）は通常どおりレスポンスを返す
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            try:
+                version = version_func()
+            except Exception as e:
+                logger.warning(f"Failed to resolve resource version for {request.path}: {str(e)}")
+                version = None
+            if version is None:
+                return f(*args, **kwargs)
+
+            etag = make_etag(str(version))
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            # キャッシュしてよいが、使う前に必ず再検証させる
+            response.headers['Cache-Control'] = 'private, no-cache' if getattr(g, 'uid', None) else 'no-cache'
+            response.vary.add('Authorization')
+            return response
+
+        return decorated_function
+    return decorator
+
+
+def counter_version(resource: str) -> Optional[str]:
+    """ログイン中のユーザーの変更カウンタ（resource_versions）をバージョンにする"""
+    from service_container import services
+
+    uid = getattr(g, 'uid', None)
+    if not uid:
+        return None
+    version = services.get('resource_versions').get(uid, resource)
+    return None if version is None else str(version)
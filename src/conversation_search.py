@@ -0,0 +1,237 @@
+"""
+会話履歴の全文検索インデックス（文字バイグラム）
+日本語は分かち書きせずに検索できるよう、正規化した本文の連続する2文字をトークンとする。
+
+インデックスはユーザーごと・月ごとに、トークンのハッシュでバケットに分けた「ポスティング文書」に保存する:
+
+    conversation_search/{user_id}_{YYYYMM}_{bucket}
+        user_id, month, bucket
+        p: { "t<トークンのUTF-8の16進>": ["<会話ID>:<連番>", ...] }   連番 0 はタイトル
+
+追記時の書き込みは最大でバケット数（SEARCH_INDEX_BUCKETS）までなので、長い回答でも書き込み回数は一定。
+検索時は検索語のトークンが入るバケットの文書だけを、必要なトークンのフィールドに絞って読む。
+インデックスは候補の絞り込みにだけ使い、本文で検索語を含むことを確認してから結果にする
+（削除済みの会話・変更前のタイトルなど古いポスティングはここで落ちる）。
+
+環境変数:
+    SEARCH_INDEX_BUCKETS  1ユーザー・1か月あたりのポスティング文書の数（既定: 32）
+
+既存の会話のインデックス作成:
+    python src/conversation_search.py --reindex [--user-id USER_ID]
+"""
+import os
+import re
+import sys
+import zlib
+import logging
+import unicodedata
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from firebase_admin import firestore
+
+logger = logging.getLogger(__name__)
+
+SEARCH_COLLECTION = 'conversation_search'
+TITLE_SEQ = 0
+# Firestore の in 句に渡せる値の数
+IN_QUERY_LIMIT = 10
+# 1回のコミットで1ドキュメントに適用できるフィールド変換（ArrayUnion）の数
+MAX_FIELD_TRANSFORMS = 500
+SNIPPET_RADIUS = 40
+
+# 検索で区別しない記号・空白（Markdownの装飾を含む）
+_IGNORED_CHARS = re.compile(r'[\s#*_`>\-|~\[\]()（）「」『』【】、。,.!?！？:：;；"\'・…]+')
+
+
+def normalize(text: str) -> str:
+    """全角半角・大文字小文字をそろえ、記号と空白を除く"""
+    return _IGNORED_CHARS.sub('', unicodedata.normalize('NFKC', text or '').lower())
+
+
+def bigrams(text: str) -> Set[str]:
+    normalized = normalize(text)
+    return {normalized[i:i + 2] for i in range(len(normalized) - 1)}
+
+
+def token_field(token: str) -> str:
+    return 't' + token.encode('utf-8').hex()
+
+
+def make_snippet(text: str, query: str, radius: int = SNIPPET_RADIUS) -> Optional[str]:
+    """検索語を含む箇所の前後を切り出す（本文に含まれなければ None）
+
+    記号・空白を無視して照合するため、正規化後の位置を元の文字列の位置に対応付ける
+    """
+    needle = normalize(query)
+    if not needle:
+        return None
+
+    positions = []
+    normalized_chars = []
+    for index, char in enumerate(text or ''):
+        for normalized_char in normalize(char):
+            positions.append(index)
+            normalized_chars.append(normalized_char)
+
+    found = ''.join(normalized_chars).find(needle)
+    if found < 0:
+        return None
+
+    start = positions[found]
+    end = positions[found + len(needle) - 1] + 1
+    snippet = text[max(0, start - radius):end + radius].replace('\n', ' ').strip()
+    prefix = '…' if start > radius else ''
+    suffix = '…' if end + radius < len(text) else ''
+    return f"{prefix}{snippet}{suffix}"
+
+
+class ConversationSearchIndex:
+    def __init__(self, db, buckets: Optional[int] = None):
+        self.db = db
+        self.buckets = buckets or int(os.getenv('SEARCH_INDEX_BUCKETS', '32'))
+
+    def _bucket(self, token: str) -> int:
+        return zlib.crc32(token.encode('utf-8')) % self.buckets
+
+    def _doc_id(self, user_id: str, month: str, bucket: int) -> str:
+        return f"{user_id}_{month}_{bucket:02d}"
+
+    def index_entries(self, user_id: str, conversation_id: str, entries: Iterable[Tuple[int, str]],
+                      when: Optional[datetime] = None) -> int:
+        """(連番, 本文) のリストをインデックスに追加し、書き込んだ文書数を返す（連番 0 はタイトル）
+
+        1文書あたりのトークン数が MAX_FIELD_TRANSFORMS を超える場合（長い会話の再インデックスなど）は
+        超えないように分けて、別々のコミットで書き込む
+        """
+        month = (when or datetime.utcnow()).strftime('%Y%m')
+        postings: Dict[int, Dict[str, List[str]]] = {}
+        for seq, text in entries:
+            ref = f"{conversation_id}:{seq}"
+            for token in bigrams(text):
+                postings.setdefault(self._bucket(token), {}).setdefault(token_field(token), []).append(ref)
+        if not postings:
+            return 0
+
+        # rounds[i] にはバケットごとの i 番目のチャンクを入れる（同じ文書のチャンクは別のコミットになる）
+        rounds: List[List[Tuple[int, List[Tuple[str, List[str]]]]]] = []
+        for bucket, fields in postings.items():
+            items = list(fields.items())
+            for index, start in enumerate(range(0, len(items), MAX_FIELD_TRANSFORMS)):
+                if index == len(rounds):
+                    rounds.append([])
+                rounds[index].append((bucket, items[start:start + MAX_FIELD_TRANSFORMS]))
+
+        collection = self.db.collection(SEARCH_COLLECTION)
+        for writes in rounds:
+            batch = self.db.batch()
+            for bucket, chunk in writes:
+                batch.set(collection.document(self._doc_id(user_id, month, bucket)), {
+                    'user_id': user_id,
+                    'month': month,
+                    'bucket': bucket,
+                    'p': {field: firestore.ArrayUnion(refs) for field, refs in chunk}
+                }, merge=True)
+            batch.commit()
+        return len(postings)
+
+    def candidates(self, user_id: str, query: str) -> List[Tuple[str, int]]:
+        """検索語のすべてのトークンを含む (会話ID, 連番) を新しい順に返す（本文での確認は呼び出し側で行う）"""
+        tokens = bigrams(query)
+        if not tokens:
+            return []
+
+        fields = {token_field(token): self._bucket(token) for token in tokens}
+        buckets = sorted(set(fields.values()))
+
+        # ref ごとに含むトークンと、最も新しい月を集める
+        matched: Dict[str, Set[str]] = {}
+        latest_month: Dict[str, str] = {}
+        for start in range(0, len(buckets), IN_QUERY_LIMIT):
+            query_ref = (self.db.collection(SEARCH_COLLECTION)
+                         .where('user_id', '==', user_id)
+                         .where('bucket', 'in', buckets[start:start + IN_QUERY_LIMIT])
+                         .select(['month'] + [f"p.{field}" for field in fields]))
+            for doc in query_ref.stream():
+                data = doc.to_dict() or {}
+                month = data.get('month', '')
+                for field, refs in (data.get('p') or {}).items():
+                    if field not in fields:
+                        continue
+                    for ref in refs:
+                        matched.setdefault(ref, set()).add(field)
+                        if month > latest_month.get(ref, ''):
+                            latest_month[ref] = month
+
+        hits = []
+        for ref, found_fields in matched.items():
+            if len(found_fields) == len(fields):
+                conversation_id, _, seq = ref.rpartition(':')
+                hits.append((latest_month[ref], conversation_id, int(seq)))
+        hits.sort(reverse=True)
+        return [(conversation_id, seq) for _, conversation_id, seq in hits]
+
+
+def reindex_all(db, user_id: Optional[str] = None) -> Dict[str, int]:
+    """既存の会話（アーカイブ済みのメッセージを含む）をインデックスに追加"""
+    from integrated_conversation_service import IntegratedConversationService
+
+    service = IntegratedConversationService(db)
+    stats = {'conversations': 0, 'messages': 0}
+    query = db.collection(service.collection_name)
+    if user_id:
+        query = query.where('user_id', '==', user_id)
+
+    for doc in query.select(['user_id', 'title', 'updated_at']).stream():
+        data = doc.to_dict() or {}
+        owner = data.get('user_id')
+        if not owner:
+            continue
+        page = service.get_messages(doc.id, owner, limit=1_000_000)
+        if page is None:
+            continue
+        # 月ごとのバケットに分けて書き込む
+        by_month: Dict[str, List[Tuple[int, str]]] = {}
+        for message in page['messages']:
+            timestamp = message.get('timestamp')
+            if not isinstance(timestamp, datetime):
+                timestamp = data.get('updated_at') or datetime.utcnow()
+            by_month.setdefault(timestamp.strftime('%Y%m'), []).append((message['seq'], message.get('content') or ''))
+        title_month = (data.get('updated_at') or datetime.utcnow()).strftime('%Y%m')
+        by_month.setdefault(title_month, []).append((TITLE_SEQ, data.get('title') or ''))
+        for month, entries in by_month.items():
+            service.search_index.index_entries(owner, doc.id, entries, datetime.strptime(month, '%Y%m'))
+        stats['conversations'] += 1
+        stats['messages'] += len(page['messages'])
+        if stats['conversations'] % 100 == 0:
+            logger.info(f"Progress: {stats}")
+
+    return stats
+
+
+def main():
+    import argparse
+    from firebase_config import firebase_service
+
+    parser = argparse.ArgumentParser(description='会話履歴の検索インデックス')
+    parser.add_argument('--reindex', action='store_true', help='既存の会話をインデックスに追加')
+    parser.add_argument('--user-id', help='対象のユーザー（省略時は全ユーザー）')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if not args.reindex:
+        parser.print_help()
+        return
+
+    db = firebase_service.get_db()
+    if db is None:
+        print("Firestore is not available")
+        sys.exit(1)
+
+    stats = reindex_all(db, user_id=args.user_id)
+    print(' '.join(f"{key}={value}" for key, value in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 """
-AIエージェント会話履歴管理サービス
+AIエージェント会話履歴管理サービス（旧形式: agent_conversations）
+現在の会話は IntegratedConversationService（conversations）に保存している。
+既存データは migrate_agent_conversations.py で移行し、移行後に本モジュールと agent_conversations のインデックスを削除する。
 """
 import logging
 import uuid
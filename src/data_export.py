@@ -0,0 +1,230 @@
+"""
+ユーザーデータのエクスポート（会話・助成金メモ・AI診断結果）
+各コレクションをカーソルでページ単位に読み、1件ずつ NDJSON の行として書き出すジェネレータ。
+全件をメモリに載せないため、データ量によらずメモリ使用量は一定。
+
+出力（1行1JSON）:
+    {"type": "conversation", "data": {...}, "cursor": "..."}
+    {"type": "message", "conversation_id": "...", "data": {...}, "cursor": "..."}
+    {"type": "subsidy_memo", "data": {...}, "cursor": "..."}
+    {"type": "ai_result", "data": {...}, "cursor": "..."}
+    最終行: {"type": "end"} / 件数上限に達した場合は {"type": "continuation", "cursor": "..."}
+
+各行の cursor は「その行までを受け取った」位置を表す継続トークンで、?cursor= に渡すと次の行から再開する。
+ダウンロードが途中で切れた場合も、最後に受け取った行の cursor から再開できる。
+ZIP 形式では同じ内容を export.ndjson として圧縮して返す（シーク不要の書き込みで逐次送信）。
+"""
+import os
+import io
+import json
+import base64
+import logging
+import zipfile
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from message_codec import decode_text
+from integrated_conversation_service import ARCHIVE_COLLECTION, decode_archive
+
+logger = logging.getLogger(__name__)
+
+SECTIONS = ('conversations', 'subsidies', 'ai_results')
+PAGE_SIZE = 100
+ARCHIVE_PAGE_SIZE = 5
+DEFAULT_MAX_RECORDS = int(os.getenv('EXPORT_MAX_RECORDS', '20000'))
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    raw = json.dumps(state, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """継続トークンを復元（不正な値は ValueError）"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise ValueError('Invalid export cursor')
+    if not isinstance(state, dict) or state.get('s') not in SECTIONS:
+        raise ValueError('Invalid export cursor')
+    return state
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(bytes(value)).decode('ascii')
+    return str(value)
+
+
+class UserDataExporter:
+    def __init__(self, db, user_id: str, page_size: int = PAGE_SIZE):
+        self.db = db
+        self.user_id = user_id
+        self.page_size = page_size
+
+    # === 読み出し ===
+
+    def _pages(self, collection, query=None, after_id: Optional[str] = None) -> Iterator:
+        """ドキュメントID順にページ単位で読み、1件ずつ返す（after_id より後から）"""
+        query = query if query is not None else collection
+        while True:
+            page_query = query
+            if after_id:
+                page_query = page_query.where('__name__', '>', collection.document(after_id))
+            page_query = page_query.order_by('__name__').limit(self.page_size)
+            docs = list(page_query.stream())
+            yield from docs
+            if len(docs) < self.page_size:
+                return
+            after_id = docs[-1].id
+
+    def records(self, cursor: Optional[str] = None) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """(出力する行, その行の後から再開するための状態) を順に返す"""
+        state = decode_cursor(cursor) if cursor else {'s': SECTIONS[0]}
+        for section in SECTIONS[SECTIONS.index(state['s']):]:
+            section_state = state if section == state['s'] else {}
+            if section == 'conversations':
+                yield from self._conversations(section_state)
+            elif section == 'subsidies':
+                yield from self._subsidies(section_state)
+            else:
+                yield from self._ai_results(section_state)
+
+    def _conversations(self, state: Dict[str, Any]):
+        collection = self.db.collection('conversations')
+        after_id = state.get('after')
+
+        # 会話の途中で中断した場合はその会話の残りのメッセージから
+        if state.get('c'):
+            doc = collection.document(state['c']).get()
+            if doc.exists and (doc.to_dict() or {}).get('user_id') == self.user_id:
+                yield from self._conversation(doc, state.get('m'))
+            after_id = state['c']
+
+        for doc in self._pages(collection, collection.where('user_id', '==', self.user_id), after_id):
+            yield from self._conversation(doc)
+
+    def _conversation(self, doc, after_seq: Optional[int] = None):
+        data = doc.to_dict() or {}
+        legacy_messages = data.pop('messages', None)
+        if after_seq is None:
+            yield {'type': 'conversation', 'data': {**data, 'id': doc.id}}, {'s': 'conversations', 'c': doc.id, 'm': 0}
+            after_seq = 0
+
+        for message in self._messages(doc.id, data, legacy_messages, after_seq):
+            yield ({'type': 'message', 'conversation_id': doc.id, 'data': message},
+                   {'s': 'conversations', 'c': doc.id, 'm': message['seq']})
+
+    def _messages(self, conversation_id: str, data: Dict[str, Any], legacy_messages, after_seq: int):
+        """after_seq より後のメッセージを連番順に返す（アーカイブ→サブコレクションの順）"""
+        if legacy_messages is not None:
+            for seq, message in enumerate(legacy_messages, start=1):
+                if seq > after_seq:
+                    yield {**message, 'seq': seq}
+            return
+
+        archived_through = data.get('archived_through_seq', 0)
+        # クライアントへの送信待ちの間にクエリを開いたままにしないよう、チャンクも少しずつ読む
+        while after_seq < archived_through:
+            chunks = list(self.db.collection(ARCHIVE_COLLECTION)
+                          .where('conversation_id', '==', conversation_id)
+                          .where('last_seq', '>', after_seq)
+                          .order_by('last_seq')
+                          .limit(ARCHIVE_PAGE_SIZE)
+                          .stream())
+            if not chunks:
+                break
+            for chunk in chunks:
+                for message in decode_archive(chunk.get('data')):
+                    if message['seq'] > after_seq:
+                        yield message
+                        after_seq = message['seq']
+                after_seq = max(after_seq, chunk.get('last_seq'))
+
+        messages_ref = self.db.collection('conversations').document(conversation_id).collection('messages')
+        after_seq = max(after_seq, archived_through)
+        while True:
+            docs = list(messages_ref.where('seq', '>', after_seq).order_by('seq').limit(self.page_size).stream())
+            for message_doc in docs:
+                message = message_doc.to_dict()
+                message['content'] = decode_text(message.get('content'))
+                yield message
+            if len(docs) < self.page_size:
+                return
+            after_seq = docs[-1].get('seq')
+
+    def _subsidies(self, state: Dict[str, Any]):
+        collection = self.db.collection('users').document(self.user_id).collection('subsidies')
+        for doc in self._pages(collection, after_id=state.get('after')):
+            data = doc.to_dict() or {}
+            for entry in data.get('chat_history') or []:
+                entry['content'] = decode_text(entry.get('content'))
+            yield {'type': 'subsidy_memo', 'data': {**data, 'id': doc.id}}, {'s': 'subsidies', 'after': doc.id}
+
+    def _ai_results(self, state: Dict[str, Any]):
+        collection = self.db.collection('users').document(self.user_id).collection('ai_results')
+        for doc in self._pages(collection, after_id=state.get('after')):
+            data = doc.to_dict() or {}
+            data['content'] = decode_text(data.get('content'))
+            yield {'type': 'ai_result', 'data': {**data, 'id': doc.id}}, {'s': 'ai_results', 'after': doc.id}
+
+    # === 出力 ===
+
+    def ndjson_lines(self, cursor: Optional[str] = None, max_records: int = DEFAULT_MAX_RECORDS) -> Iterator[bytes]:
+        """NDJSON の行を返す。max_records 件で打ち切った場合は最終行で継続トークンを返す"""
+        count = 0
+        last_cursor = cursor
+        try:
+            for record, state in self.records(cursor):
+                if count >= max_records:
+                    yield self._line({'type': 'continuation', 'cursor': last_cursor})
+                    return
+                last_cursor = encode_cursor(state)
+                yield self._line({**record, 'cursor': last_cursor})
+                count += 1
+        except Exception as e:
+            # ヘッダー送信後はステータスを変えられないため、再開位置つきのエラー行で終える
+            logger.error(f"Export failed for user {self.user_id} after {count} record(s): {str(e)}")
+            yield self._line({'type': 'error', 'error': 'エクスポート中にエラーが発生しました', 'cursor': last_cursor})
+            return
+        logger.info(f"Exported {count} record(s) for user {self.user_id}")
+        yield self._line({'type': 'end'})
+
+    def zip_chunks(self, cursor: Optional[str] = None, max_records: int = DEFAULT_MAX_RECORDS) -> Iterator[bytes]:
+        """ndjson_lines の内容を export.ndjson として ZIP に圧縮しながら返す"""
+        buffer = _StreamBuffer()
+        with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+            with archive.open('export.ndjson', mode='w', force_zip64=True) as entry:
+                for line in self.ndjson_lines(cursor, max_records):
+                    entry.write(line)
+                    chunk = buffer.drain()
+                    if chunk:
+                        yield chunk
+        yield buffer.drain()
+
+    @staticmethod
+    def _line(record: Dict[str, Any]) -> bytes:
+        return (json.dumps(record, ensure_ascii=False, default=_json_default) + '\n').encode('utf-8')
+
+
+class _StreamBuffer(io.RawIOBase):
+    """ZipFile の書き込み先。シークできないストリームとして扱わせ、書かれた分を drain で取り出す"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
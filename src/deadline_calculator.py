@@ -0,0 +1,164 @@
+"""
+行政手続きの期間・期限計算
+民法の期間計算（初日不算入・応当日の前日満了・応当日がない月は末日満了）に沿って
+「○ヶ月以内」「○ヶ月経過後○ヶ月以内」「前日/翌日」を決定的に計算する
+"""
+import calendar
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple, Union
+
+DateLike = Union[date, str]
+
+
+def parse_date(value: DateLike) -> date:
+    """'YYYY-MM-DD'・'YYYY/MM/DD'・'YYYY年M月D日' または date/datetime を date に変換"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+
+    text = str(value).strip()
+    for fmt in ('%Y-%m-%d', '%Y/%m/%d', '%Y年%m月%d日'):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    # ISO形式の日時（'2025-04-01T00:00:00' など）
+    return datetime.fromisoformat(text).date()
+
+
+def format_japanese(value: date) -> str:
+    """2025年4月1日 形式で表示"""
+    return f"{value.year}年{value.month}月{value.day}日"
+
+
+def previous_day(value: DateLike) -> date:
+    """前日（例：4月1日の前日 = 3月31日）"""
+    return parse_date(value) - timedelta(days=1)
+
+
+def next_day(value: DateLike) -> date:
+    """翌日（例：3月31日の翌日 = 4月1日）"""
+    return parse_date(value) + timedelta(days=1)
+
+
+def _shift_month(year: int, month: int, months: int) -> Tuple[int, int]:
+    index = year * 12 + (month - 1) + months
+    return index // 12, index % 12 + 1
+
+
+def add_months(value: DateLike, months: int) -> date:
+    """応当日を返す（応当日がない場合はその月の末日。例：1月31日＋1ヶ月 = 2月末日）"""
+    base = parse_date(value)
+    year, month = _shift_month(base.year, base.month, months)
+    last_day = calendar.monthrange(year, month)[1]
+    return date(year, month, min(base.day, last_day))
+
+
+def period_end(start: DateLike, months: int = 0, days: int = 0) -> date:
+    """起算日から数えた期間の末日
+
+    月単位: 最後の月の起算日に応当する日の前日に満了し、応当日がなければその月の末日に満了
+    日単位: 起算日を1日目として数える
+    """
+    start_date = parse_date(start)
+    end = start_date
+
+    if months:
+        year, month = _shift_month(start_date.year, start_date.month, months)
+        last_day = calendar.monthrange(year, month)[1]
+        if start_date.day <= last_day:
+            end = date(year, month, start_date.day) - timedelta(days=1)
+        else:
+            end = date(year, month, last_day)
+        if days:
+            end = end + timedelta(days=days)
+    elif days:
+        end = start_date + timedelta(days=days - 1)
+
+    return end
+
+
+def counting_start(base: DateLike, include_base_day: bool = False) -> date:
+    """起算日（初日不算入が原則。「○日から起算して」のように初日を含む場合は include_base_day=True）"""
+    base_date = parse_date(base)
+    return base_date if include_base_day else base_date + timedelta(days=1)
+
+
+def calculate_within(base: DateLike, months: int = 0, days: int = 0, include_base_day: bool = False) -> Tuple[date, date]:
+    """「基準日から○ヶ月（○日）以内」の (起算日, 期限日)"""
+    start = counting_start(base, include_base_day)
+    return start, period_end(start, months=months, days=days)
+
+
+def calculate_window(base: DateLike, after_months: int, within_months: int,
+                     include_base_day: bool = False) -> Tuple[date, date]:
+    """「基準日から○ヶ月経過後○ヶ月以内」の (受付開始日, 期限日)
+
+    例：基準日 2024年1月15日、6ヶ月経過後2ヶ月以内 → 2024年7月16日～2024年9月15日
+    """
+    start = counting_start(base, include_base_day)
+    elapsed = period_end(start, months=after_months)
+    return elapsed + timedelta(days=1), period_end(start, months=after_months + within_months)
+
+
+def calculate(operation: str, base_date: DateLike, months: int = 0, days: int = 0,
+              after_months: int = 0, within_months: int = 0, include_base_day: bool = False) -> Dict:
+    """エージェントのツール呼び出し・メモ期限計算の共通入口。結果と計算過程を返す"""
+    base = parse_date(base_date)
+    result = {'operation': operation, 'base_date': base.isoformat(), 'base_date_ja': format_japanese(base)}
+
+    if operation == 'previous_day':
+        target = previous_day(base)
+        result.update({'date': target.isoformat(), 'explanation': f"{format_japanese(base)}の前日 = {format_japanese(target)}"})
+    elif operation == 'next_day':
+        target = next_day(base)
+        result.update({'date': target.isoformat(), 'explanation': f"{format_japanese(base)}の翌日 = {format_japanese(target)}"})
+    elif operation == 'add_months':
+        target = add_months(base, months)
+        result.update({'date': target.isoformat(), 'explanation': f"{format_japanese(base)}の{months}ヶ月後の応当日 = {format_japanese(target)}"})
+    elif operation == 'within':
+        start, end = calculate_within(base, months=months, days=days, include_base_day=include_base_day)
+        span = f"{months}ヶ月" if months else ''
+        span += f"{days}日" if days else ''
+        result.update({
+            'start_date': start.isoformat(),
+            'deadline': end.isoformat(),
+            'explanation': f"基準日：{format_japanese(base)}、起算日：{format_japanese(start)}、{span}以内の期限：{format_japanese(end)}"
+        })
+    elif operation == 'window':
+        start, end = calculate_window(base, after_months, within_months, include_base_day=include_base_day)
+        result.update({
+            'start_date': start.isoformat(),
+            'deadline': end.isoformat(),
+            'explanation': f"基準日：{format_japanese(base)}、{after_months}ヶ月経過後{within_months}ヶ月以内 = {format_japanese(start)}～{format_japanese(end)}"
+        })
+    else:
+        raise ValueError(f"Unknown operation: {operation}")
+
+    return result
+
+
+def resolve_deadline_rule(rule: Optional[Dict]) -> Optional[str]:
+    """助成金メモの deadline_rule から期限日（ISO形式）を求める。計算できない場合はNone
+
+    辞書でない値（APIから渡された文字列・配列など）は ValueError
+    """
+    if not rule:
+        return None
+    if not isinstance(rule, dict):
+        raise ValueError(f"deadline_rule must be an object, got {type(rule).__name__}")
+    if not rule.get('base_date'):
+        return None
+
+    operation = rule.get('operation') or ('window' if rule.get('after_months') else 'within')
+    result = calculate(
+        operation,
+        rule['base_date'],
+        months=int(rule.get('months') or 0),
+        days=int(rule.get('days') or 0),
+        after_months=int(rule.get('after_months') or 0),
+        within_months=int(rule.get('within_months') or 0),
+        include_base_day=bool(rule.get('include_base_day', False))
+    )
+    return result.get('deadline') or result.get('date')
@@ -0,0 +1,196 @@
+"""
+無料助成金診断のプロンプト組み立て・応答整形
+Web版（/api/joseikin-diagnosis）と一括診断ランナーで共通利用する
+"""
+import os
+import re
+import logging
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+DIAGNOSIS_DATA_FILE = '2025_jyoseikin_kaniyoryo2_20250831_185114_AI_plain.txt'
+
+# 業種を日本語に変換
+INDUSTRY_MAP = {
+    'construction': '建設業',
+    'manufacturing': '製造業',
+    'service': 'サービス業',
+    'it': 'IT・通信業',
+    'retail': '小売業・飲食業',
+    'other': 'その他'
+}
+
+DIAGNOSIS_SYSTEM_PROMPT = """あなたは助成金専門のアドバイザーです。企業の簡易診断フォームから収集した限定的な情報を基に、最適な助成金を提案します。
+
+【重要制約 - 絶対厳守】
+1. 提供されたデータベースの情報のみを使用してください
+2. 学習データは一切使用しないでください
+3. 「詳細は厚生労働省にお問い合わせください」という文言は使用禁止
+4. 記載されていない情報は「助成金レスキューの専門AIエージェントがより詳しくサポートします」と回答
+
+【回答形式 - 必須構造】
+各助成金について以下の形式で必ず回答してください：
+
+### 1. [助成金名]
+
+💰 **支給額**
+- 中小企業: ○○万円/人（または○○万円）
+- 大企業: ○○万円/人（または○○万円）
+- 加算条件: 具体的な加算額と条件
+
+✅ **主な要件**
+- 対象労働者: 具体的な条件
+- 事業主要件: 必要な制度や計画
+- 実施条件: 必要な取組や期間
+- その他: 重要な注意事項
+
+📋 **申請の流れ**
+1. 計画書提出（実施○ヶ月前まで）
+2. 取組実施（○ヶ月間）
+3. 支給申請（実施後○ヶ月以内）
+
+---
+
+【診断の優先順位】
+1. 業務改善助成金とキャリアアップ助成金を最優先で提案（該当する場合）
+2. 企業情報と明確に合致する助成金を優先
+3. 支給額が大きい順に提案
+4. 申請しやすさ（要件の明確さ）も考慮
+5. 最大5つまでの助成金に絞って提案
+
+【除外すべき助成金】
+以下の助成金は特殊な条件が必要なため、明確な該当条件がない限り提案しない：
+- 受動喫煙防止対策助成金（両立支援に「smoking」が含まれる中小企業のみ提案）
+- 障害者関連助成金（特別配慮労働者に障害者が明記されている場合のみ）
+- 建設業特有の助成金（業種が「construction」または「建設業」の場合のみ）
+
+【回答の具体性】
+- 支給額は必ず数値で明記（「最大」「〜まで」等も明確に）
+- 要件は箇条書きで分かりやすく
+- 申請期限や実施期間は具体的に記載"""
+
+_knowledge_cache = None
+
+
+def load_diagnosis_knowledge() -> str:
+    """診断用データベース（2025年度簡易要領）を読み込み（プロセス内で1回のみ）"""
+    global _knowledge_cache
+    if _knowledge_cache is not None:
+        return _knowledge_cache
+
+    # 作業ディレクトリ（Cloud Runでは/app）→ リポジトリルートの順に探す
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for path in [DIAGNOSIS_DATA_FILE, os.path.join(base_dir, DIAGNOSIS_DATA_FILE)]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                _knowledge_cache = f.read()
+                return _knowledge_cache
+        except FileNotFoundError:
+            continue
+
+    logger.error("診断データファイルが見つかりません")
+    return ""
+
+
+def build_diagnosis_prompt(diagnosis_data: Dict) -> Tuple[str, str]:
+    """診断フォームの入力から (ユーザー質問, システムプロンプト) を組み立てる"""
+    # データの前処理と解釈
+    industry = diagnosis_data.get('industry', '')
+    industry_ja = INDUSTRY_MAP.get(industry, industry) if industry else 'なし'
+
+    # 従業員数を解釈
+    total_employees = diagnosis_data.get('totalEmployees', 'なし')
+    is_small_business = False
+    if total_employees != 'なし' and str(total_employees).isdigit():
+        emp_count = int(total_employees)
+        is_small_business = emp_count <= 100  # 中小企業の判定
+
+    # 両立支援の内容を解釈
+    work_life_balance = diagnosis_data.get('workLifeBalance', 'なし')
+    needs_smoking_prevention = False
+    if work_life_balance and isinstance(work_life_balance, (list, str)):
+        needs_smoking_prevention = 'smoking' in work_life_balance
+
+    # 賃金関連の判定
+    min_wage = diagnosis_data.get('minWage', 'なし')
+    needs_wage_improvement = False
+    if min_wage != 'なし' and str(min_wage).isdigit():
+        wage = int(min_wage)
+        needs_wage_improvement = wage < 1100  # 低賃金の場合
+
+    logger.info(f"診断データ解釈結果: 業種={industry_ja}, 従業員数={total_employees}, 中小企業={is_small_business}, 受動喫煙対策={needs_smoking_prevention}, 賃金改善必要={needs_wage_improvement}")
+
+    # システムプロンプトに知識ベースを追加
+    system_prompt_with_data = f"{DIAGNOSIS_SYSTEM_PROMPT}\n\n【2025年度助成金データベース】\n{load_diagnosis_knowledge()}"
+
+    user_question = f"""
+以下の企業情報を基に、該当する助成金を診断してください。
+各助成金について、💰支給額、✅主な要件、📋申請の流れの3点を必ず明記してください。
+
+【企業情報】
+業種: {industry_ja}
+従業員数: {total_employees}人
+企業規模: {'中小企業' if is_small_business else '大企業' if total_employees != 'なし' else '不明'}
+雇用保険被保険者数: {diagnosis_data.get('insuredEmployees', 'なし')}
+有期契約労働者数: {diagnosis_data.get('temporaryEmployees', 'なし')}
+短時間労働者数: {diagnosis_data.get('partTimeEmployees', 'なし')}
+年齢構成: {diagnosis_data.get('ageGroups', 'なし')}
+特別配慮労働者: {diagnosis_data.get('specialNeeds', 'なし')}
+経営状況: {diagnosis_data.get('businessSituation', 'なし')}
+事業場内最低賃金: {min_wage}円/時{'（改善が必要）' if needs_wage_improvement else ''}
+賃金・処遇改善: {diagnosis_data.get('wageImprovement', 'なし')}
+投資・改善予定: {diagnosis_data.get('investments', 'なし')}
+両立支援: {work_life_balance}{'（受動喫煙防止対策を含む）' if needs_smoking_prevention else ''}
+
+【重要】
+- 業務改善助成金とキャリアアップ助成金を優先的に検討し、該当する場合は必ず上位に提案してください
+- この企業の状況から判断して、最も可能性が高い助成金を最大5つまで提案してください
+- 各助成金の支給額は必ず具体的な金額で示してください
+- 要件は企業情報と照らし合わせて、該当/非該当の判断材料を明確に示してください
+
+【判定の注意点】
+- 「なし」と記載された項目は、その条件に該当しないと判断してください
+- 例：特別配慮労働者が「なし」→ 障害者関連助成金は提案しない
+- 例：投資・改善予定が「なし」→ 設備投資が必要な助成金は慎重に判断
+- 例：両立支援が「なし」または「smoking」を含まない → 受動喫煙防止対策助成金は提案しない
+- 提供された情報から確実に該当すると判断できる助成金のみを提案してください
+- 受動喫煙防止対策助成金は中小企業が対象で、飲食店は助成率2/3、その他業種は1/2、上限100万円です
+"""
+    return user_question, system_prompt_with_data
+
+
+def _format_diagnosis_response(text: str) -> str:
+    """診断結果の改行を強制的に整理"""
+    # 助成金名の前に改行を強制挿入
+    text = re.sub(r'(\d+\.)\s*([^-\n]+助成金)', r'\n\n\1 \2\n', text)
+
+    # 項目（-で始まる行）の前に適切な改行
+    text = re.sub(r'([^\n])\s*-\s*(支給額|適用要件|申請準備|専門エージェント)', r'\1\n- \2', text)
+
+    # カテゴリ見出し（【】で囲まれた部分）の前後に改行
+    text = re.sub(r'([^\n])【([^】]+)】', r'\1\n\n【\2】\n', text)
+
+    # 連続する改行を整理（3個以上の改行を2個に）
+    text = re.sub(r'\n{3,}', '\n\n', text)
+
+    # 先頭と末尾の余分な改行を削除
+    return text.strip()
+
+
+def clean_diagnosis_response(raw_response: str) -> str:
+    """モデル応答を整形し、問い合わせ誘導文言を除去"""
+    # 強制的に改行を整理
+    response = _format_diagnosis_response(raw_response)
+
+    # 厚生労働省への問い合わせ文言を強制的に削除
+    response = re.sub(r'詳細は厚生労働省.*?ください[。\n]?', '', response)
+    response = re.sub(r'厚生労働省.*?お問い合わせ.*?[。\n]?', '', response)
+    response = re.sub(r'労働局.*?お問い合わせ.*?[。\n]?', '', response)
+    response = re.sub(r'ハローワーク.*?お問い合わせ.*?[。\n]?', '', response)
+    response = re.sub(r'詳しくは.*?ご確認ください[。\n]?', '詳しくは助成金レスキューの専門AIエージェントがサポートします。', response)
+    # 不完全な文章を削除
+    response = re.sub(r'詳細な手続きや申請方法については、最寄りの[。\n]?', '', response)
+    response = re.sub(r'詳細な.*?については、最寄りの[。\n]?', '', response)
+
+    return response
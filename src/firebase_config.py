@@ -78,10 +78,10 @@ class FirebaseService:
         """Firestoreデータベースのインスタンスを取得"""
         return self.db
     
-    def verify_token(self, id_token: str) -> Optional[dict]:
-        """Firebase ID tokenを検証"""
+    def verify_token(self, id_token: str, check_revoked: bool = False) -> Optional[dict]:
+        """Firebase ID tokenを検証（check_revoked=Trueで失効・無効化されたユーザーも拒否）"""
         try:
-            decoded_token = auth.verify_id_token(id_token)
+            decoded_token = auth.verify_id_token(id_token, check_revoked=check_revoked)
             return decoded_token
         except Exception as e:
             logger.error(f"Token verification error: {str(e)}")
@@ -105,7 +105,7 @@ except Exception as e:
     class DummyFirebaseService:
         def get_db(self):
             return None
-        def verify_token(self, token):
+        def verify_token(self, token, check_revoked=False):
             return None
         def create_custom_token(self, uid):
             return ""
@@ -1,25 +1,107 @@
 """
 統合会話履歴管理サービス (ChatGPT/Claude風)
-メッセージを会話スレッドごとに統合保存
+メッセージを会話スレッドごとに統合保存（conversations/{id}/messages/{連番} に追記）
+
+古いメッセージは conversation_archives に圧縮したチャンクとして移し（archive_old_messages）、
+ユーザーが履歴を遡ったときだけ読み出す。親ドキュメントには archived_through_seq（ここまでアーカイブ済み）
+と archived_until（アーカイブ済みの最後のメッセージの日時）を持つ。
+
+環境変数:
+    CONVERSATION_ARCHIVE_KEEP   アーカイブせずに残す直近のメッセージ数（既定: 100）
+    CONVERSATION_ARCHIVE_CHUNK  アーカイブ1チャンクあたりのメッセージ数（既定: 50）
 """
+import os
+import json
 import logging
 import uuid
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from firebase_admin import firestore
+from message_codec import encode_text, decode_text, message_codec, MessageCodec
+from write_behind import write_behind
+from conversation_search import ConversationSearchIndex, TITLE_SEQ, make_snippet
+from resource_versions import ResourceVersions, CONVERSATIONS
 
 logger = logging.getLogger(__name__)
 
+# メッセージは conversations/{id}/messages/{seq:08d} に1件1ドキュメントで追記する（親は会話のメタデータのみ）
+MESSAGES_SUBCOLLECTION = 'messages'
+PREVIEW_LENGTH = 50
+# 追記済みのターンID（再試行で同じ往復を二重に追記しないための記録）を親ドキュメントに残す件数
+RECENT_TURN_IDS = 20
+ARCHIVE_COLLECTION = 'conversation_archives'
+
+# アーカイブのチャンクはしきい値によらず常に圧縮する
+_archive_codec = MessageCodec(algorithm=message_codec.algorithm, min_bytes=0)
+
+
+def message_doc_id(seq: int) -> str:
+    """ゼロ埋めした連番（ドキュメントID順 = 送信順）"""
+    return f"{seq:08d}"
+
+
+def archive_doc_id(conversation_id: str, first_seq: int) -> str:
+    return f"{conversation_id}_{first_seq:08d}"
+
+
+def encode_archive(messages: List[Dict[str, Any]]) -> Any:
+    """チャンク内のメッセージ（本文は展開済み）を1つの圧縮データにまとめる"""
+    payload = [
+        {**message, 'timestamp': message['timestamp'].isoformat() if message.get('timestamp') else None}
+        for message in messages
+    ]
+    return _archive_codec.encode(json.dumps(payload, ensure_ascii=False))
+
+
+def decode_archive(data: Any) -> List[Dict[str, Any]]:
+    messages = json.loads(_archive_codec.decode(data))
+    for message in messages:
+        if message.get('timestamp'):
+            message['timestamp'] = datetime.fromisoformat(message['timestamp'])
+    return messages
+
+
+def make_preview(content: str) -> str:
+    return content[:PREVIEW_LENGTH] + ('...' if len(content) > PREVIEW_LENGTH else '')
+
+
+def encode_cursor(updated_at: datetime, conversation_id: str) -> str:
+    """一覧のページングカーソル（最後に返した会話の updated_at と ID）
+
+    updated_at が同じ会話がページの境目にあっても取りこぼさないよう、ID を並び順の決め手として含める
+    """
+    return f"{updated_at.isoformat()}|{conversation_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """カーソルを (updated_at, 会話ID) に復元（不正な値は ValueError）"""
+    updated_at, separator, conversation_id = cursor.partition('|')
+    if not separator or not conversation_id or '/' in conversation_id:
+        raise ValueError('Invalid conversation cursor')
+    return datetime.fromisoformat(updated_at), conversation_id
+
+
 class IntegratedConversationService:
     def __init__(self, db):
         self.db = db
         self.collection_name = 'conversations'
-        self.max_messages_per_conversation = 50  # メッセージ上限
+        self.messages_page_size = 50  # 会話取得時に返す直近のメッセージ数
+        self.archive_keep_recent = int(os.getenv('CONVERSATION_ARCHIVE_KEEP', '100'))
+        self.archive_chunk_size = int(os.getenv('CONVERSATION_ARCHIVE_CHUNK', '50'))
+        self.search_index = ConversationSearchIndex(db)
+        self.versions = ResourceVersions(db)
+    
+    def _messages_ref(self, conversation_id: str):
+        return self.db.collection(self.collection_name).document(conversation_id).collection(MESSAGES_SUBCOLLECTION)
     
-    def create_conversation(self, user_id: str, agent_id: str, agent_name: str, initial_message: str = None) -> Dict[str, Any]:
-        """新しい統合会話を作成"""
+    def create_conversation(self, user_id: str, agent_id: str, agent_name: str, initial_message: str = None,
+                            assistant_message: str = None, conversation_id: str = None) -> Dict[str, Any]:
+        """新しい統合会話を作成（assistant_message を渡すと最初の1往復をまとめて保存）
+
+        conversation_id を指定すると、保存前に会話IDをクライアントへ返せる（書き込みを後回しにする場合）
+        """
         try:
-            conversation_id = str(uuid.uuid4())
+            conversation_id = conversation_id or str(uuid.uuid4())
             now = datetime.utcnow()
             
             conversation_data = {
@@ -28,145 +110,477 @@ class IntegratedConversationService:
                 'agent_id': agent_id,
                 'agent_name': agent_name,
                 'title': f"{agent_name}との会話",  # デフォルトタイトル
-                'messages': [],
+                'message_seq': 0,
+                'message_count': 0,
+                'preview': None,
+                'last_sender': None,
                 'created_at': now,
                 'updated_at': now,
                 'is_active': True
             }
+            messages = []
+            
+            doc_ref = self.db.collection(self.collection_name).document(conversation_id)
+            batch = self.db.batch()
             
             # 初期メッセージがある場合は追加
             if initial_message:
-                conversation_data['messages'].append({
-                    'content': initial_message,
-                    'sender': 'user',
-                    'timestamp': now
-                })
+                message = {'seq': 1, 'content': initial_message, 'sender': 'user', 'timestamp': now}
+                batch.set(self._messages_ref(conversation_id).document(message_doc_id(1)),
+                          {**message, 'content': encode_text(initial_message)})
+                messages.append(message)
+                conversation_data['message_seq'] = 1
+                conversation_data['message_count'] = 1
+                conversation_data['preview'] = make_preview(initial_message)
+                conversation_data['last_sender'] = 'user'
+                conversation_data['has_user_message'] = True
                 # 最初のメッセージからタイトル生成
                 conversation_data['title'] = self._generate_title(initial_message, agent_name)
             
-            # Firestoreに保存
-            doc_ref = self.db.collection(self.collection_name).document(conversation_id)
-            doc_ref.set(conversation_data)
+            if assistant_message is not None:
+                seq = conversation_data['message_seq'] + 1
+                message = {'seq': seq, 'content': assistant_message, 'sender': 'assistant', 'timestamp': now}
+                batch.set(self._messages_ref(conversation_id).document(message_doc_id(seq)),
+                          {**message, 'content': encode_text(assistant_message)})
+                messages.append(message)
+                conversation_data['message_seq'] = seq
+                conversation_data['message_count'] = seq
+                conversation_data['preview'] = make_preview(assistant_message)
+                conversation_data['last_sender'] = 'assistant'
+            
+            # Firestoreに保存（親ドキュメントと初期メッセージを1回のバッチで）
+            batch.set(doc_ref, conversation_data)
+            batch.commit()
+            self.versions.bump(user_id, CONVERSATIONS)
+            
+            self._index_async(user_id, conversation_id,
+                              [(TITLE_SEQ, conversation_data['title'])] +
+                              [(message['seq'], message['content']) for message in messages])
             
             logger.info(f"Created integrated conversation: {conversation_id} for user: {user_id}")
-            return conversation_data
+            return {**conversation_data, 'messages': messages}
             
         except Exception as e:
             logger.error(f"Error creating integrated conversation: {str(e)}")
             raise
     
     def add_message(self, conversation_id: str, user_id: str, content: str, sender: str) -> bool:
-        """会話にメッセージを追加"""
+        """会話にメッセージを1件追記"""
+        return self.append_messages(conversation_id, user_id, [(content, sender)])
+    
+    def append_turn(self, conversation_id: str, user_id: str, user_message: str, assistant_message: str,
+                    turn_id: Optional[str] = None) -> bool:
+        """ユーザーの質問と応答の1往復を1回のトランザクションで追記（片方だけ保存されることはない）
+
+        turn_id を渡すと、同じ turn_id の往復が追記済みなら何もしない（再試行しても二重に追記されない）
+        """
+        return self.append_messages(conversation_id, user_id, [(user_message, 'user'), (assistant_message, 'assistant')],
+                                    turn_id=turn_id)
+    
+    def append_messages(self, conversation_id: str, user_id: str, messages: List[Tuple[str, str]],
+                        turn_id: Optional[str] = None) -> bool:
+        """(内容, 送信者) のリストを順に追記（権限チェック・連番の採番・親の更新を1回のトランザクションで）"""
         try:
             doc_ref = self.db.collection(self.collection_name).document(conversation_id)
-            doc = doc_ref.get()
+            seq, archived_through, title, appended = self._append_in_transaction(
+                self.db.transaction(), doc_ref, user_id, messages, turn_id
+            )
+            if not appended:
+                # コミットの結果が不明なまま再試行され、前回の書き込みが反映済みだった場合
+                logger.info(f"Turn {turn_id} already appended to conversation {conversation_id}")
+                return True
+            self.versions.bump(user_id, CONVERSATIONS)
+            logger.debug("Added %d message(s) to conversation %s", len(messages), conversation_id)
+            
+            # タイトルは最初のユーザーメッセージで変わるため毎回含める（同じ値の追加は書き込み済みと同じ結果）
+            first_seq = seq - len(messages) + 1
+            self._index_async(user_id, conversation_id,
+                              [(TITLE_SEQ, title)] +
+                              [(first_seq + index, content) for index, (content, _) in enumerate(messages)])
+            
+            # 直近分を超えてチャンク1つ分たまったら古いメッセージをアーカイブ（応答には影響させない）
+            if seq - archived_through >= self.archive_keep_recent + self.archive_chunk_size:
+                write_behind.submit('conversation.archive', self.archive_old_messages, conversation_id,
+                                    key=conversation_id)
+            return True
             
+        except PermissionError as e:
+            logger.error(str(e))
+            return False
+        except Exception as e:
+            logger.error(f"Error adding message to conversation: {str(e)}")
+            return False
+    
+    def _append_in_transaction(self, transaction, doc_ref, user_id: str, messages: List[Tuple[str, str]],
+                               turn_id: Optional[str] = None) -> Tuple[int, int, str, bool]:
+        """追記後の (最後の連番, アーカイブ済みの連番, タイトル, 追記したか) を返す"""
+        @firestore.transactional
+        def append(transaction):
+            doc = doc_ref.get(transaction=transaction)
             if not doc.exists:
-                logger.error(f"Conversation {conversation_id} not found")
-                return False
+                raise PermissionError(f"Conversation {doc_ref.id} not found")
             
             conversation_data = doc.to_dict()
             
             # ユーザー権限チェック
             if conversation_data['user_id'] != user_id:
-                logger.error(f"Unauthorized access to conversation {conversation_id}")
-                return False
-            
-            # メッセージ上限チェック
-            if len(conversation_data['messages']) >= self.max_messages_per_conversation:
-                # 古いメッセージを削除（最初の2件を削除して容量を確保）
-                conversation_data['messages'] = conversation_data['messages'][2:]
-                logger.info(f"Trimmed old messages for conversation {conversation_id}")
+                raise PermissionError(f"Unauthorized access to conversation {doc_ref.id}")
             
-            # 新しいメッセージを追加
-            now = datetime.utcnow()
-            new_message = {
-                'content': content,
-                'sender': sender,
-                'timestamp': now
-            }
+            recent_turn_ids = conversation_data.get('recent_turn_ids') or []
+            if turn_id and turn_id in recent_turn_ids:
+                return (conversation_data.get('message_seq', 0), conversation_data.get('archived_through_seq', 0),
+                        conversation_data['title'], False)
             
-            conversation_data['messages'].append(new_message)
-            conversation_data['updated_at'] = now
+            updates = {}
+            if turn_id:
+                updates['recent_turn_ids'] = (recent_turn_ids + [turn_id])[-RECENT_TURN_IDS:]
+            if 'messages' in conversation_data:
+                # 旧形式（messages 配列）の会話は追記と同じトランザクションで移行
+                updates.update(self._write_legacy_messages(transaction, doc_ref, conversation_data))
             
-            # タイトルが未設定またはデフォルトの場合、最初のユーザーメッセージから生成
-            if (conversation_data['title'] == f"{conversation_data['agent_name']}との会話" and 
-                sender == 'user' and 
-                len([msg for msg in conversation_data['messages'] if msg['sender'] == 'user']) == 1):
-                conversation_data['title'] = self._generate_title(content, conversation_data['agent_name'])
-            
-            # Firestoreを更新
-            doc_ref.update({
-                'messages': conversation_data['messages'],
-                'updated_at': now,
-                'title': conversation_data['title']
+            now = datetime.utcnow()
+            seq = updates.get('message_seq', conversation_data.get('message_seq', 0))
+            title = conversation_data['title']
+            has_user_message = updates.get('has_user_message', conversation_data.get('has_user_message', False))
+            
+            for content, sender in messages:
+                seq += 1
+                transaction.set(self._messages_ref(doc_ref.id).document(message_doc_id(seq)), {
+                    'seq': seq,
+                    'content': encode_text(content),
+                    'sender': sender,
+                    'timestamp': now
+                })
+                
+                # タイトルが未設定またはデフォルトの場合、最初のユーザーメッセージから生成
+                if sender == 'user' and not has_user_message:
+                    if title == f"{conversation_data['agent_name']}との会話":
+                        title = self._generate_title(content, conversation_data['agent_name'])
+                    has_user_message = True
+            
+            updates.update({
+                'message_seq': seq,
+                'message_count': seq,
+                'preview': make_preview(messages[-1][0]),
+                'last_sender': messages[-1][1],
+                'has_user_message': has_user_message,
+                'title': title,
+                'updated_at': now
             })
             
-            logger.info(f"Added message to conversation {conversation_id}")
+            transaction.update(doc_ref, updates)
+            return seq, conversation_data.get('archived_through_seq', 0), title, True
+        
+        return append(transaction)
+    
+    def _write_legacy_messages(self, writer, doc_ref, conversation_data: Dict[str, Any]) -> Dict[str, Any]:
+        """旧形式の messages 配列をサブコレクションに書き出し、親ドキュメントへの更新内容を返す
+
+        writer はバッチまたはトランザクション（migrate_conversations.py の一括移行と共用）
+        """
+        legacy_messages = conversation_data.get('messages') or []
+        for seq, message in enumerate(legacy_messages, start=1):
+            writer.set(self._messages_ref(doc_ref.id).document(message_doc_id(seq)), {
+                'seq': seq,
+                'content': encode_text(message.get('content', '')),
+                'sender': message.get('sender'),
+                'timestamp': message.get('timestamp')
+            })
+        
+        return {
+            'messages': firestore.DELETE_FIELD,
+            'message_seq': len(legacy_messages),
+            'message_count': len(legacy_messages),
+            'preview': make_preview(legacy_messages[-1].get('content', '')) if legacy_messages else None,
+            'last_sender': legacy_messages[-1].get('sender') if legacy_messages else None,
+            'has_user_message': any(message.get('sender') == 'user' for message in legacy_messages)
+        }
+    
+    def migrate_legacy_conversation(self, doc, batch) -> bool:
+        """旧形式の会話ドキュメント1件分の移行をバッチに積む（移行済みなら False）
+
+        サブコレクション移行済みで一覧用の message_count / last_sender がない会話は、その補完だけを積む
+        """
+        conversation_data = doc.to_dict() or {}
+        if 'messages' not in conversation_data:
+            if 'message_count' in conversation_data:
+                return False
+            latest = list(self._messages_ref(doc.id)
+                          .order_by('seq', direction=firestore.Query.DESCENDING)
+                          .limit(1).stream())
+            batch.update(doc.reference, {
+                'message_count': conversation_data.get('message_seq', 0),
+                'last_sender': latest[0].to_dict().get('sender') if latest else None
+            })
             return True
-            
-        except Exception as e:
-            logger.error(f"Error adding message to conversation: {str(e)}")
-            return False
+        batch.update(doc.reference, self._write_legacy_messages(batch, doc.reference, conversation_data))
+        return True
     
     def get_conversation(self, conversation_id: str, user_id: str) -> Optional[Dict[str, Any]]:
-        """会話を取得（ユーザー認証付き）"""
+        """会話を取得（ユーザー認証付き）。messages には直近 messages_page_size 件を古い順で含める"""
         try:
-            doc_ref = self.db.collection(self.collection_name).document(conversation_id)
-            doc = doc_ref.get()
-            
-            if not doc.exists:
-                return None
-            
-            conversation_data = doc.to_dict()
-            
-            # ユーザー権限チェック
-            if conversation_data['user_id'] != user_id:
-                logger.error(f"Unauthorized access to conversation {conversation_id}")
+            conversation_data = self._get_owned_conversation(conversation_id, user_id)
+            if not conversation_data:
                 return None
             
+            page = self._read_messages(conversation_id, conversation_data, self.messages_page_size)
+            conversation_data['messages'] = page['messages']
+            conversation_data['next_before'] = page['next_before']
             return conversation_data
             
         except Exception as e:
             logger.error(f"Error getting conversation: {str(e)}")
             return None
     
+    def _get_owned_conversation(self, conversation_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        doc = self.db.collection(self.collection_name).document(conversation_id).get()
+        if not doc.exists:
+            return None
+        
+        conversation_data = doc.to_dict()
+        
+        # ユーザー権限チェック
+        if conversation_data['user_id'] != user_id:
+            logger.error(f"Unauthorized access to conversation {conversation_id}")
+            return None
+        return conversation_data
+    
+    def _read_messages(self, conversation_id: str, conversation_data: Dict[str, Any],
+                       limit: int, before_seq: Optional[int] = None) -> Dict[str, Any]:
+        """before_seq より前の直近 limit 件を古い順で返す。next_before は次に遡るときのカーソル（なければ None）"""
+        if 'messages' in conversation_data:
+            # 未移行の会話は配列から切り出す
+            legacy = [
+                {'seq': seq, **message}
+                for seq, message in enumerate(conversation_data['messages'] or [], start=1)
+            ]
+            if before_seq is not None:
+                legacy = [message for message in legacy if message['seq'] < before_seq]
+            messages = legacy[-limit:]
+        else:
+            archived_through = conversation_data.get('archived_through_seq', 0)
+            messages = []
+            if before_seq is None or before_seq - 1 > archived_through:
+                query = self._messages_ref(conversation_id).order_by('seq', direction=firestore.Query.DESCENDING)
+                if before_seq is not None:
+                    query = query.where('seq', '<', before_seq)
+                messages = [self._decode_message(doc.to_dict()) for doc in query.limit(limit).stream()]
+                messages.reverse()
+            
+            # 直近分で足りない場合だけアーカイブを読む
+            if len(messages) < limit and archived_through:
+                upper = messages[0]['seq'] if messages else (before_seq or archived_through + 1)
+                messages = self._read_archived(conversation_id, min(upper, archived_through + 1),
+                                               limit - len(messages)) + messages
+        
+        next_before = messages[0]['seq'] if messages and messages[0]['seq'] > 1 else None
+        return {'messages': messages, 'next_before': next_before}
+    
+    def _index_async(self, user_id: str, conversation_id: str, entries: List[Tuple[int, str]]):
+        """検索インデックスへの追加はレスポンス後にまとめて行う"""
+        write_behind.submit('conversation.search_index', self.search_index.index_entries,
+                            user_id, conversation_id, entries, key=conversation_id)
+    
+    def search(self, user_id: str, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """会話タイトル・メッセージの全文検索。一致箇所の前後を snippet として新しい順に返す
+
+        インデックスで絞り込んだ候補のメッセージだけを読み、本文に検索語を含むものを返す
+        """
+        candidates = self.search_index.candidates(user_id, query)[:limit * 3]
+        if not candidates:
+            return []
+        
+        collection = self.db.collection(self.collection_name)
+        conversation_ids = list(dict.fromkeys(conversation_id for conversation_id, _ in candidates))
+        conversations = {
+            doc.id: doc.to_dict()
+            for doc in self.db.get_all([collection.document(conversation_id) for conversation_id in conversation_ids],
+                                       field_paths=['user_id', 'title', 'agent_id', 'agent_name', 'is_active',
+                                                    'archived_through_seq'])
+            if doc.exists
+        }
+        
+        message_refs = [self._messages_ref(conversation_id).document(message_doc_id(seq))
+                        for conversation_id, seq in candidates if seq != TITLE_SEQ]
+        messages = {
+            (doc.reference.parent.parent.id, doc.get('seq')): self._decode_message(doc.to_dict())
+            for doc in self.db.get_all(message_refs) if doc.exists
+        } if message_refs else {}
+        
+        results = []
+        for conversation_id, seq in candidates:
+            conversation = conversations.get(conversation_id)
+            if (not conversation or conversation.get('user_id') != user_id
+                    or not conversation.get('is_active', True)):
+                continue
+            
+            if seq == TITLE_SEQ:
+                message = {'seq': TITLE_SEQ, 'content': conversation.get('title') or '', 'sender': None,
+                           'timestamp': None}
+            else:
+                message = messages.get((conversation_id, seq))
+                if message is None and seq <= conversation.get('archived_through_seq', 0):
+                    archived = self._read_archived(conversation_id, seq + 1, 1)
+                    message = archived[0] if archived and archived[0]['seq'] == seq else None
+            if message is None:
+                continue
+            
+            snippet = make_snippet(message.get('content') or '', query)
+            if snippet is None:
+                continue
+            results.append({
+                'conversation_id': conversation_id,
+                'title': conversation.get('title'),
+                'agent_id': conversation.get('agent_id'),
+                'agent_name': conversation.get('agent_name'),
+                'seq': seq,
+                'sender': message.get('sender'),
+                'timestamp': message.get('timestamp'),
+                'snippet': snippet
+            })
+            if len(results) >= limit:
+                break
+        
+        logger.debug("Search for user %s: %d candidate(s), %d result(s)", user_id, len(candidates), len(results))
+        return results
+    
+    def _read_archived(self, conversation_id: str, before_seq: int, limit: int) -> List[Dict[str, Any]]:
+        """アーカイブから before_seq より前の直近 limit 件を古い順で返す"""
+        query = (self.db.collection(ARCHIVE_COLLECTION)
+                 .where('conversation_id', '==', conversation_id)
+                 .where('first_seq', '<', before_seq)
+                 .order_by('first_seq', direction=firestore.Query.DESCENDING))
+        
+        messages: List[Dict[str, Any]] = []
+        for doc in query.limit(limit // max(1, self.archive_chunk_size) + 2).stream():
+            chunk = [message for message in decode_archive(doc.get('data')) if message['seq'] < before_seq]
+            messages = chunk + messages
+            if len(messages) >= limit:
+                break
+        return messages[-limit:]
+    
+    def archive_old_messages(self, conversation_id: str) -> int:
+        """直近 archive_keep_recent 件より古いメッセージをチャンク単位でアーカイブに移し、移した件数を返す
+
+        チャンクの保存・メッセージの削除・親の archived_through_seq の更新は1回のバッチで行う。
+        同じ会話に対して重複して実行されても同じチャンクを上書きするだけで結果は変わらない
+        """
+        doc_ref = self.db.collection(self.collection_name).document(conversation_id)
+        doc = doc_ref.get(field_paths=['user_id', 'message_seq', 'archived_through_seq'])
+        if not doc.exists:
+            return 0
+        
+        data = doc.to_dict()
+        seq = data.get('message_seq', 0)
+        archived_through = data.get('archived_through_seq', 0)
+        archived = 0
+        
+        while seq - archived_through >= self.archive_keep_recent + self.archive_chunk_size:
+            first_seq, last_seq = archived_through + 1, archived_through + self.archive_chunk_size
+            docs = list(self._messages_ref(conversation_id)
+                        .where('seq', '>=', first_seq)
+                        .where('seq', '<=', last_seq)
+                        .order_by('seq')
+                        .stream())
+            messages = [self._decode_message(message_doc.to_dict()) for message_doc in docs]
+            
+            batch = self.db.batch()
+            if messages:
+                batch.set(self.db.collection(ARCHIVE_COLLECTION).document(archive_doc_id(conversation_id, first_seq)), {
+                    'conversation_id': conversation_id,
+                    'user_id': data['user_id'],
+                    'first_seq': first_seq,
+                    'last_seq': last_seq,
+                    'count': len(messages),
+                    'data': encode_archive(messages),
+                    'created_at': datetime.utcnow()
+                })
+            for message_doc in docs:
+                batch.delete(message_doc.reference)
+            
+            updates = {'archived_through_seq': last_seq}
+            if messages and messages[-1].get('timestamp'):
+                updates['archived_until'] = messages[-1]['timestamp']
+            batch.update(doc_ref, updates)
+            batch.commit()
+            
+            archived_through = last_seq
+            archived += len(messages)
+        
+        if archived:
+            logger.info(f"Archived {archived} message(s) of conversation {conversation_id} "
+                        f"(through seq {archived_through})")
+        return archived
+    
+    @staticmethod
+    def _decode_message(message: Dict[str, Any]) -> Dict[str, Any]:
+        """保存時に圧縮された本文を文字列に戻す"""
+        message['content'] = decode_text(message.get('content'))
+        return message
+    
+    def get_messages(self, conversation_id: str, user_id: str, limit: int = 50,
+                     before_seq: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """メッセージ履歴をページ単位で取得（新しい方から遡る）"""
+        try:
+            conversation_data = self._get_owned_conversation(conversation_id, user_id)
+            if not conversation_data:
+                return None
+            return self._read_messages(conversation_id, conversation_data, limit, before_seq)
+            
+        except Exception as e:
+            logger.error(f"Error getting conversation messages page: {str(e)}")
+            return None
+    
+    # 会話一覧で読み取るフィールド（メッセージ本文・旧形式の messages 配列は読まない）
+    LIST_FIELDS = ['id', 'agent_id', 'agent_name', 'title', 'preview', 'message_count', 'last_sender',
+                   'created_at', 'updated_at', 'is_active']
+    
     def get_conversations(self, user_id: str, limit: int = 30) -> List[Dict[str, Any]]:
         """ユーザーの会話一覧を取得（更新日時順）"""
+        return self.list_conversations(user_id, limit)['conversations']
+    
+    def list_conversations(self, user_id: str, limit: int = 30, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """会話一覧をページ単位で取得（一覧用のフィールドのみ読み取り）
+
+        next_cursor は次のページの取得に渡す値（最後のページなら None）。不正なカーソルは ValueError
+        """
+        cursor_values = decode_cursor(cursor) if cursor else None
         try:
-            conversations_ref = (self.db.collection(self.collection_name)
-                               .where('user_id', '==', user_id)
-                               .where('is_active', '==', True)
-                               .order_by('updated_at', direction=firestore.Query.DESCENDING)
-                               .limit(limit))
-            
-            docs = conversations_ref.stream()
+            query = (self.db.collection(self.collection_name)
+                     .where('user_id', '==', user_id)
+                     .where('is_active', '==', True)
+                     .order_by('updated_at', direction=firestore.Query.DESCENDING)
+                     .order_by('__name__', direction=firestore.Query.DESCENDING)
+                     .select(self.LIST_FIELDS))
+            if cursor_values is not None:
+                cursor_updated_at, cursor_id = cursor_values
+                query = query.start_after({'updated_at': cursor_updated_at, '__name__': cursor_id})
+            
+            # 1件多く読んで次のページの有無を判定
+            docs = list(query.limit(limit + 1).stream())
             conversations = []
             
-            for doc in docs:
+            for doc in docs[:limit]:
                 conversation_data = doc.to_dict()
-                
-                # プレビュー生成（最後のメッセージから）
-                preview = "まだメッセージがありません"
-                if conversation_data['messages']:
-                    last_message = conversation_data['messages'][-1]
-                    preview = last_message['content'][:50] + ('...' if len(last_message['content']) > 50 else '')
-                
-                conversation_data['preview'] = preview
+                conversation_data.setdefault('id', doc.id)
+                # プレビュー等は追記時に保存済み（未移行の会話は migrate_conversations.py の実行後に表示される）
+                conversation_data['preview'] = conversation_data.get('preview') or "まだメッセージがありません"
                 conversations.append(conversation_data)
             
-            logger.info(f"Retrieved {len(conversations)} conversations for user: {user_id}")
-            return conversations
+            next_cursor = (encode_cursor(conversations[-1]['updated_at'], docs[limit - 1].id)
+                           if len(docs) > limit else None)
+            logger.debug("Retrieved %d conversations for user: %s", len(conversations), user_id)
+            return {'conversations': conversations, 'next_cursor': next_cursor}
             
         except Exception as e:
             logger.error(f"Error getting conversations for user {user_id}: {str(e)}")
-            return []
+            return {'conversations': [], 'next_cursor': None}
     
     def update_conversation_title(self, conversation_id: str, user_id: str, title: str) -> bool:
         """会話タイトルを更新"""
         try:
             doc_ref = self.db.collection(self.collection_name).document(conversation_id)
-            doc = doc_ref.get()
+            doc = doc_ref.get(field_paths=['user_id'])
             
             if not doc.exists:
                 return False
@@ -180,6 +594,8 @@ class IntegratedConversationService:
                 'updated_at': datetime.utcnow()
             })
             
+            self.versions.bump(user_id, CONVERSATIONS)
+            self._index_async(user_id, conversation_id, [(TITLE_SEQ, title)])
             return True
             
         except Exception as e:
@@ -190,7 +606,7 @@ class IntegratedConversationService:
         """会話を削除（論理削除）"""
         try:
             doc_ref = self.db.collection(self.collection_name).document(conversation_id)
-            doc = doc_ref.get()
+            doc = doc_ref.get(field_paths=['user_id'])
             
             if not doc.exists:
                 return False
@@ -203,6 +619,7 @@ class IntegratedConversationService:
                 'is_active': False,
                 'updated_at': datetime.utcnow()
             })
+            self.versions.bump(user_id, CONVERSATIONS)
             
             logger.info(f"Deleted conversation: {conversation_id}")
             return True
@@ -238,14 +655,6 @@ class IntegratedConversationService:
         return title
     
     def get_conversation_messages(self, conversation_id: str, user_id: str) -> List[Dict[str, Any]]:
-        """会話のメッセージ履歴を取得"""
-        try:
-            conversation = self.get_conversation(conversation_id, user_id)
-            if not conversation:
-                return []
-            
-            return conversation.get('messages', [])
-            
-        except Exception as e:
-            logger.error(f"Error getting conversation messages: {str(e)}")
-            return []
\ No newline at end of file
+        """会話のメッセージ履歴を取得（直近 messages_page_size 件）"""
+        page = self.get_messages(conversation_id, user_id, limit=self.messages_page_size)
+        return page['messages'] if page else []
@@ -0,0 +1,152 @@
+"""
+構造化ログの設定
+Cloud Run（環境変数 K_SERVICE あり）では1行1JSONで出力し、Cloud Logging が severity・リクエストIDで絞り込めるようにする。
+ローカルでは従来どおりのテキスト形式。
+
+環境変数:
+    LOG_FORMAT   json / text（既定: Cloud Run なら json、それ以外は text）
+    LOG_LEVEL    ルートのログレベル（既定: INFO）
+    LOG_LEVELS   モジュールごとのレベル（例: "auth_middleware=DEBUG,subsidy_service=WARNING"）
+    LOG_SAMPLE_RATES イベントごとのサンプリング率（例: "auth.ok=0.01,agent.response=0.1"。コード側の既定値より優先）
+
+ホットパスでは f-string ではなく log_event（またはロガーの %s 引数）を使い、
+レベルやサンプリングで出力しない場合は文字列を組み立てないようにする。
+"""
+import os
+import json
+import uuid
+import random
+import logging
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# LogRecord の標準属性（extra で渡された独自フィールドと区別する）
+_STANDARD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+
+def _current_request_id() -> Optional[str]:
+    try:
+        from flask import g, has_request_context
+        if has_request_context():
+            return getattr(g, 'request_id', None)
+    except ImportError:
+        pass
+    return None
+
+
+class RequestIdFilter(logging.Filter):
+    """リクエスト処理中のログにリクエストIDを付与"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _current_request_id()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Cloud Logging の構造化ログ形式（severity / message / 任意のフィールド）"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'severity': record.levelname,
+            'message': record.getMessage(),
+            'logger': record.name,
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(levelname)s:%(name)s:%(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = ' '.join(
+            f"{key}={value}" for key, value in record.__dict__.items()
+            if key not in _STANDARD_ATTRS and not key.startswith('_') and key != 'event'
+        )
+        if fields:
+            text = f"{text} {fields}"
+        request_id = getattr(record, 'request_id', None)
+        return f"{text} [request_id={request_id}]" if request_id else text
+
+
+def _parse_pairs(value: str):
+    """"name=value,name=value" 形式の設定を分解"""
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, _, setting = item.partition('=')
+        if name and setting:
+            yield name.strip(), setting.strip()
+
+
+def configure_logging(default_level: str = 'INFO'):
+    """ルートロガーを環境変数の設定で初期化（複数回呼ばれてもハンドラは1つ）"""
+    log_format = os.getenv('LOG_FORMAT') or ('json' if os.getenv('K_SERVICE') else 'text')
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if log_format == 'json' else TextFormatter())
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(os.getenv('LOG_LEVEL', default_level).upper())
+
+    for name, level in _parse_pairs(os.getenv('LOG_LEVELS', '')):
+        logging.getLogger(name).setLevel(level.upper())
+
+
+def init_request_id(app):
+    """リクエストごとにIDを採番して g.request_id に保持し、レスポンスヘッダーにも返す
+
+    Cloud Run のトレースヘッダーがあればそのトレースIDを使い、Cloud Logging のリクエストログと突き合わせられるようにする
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _assign_request_id():
+        trace = request.headers.get('X-Cloud-Trace-Context', '')
+        g.request_id = (
+            request.headers.get(REQUEST_ID_HEADER)
+            or trace.split('/', 1)[0]
+            or uuid.uuid4().hex
+        )[:64]
+
+    @app.after_request
+    def _return_request_id(response):
+        request_id = getattr(g, 'request_id', None)
+        if request_id:
+            response.headers[REQUEST_ID_HEADER] = request_id
+        return response
+
+
+_SAMPLE_RATES = {name: float(rate) for name, rate in _parse_pairs(os.getenv('LOG_SAMPLE_RATES', ''))}
+
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO,
+              sample_rate: float = 1.0, **fields: Any):
+    """イベント名と構造化フィールドでログを出す
+
+    レベルが無効、またはサンプリングで外れた場合は何もしない（フィールドの整形も行わない）。
+    sample_rate < 1 の大量イベントは出力したログに sample_rate を付けるので、件数は逆数倍で推定する
+    """
+    if not logger.isEnabledFor(level):
+        return
+    rate = _SAMPLE_RATES.get(event, sample_rate)
+    if rate < 1.0:
+        if random.random() >= rate:
+            return
+        fields['sample_rate'] = rate
+    fields['event'] = event
+    logger.log(level, event, extra=fields)
@@ -0,0 +1,97 @@
+"""
+メッセージ本文の圧縮保存
+アシスタントの回答（長い日本語Markdown）は会話メッセージ・AI診断結果・メモのチャット履歴のドキュメントサイズの
+大半を占めるため、しきい値を超える本文は圧縮してバイト列（Firestore の Blob）として保存する。
+
+保存形式:
+    しきい値未満 … 文字列のまま（従来のドキュメントと同じ）
+    しきい値以上 … 先頭1バイトの形式フラグ＋圧縮データ
+        0x01 = zlib
+        0x02 = zstd（zstandard パッケージがある場合のみ書き込み）
+
+読み出し側（decode_text）は文字列・フラグ付きバイト列のどちらも受け付けるので、
+保存済みのドキュメントを移行する必要はない。
+
+環境変数:
+    MESSAGE_COMPRESSION            zlib / zstd / none（既定: zlib。zstd が使えない場合は zlib）
+    MESSAGE_COMPRESSION_MIN_BYTES  圧縮するUTF-8バイト数のしきい値（既定: 1024）
+    MESSAGE_COMPRESSION_LEVEL      圧縮レベル（既定: zlib 6 / zstd 3）
+"""
+import os
+import zlib
+import logging
+from typing import Any, Optional
+
+try:
+    import zstandard
+    ZSTD_ENABLED = True
+except ImportError:
+    zstandard = None
+    ZSTD_ENABLED = False
+
+logger = logging.getLogger(__name__)
+
+FORMAT_ZLIB = 0x01
+FORMAT_ZSTD = 0x02
+
+
+class MessageCodec:
+    def __init__(self, algorithm: str = 'zlib', min_bytes: int = 1024, level: Optional[int] = None):
+        if algorithm == 'zstd' and not ZSTD_ENABLED:
+            logger.warning("zstandard is not installed, falling back to zlib message compression")
+            algorithm = 'zlib'
+        self.algorithm = algorithm
+        self.min_bytes = min_bytes
+        self.level = level if level is not None else (3 if algorithm == 'zstd' else 6)
+
+    def encode(self, text: Any) -> Any:
+        """保存用の値に変換（文字列以外・しきい値未満・圧縮で小さくならない本文はそのまま返す）"""
+        if not isinstance(text, str) or self.algorithm == 'none':
+            return text
+        raw = text.encode('utf-8')
+        if len(raw) < self.min_bytes:
+            return text
+
+        if self.algorithm == 'zstd':
+            # ZstdCompressor はスレッド間で共有できないため呼び出しごとに生成
+            encoded = bytes([FORMAT_ZSTD]) + zstandard.ZstdCompressor(level=self.level).compress(raw)
+        else:
+            encoded = bytes([FORMAT_ZLIB]) + zlib.compress(raw, self.level)
+        return encoded if len(encoded) < len(raw) else text
+
+    def decode(self, value: Any) -> Any:
+        """保存された値を文字列に戻す（圧縮されていない値はそのまま返す）"""
+        if not isinstance(value, (bytes, bytearray, memoryview)):
+            return value
+        data = bytes(value)
+        if not data:
+            return ''
+
+        flag, payload = data[0], data[1:]
+        if flag == FORMAT_ZLIB:
+            return zlib.decompress(payload).decode('utf-8')
+        if flag == FORMAT_ZSTD:
+            if not ZSTD_ENABLED:
+                raise ValueError("Message is zstd-compressed but zstandard is not installed")
+            return zstandard.ZstdDecompressor().decompress(payload).decode('utf-8')
+        raise ValueError(f"Unknown message encoding flag: {flag:#04x}")
+
+
+def create_message_codec() -> MessageCodec:
+    level = os.getenv('MESSAGE_COMPRESSION_LEVEL')
+    return MessageCodec(
+        algorithm=os.getenv('MESSAGE_COMPRESSION', 'zlib'),
+        min_bytes=int(os.getenv('MESSAGE_COMPRESSION_MIN_BYTES', '1024')),
+        level=int(level) if level else None
+    )
+
+
+message_codec = create_message_codec()
+
+
+def encode_text(text: Any) -> Any:
+    return message_codec.encode(text)
+
+
+def decode_text(value: Any) -> Any:
+    return message_codec.decode(value)
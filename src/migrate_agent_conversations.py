@@ -0,0 +1,247 @@
+"""
+旧会話ストアの移行: agent_conversations/{id}（messages 配列を毎回 set で書き直す形式）
+→ conversations/{id} ＋ conversations/{id}/messages/{連番}（IntegratedConversationService の形式）
+
+- 旧コレクションをドキュメントID順にカーソルでページ単位に読み出す
+- ページ内の会話はスレッドプールで並行に変換（本文の圧縮は zlib がGILを解放するため並行に効く）
+- 書き込みは BulkWriter で行い、--ops-per-second で書き込み速度の上限を指定する
+- ページの書き込みが終わるごとにチェックポイント（最後のドキュメントID・件数）をファイルに保存し、
+  中断しても --checkpoint の続きから再開できる（書き込みは set なので同じページを再実行しても結果は同じ）
+- --verify で旧ドキュメントごとに移行先の有無とメッセージ件数を突き合わせる
+
+移行と検証が済めば ConversationService（conversation_service.py）と firestore.indexes.json の
+agent_conversations のインデックスは削除できる。
+
+使い方:
+    python src/migrate_agent_conversations.py --dry-run
+    python src/migrate_agent_conversations.py --ops-per-second 300
+    python src/migrate_agent_conversations.py --verify
+"""
+import os
+import sys
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from firebase_config import firebase_service
+from integrated_conversation_service import (
+    IntegratedConversationService, MESSAGES_SUBCOLLECTION, message_doc_id, make_preview
+)
+from message_codec import encode_text
+
+logger = logging.getLogger(__name__)
+
+LEGACY_COLLECTION = 'agent_conversations'
+PAGE_SIZE = 200
+DEFAULT_CHECKPOINT = 'agent_conversations_migration.json'
+
+
+def _to_datetime(value: Any) -> Optional[datetime]:
+    """旧形式は ISO 形式の文字列で保存している"""
+    if isinstance(value, datetime) or value is None:
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def convert_conversation(doc_id: str, data: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """旧形式の会話1件を (親ドキュメント, メッセージのリスト) に変換"""
+    legacy_messages = sorted(data.get('messages') or [], key=lambda message: message.get('order', 0))
+    created_at = _to_datetime(data.get('created_at')) or datetime.utcnow()
+    updated_at = _to_datetime(data.get('updated_at')) or created_at
+
+    messages = []
+    for seq, message in enumerate(legacy_messages, start=1):
+        messages.append({
+            'seq': seq,
+            'content': encode_text(message.get('content', '')),
+            'sender': message.get('sender'),
+            'timestamp': _to_datetime(message.get('timestamp')) or updated_at
+        })
+
+    last = legacy_messages[-1] if legacy_messages else None
+    agent_name = data.get('agent_name', '')
+    parent = {
+        'id': doc_id,
+        'user_id': data.get('user_id'),
+        'agent_id': data.get('agent_id'),
+        'agent_name': agent_name,
+        'title': data.get('title') or f"{agent_name}との会話",
+        'message_seq': len(messages),
+        'message_count': len(messages),
+        'preview': make_preview(last.get('content', '')) if last else None,
+        'last_sender': last.get('sender') if last else None,
+        'has_user_message': any(message.get('sender') == 'user' for message in legacy_messages),
+        'created_at': created_at,
+        'updated_at': updated_at,
+        'is_active': data.get('is_active', True),
+        'migrated_from': LEGACY_COLLECTION
+    }
+    return parent, messages
+
+
+def load_checkpoint(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {'last_doc_id': None, 'stats': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, last_doc_id: str, stats: Dict[str, int]):
+    # 書き込み途中で中断してもファイルが壊れないよう一時ファイルから置き換える
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'last_doc_id': last_doc_id, 'stats': stats, 'saved_at': datetime.utcnow().isoformat()}, f)
+    os.replace(tmp_path, path)
+
+
+def _legacy_pages(db, start_after_id: Optional[str] = None, page_size: int = PAGE_SIZE):
+    """旧コレクションをドキュメントID順にページ単位で返す"""
+    legacy_ref = db.collection(LEGACY_COLLECTION)
+    cursor = legacy_ref.document(start_after_id).get() if start_after_id else None
+    if cursor is not None and not cursor.exists:
+        raise ValueError(f"Checkpoint document {start_after_id} no longer exists")
+
+    while True:
+        query = legacy_ref.order_by('__name__').limit(page_size)
+        if cursor is not None:
+            query = query.start_after(cursor)
+        docs = list(query.stream())
+        if not docs:
+            return
+        yield docs
+        cursor = docs[-1]
+
+
+def _create_bulk_writer(db, ops_per_second: int, stats: Dict[str, int]):
+    from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions
+
+    bulk_writer = db.bulk_writer(options=BulkWriterOptions(
+        initial_ops_per_second=ops_per_second,
+        max_ops_per_second=ops_per_second
+    ))
+
+    def on_error(failure, _bulk_writer) -> bool:
+        # 一時的なエラーは BulkWriter のバックオフで再試行し、上限を超えたものを失敗として数える
+        if failure.attempts < 5:
+            return True
+        logger.error(f"Write failed: {failure.operation.reference.path}: {failure.message}")
+        stats['write_errors'] += 1
+        return False
+
+    bulk_writer.on_write_error(on_error)
+    return bulk_writer
+
+
+def migrate_agent_conversations(db, checkpoint_path: str = DEFAULT_CHECKPOINT, ops_per_second: int = 500,
+                                workers: int = 4, dry_run: bool = False) -> Dict[str, int]:
+    """旧コレクションの会話を conversations に書き出す（チェックポイントの続きから）"""
+    checkpoint = load_checkpoint(checkpoint_path)
+    stats = {'scanned': 0, 'migrated': 0, 'messages': 0, 'skipped': 0, 'write_errors': 0}
+    stats.update(checkpoint.get('stats') or {})
+    if checkpoint.get('last_doc_id'):
+        logger.info(f"Resuming after {checkpoint['last_doc_id']}: {stats}")
+
+    target_ref = db.collection(IntegratedConversationService(db).collection_name)
+    bulk_writer = None if dry_run else _create_bulk_writer(db, ops_per_second, stats)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for docs in _legacy_pages(db, checkpoint.get('last_doc_id')):
+                snapshots = [(doc.id, doc.to_dict() or {}) for doc in docs]
+                converted = executor.map(lambda item: (item[0], *convert_conversation(*item)), snapshots)
+
+                for doc_id, parent, messages in converted:
+                    stats['scanned'] += 1
+                    if not parent['user_id']:
+                        logger.warning(f"Skipping conversation without user_id: {doc_id}")
+                        stats['skipped'] += 1
+                        continue
+                    if bulk_writer is not None:
+                        parent_ref = target_ref.document(doc_id)
+                        for message in messages:
+                            bulk_writer.set(
+                                parent_ref.collection(MESSAGES_SUBCOLLECTION).document(message_doc_id(message['seq'])),
+                                message
+                            )
+                        bulk_writer.set(parent_ref, parent)
+                    stats['migrated'] += 1
+                    stats['messages'] += len(messages)
+
+                # ページの書き込みが完了してからチェックポイントを進める
+                if bulk_writer is not None:
+                    bulk_writer.flush()
+                    save_checkpoint(checkpoint_path, docs[-1].id, stats)
+                logger.info(f"Progress: {stats}")
+    finally:
+        if bulk_writer is not None:
+            bulk_writer.close()
+
+    return stats
+
+
+def verify_migration(db, page_size: int = PAGE_SIZE) -> Dict[str, int]:
+    """旧ドキュメントごとに移行先の存在とメッセージ件数を確認"""
+    stats = {'legacy': 0, 'ok': 0, 'missing': 0, 'count_mismatch': 0}
+    target_ref = db.collection(IntegratedConversationService(db).collection_name)
+
+    for docs in _legacy_pages(db, page_size=page_size):
+        expected = {doc.id: len((doc.to_dict() or {}).get('messages') or []) for doc in docs}
+        stats['legacy'] += len(expected)
+        found = {
+            snapshot.id: (snapshot.to_dict() or {}).get('message_count')
+            for snapshot in db.get_all([target_ref.document(doc_id) for doc_id in expected],
+                                       field_paths=['message_count'])
+            if snapshot.exists
+        }
+        for doc_id, message_count in expected.items():
+            if doc_id not in found:
+                stats['missing'] += 1
+                logger.warning(f"Not migrated: {doc_id}")
+            elif found[doc_id] != message_count:
+                stats['count_mismatch'] += 1
+                logger.warning(f"Message count mismatch for {doc_id}: legacy={message_count} migrated={found[doc_id]}")
+            else:
+                stats['ok'] += 1
+
+    return stats
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='agent_conversations を conversations に移行')
+    parser.add_argument('--dry-run', action='store_true', help='書き込みを行わず件数のみ集計')
+    parser.add_argument('--verify', action='store_true', help='移行結果の件数を検証（書き込みは行わない）')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help='チェックポイントファイルのパス')
+    parser.add_argument('--reset', action='store_true', help='チェックポイントを破棄して最初から実行')
+    parser.add_argument('--ops-per-second', type=int, default=500, help='書き込み速度の上限（件/秒）')
+    parser.add_argument('--workers', type=int, default=4, help='変換の並列数')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    db = firebase_service.get_db()
+    if db is None:
+        print("Firestore is not available")
+        sys.exit(1)
+
+    if args.verify:
+        stats = verify_migration(db)
+        print(' '.join(f"{key}={value}" for key, value in stats.items()))
+        sys.exit(0 if stats['missing'] == 0 and stats['count_mismatch'] == 0 else 1)
+
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    stats = migrate_agent_conversations(db, checkpoint_path=args.checkpoint, ops_per_second=args.ops_per_second,
+                                        workers=args.workers, dry_run=args.dry_run)
+    print(' '.join(f"{key}={value}" for key, value in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
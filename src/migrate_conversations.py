@@ -0,0 +1,90 @@
+"""
+統合会話の移行: conversations/{id} の messages 配列 → conversations/{id}/messages/{連番} サブコレクション
+（移行済みの会話には会話一覧用の message_count / last_sender を補完する）
+未移行の会話も次のメッセージ追記時に IntegratedConversationService が個別に移行するが、本ツールで一括移行する。
+
+使い方:
+    python src/migrate_conversations.py --dry-run
+    python src/migrate_conversations.py
+"""
+import sys
+import logging
+from typing import Dict
+
+from firebase_config import firebase_service
+from integrated_conversation_service import IntegratedConversationService
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 100
+# 1会話あたり最大50件（旧形式の上限）＋親ドキュメント。Firestoreのバッチ上限500未満に収める
+BATCH_SIZE = 400
+
+
+def migrate_conversations(db, dry_run: bool = False) -> Dict[str, int]:
+    """旧形式の会話ドキュメントのメッセージをサブコレクションへ移し、親から messages 配列を削除"""
+    stats = {'scanned': 0, 'migrated': 0, 'messages': 0, 'already_migrated': 0}
+    service = IntegratedConversationService(db)
+    conversations_ref = db.collection(service.collection_name)
+    batch = db.batch()
+    pending_writes = 0
+    last_doc = None
+
+    def commit():
+        nonlocal batch, pending_writes
+        if pending_writes and not dry_run:
+            batch.commit()
+        batch = db.batch()
+        pending_writes = 0
+
+    while True:
+        query = conversations_ref.order_by('__name__').limit(PAGE_SIZE)
+        if last_doc is not None:
+            query = query.start_after(last_doc)
+        docs = list(query.stream())
+        if not docs:
+            break
+        last_doc = docs[-1]
+
+        for doc in docs:
+            stats['scanned'] += 1
+            message_count = len((doc.to_dict() or {}).get('messages') or [])
+
+            # 1件分（メッセージ＋親）がバッチに入りきらなければ先に書き込む
+            if pending_writes + message_count + 1 > BATCH_SIZE:
+                commit()
+
+            if not service.migrate_legacy_conversation(doc, batch):
+                stats['already_migrated'] += 1
+                continue
+
+            pending_writes += message_count + 1
+            stats['migrated'] += 1
+            stats['messages'] += message_count
+
+        logger.info(f"Progress: {stats}")
+
+    commit()
+    return stats
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='統合会話のメッセージをサブコレクションに移行')
+    parser.add_argument('--dry-run', action='store_true', help='書き込みを行わず件数のみ集計')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    db = firebase_service.get_db()
+    if db is None:
+        print("Firestore is not available")
+        sys.exit(1)
+
+    stats = migrate_conversations(db, dry_run=args.dry_run)
+    print(' '.join(f"{key}={value}" for key, value in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
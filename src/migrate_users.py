@@ -0,0 +1,110 @@
+"""
+ユーザードキュメントの移行: users/{ランダムID}（user_id フィールドにUID） → users/{UID}
+移行後は認証ごとのユーザー取得がクエリではなくポイント読み取りになる。
+未移行のユーザーも初回アクセス時に User.get_user_by_uid が個別に移行するが、本ツールで一括移行する。
+
+使い方:
+    python src/migrate_users.py --dry-run
+    python src/migrate_users.py [--delete-legacy]
+"""
+import sys
+import logging
+from typing import Dict
+
+from firebase_config import firebase_service
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 300
+BATCH_SIZE = 400  # Firestoreのバッチ上限500未満
+
+
+def migrate_users(db, dry_run: bool = False, delete_legacy: bool = False) -> Dict[str, int]:
+    """旧形式のユーザードキュメントを users/{uid} にコピー（既に存在する項目は上書きしない）"""
+    stats = {'scanned': 0, 'migrated': 0, 'merged': 0, 'already_migrated': 0, 'skipped': 0, 'deleted': 0}
+    users_ref = db.collection('users')
+    batch = db.batch()
+    pending_writes = 0
+    last_doc = None
+    migrated_uids = set()  # 同一UIDの旧ドキュメントが複数ある場合は最初のものを採用
+
+    def commit():
+        nonlocal batch, pending_writes
+        if pending_writes and not dry_run:
+            batch.commit()
+        batch = db.batch()
+        pending_writes = 0
+
+    while True:
+        query = users_ref.order_by('__name__').limit(PAGE_SIZE)
+        if last_doc is not None:
+            query = query.start_after(last_doc)
+        docs = list(query.stream())
+        if not docs:
+            break
+        last_doc = docs[-1]
+
+        for doc in docs:
+            stats['scanned'] += 1
+            data = doc.to_dict() or {}
+            uid = data.get('user_id')
+
+            if not uid:
+                stats['skipped'] += 1
+                continue
+            if doc.id == uid:
+                stats['already_migrated'] += 1
+                continue
+
+            target_ref = users_ref.document(uid)
+            if uid in migrated_uids:
+                stats['merged'] += 1
+            elif (target := target_ref.get()).exists:
+                # 先に移行済み（アクセス時の個別移行など）の値を優先し、欠けている項目だけ補う
+                existing = target.to_dict() or {}
+                missing = {key: value for key, value in data.items() if key not in existing}
+                if missing:
+                    batch.set(target_ref, missing, merge=True)
+                    pending_writes += 1
+                stats['merged'] += 1
+            else:
+                batch.set(target_ref, {**data, 'legacy_doc_id': doc.id})
+                pending_writes += 1
+                stats['migrated'] += 1
+            migrated_uids.add(uid)
+
+            if delete_legacy:
+                batch.delete(doc.reference)
+                pending_writes += 1
+                stats['deleted'] += 1
+
+            if pending_writes >= BATCH_SIZE:
+                commit()
+
+        logger.info(f"Progress: {stats}")
+
+    commit()
+    return stats
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='ユーザードキュメントを users/{uid} に移行')
+    parser.add_argument('--dry-run', action='store_true', help='書き込みを行わず件数のみ集計')
+    parser.add_argument('--delete-legacy', action='store_true', help='移行後に旧ドキュメントを削除')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    db = firebase_service.get_db()
+    if db is None:
+        print("Firestore is not available")
+        sys.exit(1)
+
+    stats = migrate_users(db, dry_run=args.dry_run, delete_legacy=args.delete_legacy)
+    print(' '.join(f"{key}={value}" for key, value in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
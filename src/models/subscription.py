@@ -1,54 +1,118 @@
 from typing import Optional, Dict, Any, List
-from datetime import datetime, timedelta
-from google.cloud.firestore import SERVER_TIMESTAMP
+from datetime import datetime, timedelta, timezone
+from google.cloud.firestore import SERVER_TIMESTAMP, DELETE_FIELD, Increment, transactional
+from google.api_core.exceptions import NotFound
+from models.user import user_cache
+import os
+import uuid
 import logging
+from logging_config import log_event
 
 logger = logging.getLogger(__name__)
 
+# 質問枠の仮押さえ（hold）の有効期間。commit/release されずに放置された hold はこの時間で失効する
+QUOTA_HOLD_SECONDS = int(os.getenv('QUOTA_HOLD_SECONDS', '300'))
+
+
+def active_subscription_fields(subscription: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """ユーザードキュメントに持たせるアクティブなサブスクリプションへのポインタと概要
+
+    使用回数はサブスクリプション側が正（質問ごとに変わるため概要には含めない）
+    """
+    if not subscription or subscription.get('status') != 'active':
+        return {
+            'active_subscription_id': None,
+            'usage_snapshot': {
+                'plan_type': (subscription or {}).get('plan_type', 'none'),
+                'questions_limit': 0,
+                'reset_date': None,
+                'status': (subscription or {}).get('status', 'inactive')
+            }
+        }
+    return {
+        'active_subscription_id': subscription['id'],
+        'usage_snapshot': {
+            'plan_type': subscription.get('plan_type', 'none'),
+            'questions_limit': subscription.get('questions_limit', 0),
+            'reset_date': subscription.get('reset_date'),
+            'status': 'active'
+        }
+    }
+
+
 class SubscriptionService:
     def __init__(self, firebase_service):
         self.db = firebase_service.get_db()
     
-    def get_user_subscription(self, user_id: str) -> Optional[Dict[str, Any]]:
-        """ユーザーのアクティブなサブスクリプションを取得"""
+    def get_user_subscription(self, user_id: str, subscription_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """ユーザーのアクティブなサブスクリプションを取得
+
+        ユーザードキュメントの active_subscription_id（または subscription_id）からポイント読み取りし、
+        ポインタが無い・古い場合のみ複合クエリで検索してポインタを張り直す
+        """
         try:
-            subscriptions = self.db.collection('subscriptions')\
-                .where('user_id', '==', user_id)\
-                .where('status', '==', 'active')\
-                .order_by('created_at', direction='DESCENDING')\
-                .limit(1).get()
-            
-            logger.info(f"=== DEBUG: user_id {user_id} で検索したサブスクリプション数: {len(subscriptions)}")
-            
-            if subscriptions:
-                sub_doc = subscriptions[0]
-                sub_data = sub_doc.to_dict()
-                logger.info(f"=== DEBUG: 取得されたサブスクリプション: {sub_doc.id}")
-                logger.info(f"=== DEBUG: plan_type: {sub_data.get('plan_type')}, status: {sub_data.get('status')}")
-                logger.info(f"=== DEBUG: questions_limit: {sub_data.get('questions_limit')}, questions_used: {sub_data.get('questions_used')}")
-                
-                # 無効なstripe_subscription_idをクリーンアップ（一時的に無効化）
-                # stripe_id = sub_data.get('stripe_subscription_id', '')
-                # if stripe_id in ['manual_update', 'pack_purchase', '']:
-                #     logger.warning(f"Invalid stripe_subscription_id '{stripe_id}' found for subscription: {sub_doc.id}")
-                #     # 有効なIDに修正（一時的に subscription_id を使用）
-                #     valid_id = f"sub_{sub_doc.id[:8]}"
-                #     self.db.collection('subscriptions').document(sub_doc.id).update({
-                #         'stripe_subscription_id': valid_id,
-                #         'updated_at': SERVER_TIMESTAMP
-                #     })
-                #     sub_data['stripe_subscription_id'] = valid_id
-                #     logger.info(f"Updated invalid stripe_subscription_id to: {valid_id}")
-                
-                return {
-                    'id': sub_doc.id,
-                    **sub_data
-                }
-            return None
+            subscription_id = subscription_id or self._get_active_subscription_id(user_id)
+            if subscription_id:
+                sub_doc = self.db.collection('subscriptions').document(subscription_id).get()
+                if sub_doc.exists:
+                    sub_data = sub_doc.to_dict()
+                    if sub_data.get('user_id') == user_id and sub_data.get('status') == 'active':
+                        return {
+                            'id': sub_doc.id,
+                            **sub_data
+                        }
+            
+            subscription = self._query_active_subscription(user_id)
+            if subscription or subscription_id:
+                self._set_active_subscription(user_id, subscription)
+            return subscription
             
         except Exception as e:
             logger.error(f"Subscription fetch error: {str(e)}")
             return None
+
+    def _get_active_subscription_id(self, user_id: str) -> Optional[str]:
+        """ユーザードキュメントのポインタを取得（認証時にキャッシュ済みならFirestoreを読まない）"""
+        user = user_cache.get(user_id)
+        if user is not None and 'active_subscription_id' in user:
+            return user['active_subscription_id']
+        user_doc = self.db.collection('users').document(user_id).get(field_paths=['active_subscription_id'])
+        return (user_doc.to_dict() or {}).get('active_subscription_id') if user_doc.exists else None
+
+    def _query_active_subscription(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """複合クエリ（user_id, status, created_at desc）でアクティブなサブスクリプションを検索"""
+        subscriptions = self.db.collection('subscriptions')\
+            .where('user_id', '==', user_id)\
+            .where('status', '==', 'active')\
+            .order_by('created_at', direction='DESCENDING')\
+            .limit(1).get()
+        
+        log_event(logger, 'subscription.pointer_miss', user_id=user_id, found=len(subscriptions))
+        
+        if subscriptions:
+            sub_doc = subscriptions[0]
+            return {
+                'id': sub_doc.id,
+                **sub_doc.to_dict()
+            }
+        return None
+
+    def _set_active_subscription(self, user_id: str, subscription: Optional[Dict[str, Any]]) -> bool:
+        """ユーザードキュメントのポインタと概要を更新（未移行のユーザーは次回の検索時に張る）"""
+        try:
+            self.db.collection('users').document(user_id).update({
+                **active_subscription_fields(subscription),
+                'updated_at': SERVER_TIMESTAMP
+            })
+            return True
+        except NotFound:
+            logger.info(f"User document users/{user_id} not found, skipped active subscription pointer")
+            return False
+        except Exception as e:
+            logger.error(f"Active subscription pointer update error: {str(e)}")
+            return False
+        finally:
+            user_cache.invalidate(user_id)
     
     def create_subscription(self, subscription_data: Dict[str, Any]) -> str:
         """新しいサブスクリプションを作成"""
@@ -66,6 +130,10 @@ class SubscriptionService:
             final_data = {**default_data, **subscription_data}
             subscription_ref.set(final_data)
             
+            # アクティブなサブスクリプションへのポインタをユーザードキュメントに張る
+            if final_data['status'] == 'active' and final_data.get('user_id'):
+                self._set_active_subscription(final_data['user_id'], {'id': subscription_ref.id, **final_data})
+            
             logger.info(f"Subscription created: {subscription_ref.id}")
             return subscription_ref.id
             
@@ -163,6 +231,7 @@ class SubscriptionService:
                 'questions_limit': new_limit,
                 'updated_at': SERVER_TIMESTAMP
             })
+            self._set_active_subscription(user_id, {**current_sub, 'questions_limit': new_limit})
             
             # 追加パックの記録を保存
             self.record_additional_pack_purchase(user_id, stripe_payment_id, questions_count)
@@ -186,80 +255,193 @@ class SubscriptionService:
         """９０回追加パックを追加"""
         return self.add_pack(user_id, stripe_payment_id, 90)
     
-    def use_question(self, user_id: str) -> Dict[str, Any]:
-        """質問を1つ消費"""
+    # ===== 質問枠の予約（reserve → commit / release） =====
+
+    def reserve_question(self, user_id: str, subscription_id: Optional[str] = None,
+                         hold_seconds: int = QUOTA_HOLD_SECONDS) -> Dict[str, Any]:
+        """AI呼び出しの前に質問枠を1つ仮押さえする
+
+        サブスクリプションの holds マップに期限付きの hold を追加する。使用済み＋有効な hold が上限に
+        達していれば失敗するため、同一ユーザーの同時リクエストでも上限を超えない。
+        期限切れの hold は同じ書き込みで削除する。返り値の usage_stats は commit 後の値
+        （この hold を使用済みとして数えたもの）なので、成功時に再読み込みは不要。
+        subscription_id にはユーザードキュメントの active_subscription_id を渡す（無効なら検索に切り替え）
+        """
         try:
-            subscription = self.get_user_subscription(user_id)
-            
+            result = self._reserve_in_transaction(self.db.transaction(), user_id, subscription_id, hold_seconds)
+            if result['success'] and result['subscription_id'] != subscription_id:
+                self._set_active_subscription(user_id, result['subscription'])
+            return result
+        except Exception as e:
+            logger.error(f"Reserve question error: {str(e)}")
+            return {'success': False, 'code': 'error', 'error': 'システムエラーが発生しました'}
+
+    def _reserve_in_transaction(self, transaction, user_id: str, subscription_id: Optional[str],
+                                hold_seconds: int) -> Dict[str, Any]:
+        subscriptions = self.db.collection('subscriptions')
+
+        def is_active(snapshot) -> bool:
+            data = snapshot.to_dict() if snapshot and snapshot.exists else {}
+            return data.get('user_id') == user_id and data.get('status') == 'active'
+
+        @transactional
+        def reserve(transaction):
+            snapshot = None
+            if subscription_id:
+                snapshot = subscriptions.document(subscription_id).get(transaction=transaction)
+            if not is_active(snapshot):
+                # ポインタが無い・古い場合のみ複合クエリで検索
+                query = subscriptions\
+                    .where('user_id', '==', user_id)\
+                    .where('status', '==', 'active')\
+                    .order_by('created_at', direction='DESCENDING')\
+                    .limit(1)
+                snapshot = next(iter(query.get(transaction=transaction)), None)
+
+            subscription = {'id': snapshot.id, **snapshot.to_dict()} if is_active(snapshot) else None
             if not subscription:
                 return {
                     'success': False,
-                    'error': 'アクティブなサブスクリプションが見つかりません'
+                    'code': 'not_found',
+                    'error': 'アクティブなサブスクリプションが見つかりません',
+                    'usage_stats': self.usage_stats_from(None)
                 }
-            
-            # 月次リセットチェック（サブスクリプションプランのみ）
-            subscription = self._check_and_reset_if_needed(subscription)
-            
-            current_used = subscription.get('questions_used', 0)
+
+            now = datetime.now(timezone.utc)
+            holds = subscription.pop('holds', None) or {}
+            expired = [hold_id for hold_id, expires_at in holds.items() if expires_at <= now]
+            active_holds = len(holds) - len(expired)
+
+            updates = {'updated_at': SERVER_TIMESTAMP}
+            for hold_id in expired:
+                updates[f'holds.{hold_id}'] = DELETE_FIELD
+
+            if self._is_reset_due(subscription, now):
+                # 定期ジョブ（quota_reset_job.py）より先にリセット期日を過ぎたユーザーが来た場合は同じ書き込みでリセット
+                updates['questions_used'] = 0
+                updates['reset_date'] = self._next_reset_date(subscription['reset_date'], now)
+                subscription.update({'questions_used': 0, 'reset_date': updates['reset_date']})
+
+            used = subscription.get('questions_used', 0)
             limit = subscription.get('questions_limit', 0)
-            
-            if current_used >= limit:
+            if used + active_holds >= limit:
+                if expired or 'reset_date' in updates:
+                    transaction.update(snapshot.reference, updates)
                 return {
                     'success': False,
+                    'code': 'limit_exceeded',
                     'error': '質問回数の上限に達しています',
-                    'remaining': 0,
-                    'limit': limit
+                    'usage_stats': self.usage_stats_from(subscription)
                 }
-            
-            # 使用回数を増加
-            new_used = current_used + 1
-            
-            self.db.collection('subscriptions').document(subscription['id']).update({
-                'questions_used': new_used,
-                'updated_at': SERVER_TIMESTAMP
-            })
-            
-            remaining = limit - new_used
-            
+
+            hold_id = uuid.uuid4().hex
+            updates[f'holds.{hold_id}'] = now + timedelta(seconds=hold_seconds)
+            transaction.update(snapshot.reference, updates)
+
             return {
                 'success': True,
-                'remaining': remaining,
-                'limit': limit,
-                'used': new_used
+                'hold_id': hold_id,
+                'subscription_id': snapshot.id,
+                'subscription': subscription,
+                'usage_stats': self.usage_stats_from({**subscription, 'questions_used': used + 1})
             }
-            
+
+        return reserve(transaction)
+
+    def commit_question(self, subscription_id: str, hold_id: str) -> bool:
+        """仮押さえした質問枠を確定（hold が残っている場合のみ使用回数を1つ増やす）
+
+        AI呼び出しが長引いて hold が期限切れになり、別のリクエストの reserve で削除された・
+        その枠が他の hold に使われた場合は確定せず False を返す（上限を超えて使用回数が増えないように）
+        """
+        try:
+            subscription_ref = self.db.collection('subscriptions').document(subscription_id)
+            return self._commit_in_transaction(self.db.transaction(), subscription_ref, hold_id)
+        except Exception as e:
+            logger.error(f"Commit question error: {str(e)}")
+            return False
+
+    def _commit_in_transaction(self, transaction, subscription_ref, hold_id: str) -> bool:
+        @transactional
+        def commit(transaction):
+            snapshot = subscription_ref.get(transaction=transaction)
+            subscription = snapshot.to_dict() if snapshot.exists else {}
+            holds = subscription.get('holds') or {}
+            if hold_id not in holds:
+                logger.warning(f"Quota hold {hold_id} on {subscription_ref.id} is gone; question not committed")
+                return False
+
+            now = datetime.now(timezone.utc)
+            if holds[hold_id] <= now:
+                # 期限切れの hold は reserve で数えられていないため、空き枠がある場合のみ確定
+                other_holds = sum(1 for other_id, expires_at in holds.items() if other_id != hold_id and expires_at > now)
+                if subscription.get('questions_used', 0) + other_holds >= subscription.get('questions_limit', 0):
+                    logger.warning(f"Quota hold {hold_id} on {subscription_ref.id} expired with no free slot; question not committed")
+                    transaction.update(subscription_ref, {f'holds.{hold_id}': DELETE_FIELD})
+                    return False
+
+            transaction.update(subscription_ref, {
+                'questions_used': Increment(1),
+                f'holds.{hold_id}': DELETE_FIELD,
+                'updated_at': SERVER_TIMESTAMP
+            })
+            return True
+
+        return commit(transaction)
+
+    def release_question(self, subscription_id: str, hold_id: str) -> bool:
+        """AI呼び出しが失敗した場合などに仮押さえを解除（使用回数は増えない）"""
+        try:
+            self.db.collection('subscriptions').document(subscription_id).update({
+                f'holds.{hold_id}': DELETE_FIELD
+            })
+            return True
         except Exception as e:
-            logger.error(f"Use question error: {str(e)}")
+            logger.error(f"Release question error: {str(e)}")
+            return False
+
+    def usage_stats_from(self, subscription: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """サブスクリプションドキュメントから使用状況統計を組み立て"""
+        if not subscription:
             return {
-                'success': False,
-                'error': 'システムエラーが発生しました'
+                'questions_used': 0,
+                'questions_limit': 0,
+                'remaining': 0,
+                'plan_type': 'none',
+                'status': 'inactive'
             }
+
+        # リセット期日を過ぎていれば、ジョブまたは次の仮押さえでリセットされる前提で未使用として扱う
+        used = 0 if self._is_reset_due(subscription) else subscription.get('questions_used', 0)
+        limit = subscription.get('questions_limit', 0)
+
+        return {
+            'questions_used': used,
+            'questions_limit': limit,
+            'remaining': max(0, limit - used),
+            'plan_type': subscription.get('plan_type', 'none'),
+            'status': subscription.get('status', 'inactive'),
+            'reset_date': subscription.get('reset_date')
+        }
+    
+    def get_subscription_version(self, user_id: str, subscription_id: Optional[str]) -> Optional[str]:
+        """アクティブなサブスクリプションの更新時刻（条件付きGETのバージョン用。本文は読まない）
+
+        ポインタが無い・アクティブでない場合は None（get_user_subscription の再検索が必要なため）
+        """
+        if not subscription_id:
+            return None
+        doc = self.db.collection('subscriptions').document(subscription_id).get(field_paths=['user_id', 'status'])
+        data = doc.to_dict() if doc.exists else {}
+        if data.get('user_id') != user_id or data.get('status') != 'active':
+            return None
+        return doc.update_time.isoformat()
     
     def get_usage_stats(self, user_id: str) -> Dict[str, Any]:
         """使用状況統計を取得"""
         try:
             subscription = self.get_user_subscription(user_id)
-            
-            if not subscription:
-                return {
-                    'questions_used': 0,
-                    'questions_limit': 0,
-                    'remaining': 0,
-                    'plan_type': 'none',
-                    'status': 'inactive'
-                }
-            
-            used = subscription.get('questions_used', 0)
-            limit = subscription.get('questions_limit', 0)
-            
-            return {
-                'questions_used': used,
-                'questions_limit': limit,
-                'remaining': max(0, limit - used),
-                'plan_type': subscription.get('plan_type', 'none'),
-                'status': subscription.get('status', 'inactive'),
-                'reset_date': subscription.get('reset_date')
-            }
+            return self.usage_stats_from(subscription)
             
         except Exception as e:
             logger.error(f"Usage stats error: {str(e)}")
@@ -303,65 +485,120 @@ class SubscriptionService:
         except Exception as e:
             logger.error(f"Record additional pack purchase error: {str(e)}")
     
-    # ===== 月次リセット機能 =====
+    # ===== 月次リセット（バッチ） =====
     
-    def _check_and_reset_if_needed(self, subscription: Dict[str, Any]) -> Dict[str, Any]:
-        """月次リセットが必要かチェックし、必要であればリセット実行"""
+    def reset_due_subscriptions(self, now: Optional[datetime] = None, page_size: int = 200,
+                                dry_run: bool = False) -> Dict[str, int]:
+        """リセット期日（reset_date <= now）を過ぎたサブスクリプションの使用回数を一括リセット
+
+        quota_reset_job.py（Cloud Scheduler から定期実行）が呼び出す。ジョブより先に期日を過ぎたユーザーが
+        質問した場合は reserve_question が同じ規則でリセットするため、ここではリセット日が進んだものは対象外になる。
+        次回リセット日は旧リセット日から30日単位で進めるため、何度実行しても結果は同じ。
+        読み取り時の update_time を前提条件に書き込むので、複数インスタンスが同時に実行しても
+        二重リセットや間に確定した質問の消失は起きない（競合したものは conflicts として数える）
+        """
+        now = now or datetime.now(timezone.utc)
+        stats = {'scanned': 0, 'reset': 0, 'skipped': 0, 'conflicts': 0}
+        query = self.db.collection('subscriptions')\
+            .where('status', '==', 'active')\
+            .where('reset_date', '<=', now)\
+            .order_by('reset_date')\
+            .limit(page_size)
+        last_doc = None
+
+        while True:
+            page = query.start_after(last_doc) if last_doc is not None else query
+            docs = list(page.stream())
+            if not docs:
+                break
+            last_doc = docs[-1]
+
+            resets = []
+            for doc in docs:
+                stats['scanned'] += 1
+                data = doc.to_dict() or {}
+                if not self._is_subscription_plan(data.get('plan_type', '')):
+                    stats['skipped'] += 1
+                    continue
+                resets.append((doc, {
+                    'questions_used': 0,
+                    'reset_date': self._next_reset_date(data['reset_date'], now),
+                    'updated_at': SERVER_TIMESTAMP
+                }))
+
+            if dry_run:
+                stats['reset'] += len(resets)
+            elif resets:
+                self._commit_resets(resets, stats)
+
+            logger.info(f"Quota reset progress: {stats}")
+            if len(docs) < page_size:
+                break
+
+        return stats
+
+    def _commit_resets(self, resets: List[tuple], stats: Dict[str, int]):
+        """1ページ分のリセットを1回のバッチで書き込み、競合があれば1件ずつ書き直す"""
+        batch = self.db.batch()
+        for doc, updates in resets:
+            batch.update(doc.reference, updates, option=self.db.write_option(last_update_time=doc.update_time))
         try:
-            reset_date = subscription.get('reset_date')
-            plan_type = subscription.get('plan_type', '')
-            
-            # リセット日が設定されていない場合はリセット不要
-            if not reset_date:
-                return subscription
-            
-            # サブスクリプションプラン以外はリセット不要
-            if not self._is_subscription_plan(plan_type):
-                return subscription
-            
-            # リセット日が来ているかチェック
-            if isinstance(reset_date, str):
-                reset_date = datetime.fromisoformat(reset_date.replace('Z', '+00:00'))
-            
-            if datetime.now() >= reset_date:
-                # リセット実行
-                self._reset_monthly_usage(subscription['id'])
-                
-                # ローカルのサブスクリプション情報も更新
-                subscription['questions_used'] = 0
-                subscription['reset_date'] = datetime.now() + timedelta(days=30)
-                
-                logger.info(f"Monthly reset performed for subscription: {subscription['id']}")
-            
-            return subscription
-            
+            batch.commit()
+            stats['reset'] += len(resets)
         except Exception as e:
-            logger.error(f"Monthly reset check error: {str(e)}")
-            return subscription
+            logger.info(f"Quota reset batch conflicted, retrying individually: {str(e)}")
+            for doc, updates in resets:
+                try:
+                    doc.reference.update(updates, option=self.db.write_option(last_update_time=doc.update_time))
+                    stats['reset'] += 1
+                except Exception as conflict:
+                    # 他のインスタンスがリセット済み・または読み取り後に更新された（次回の実行で再判定）
+                    logger.info(f"Quota reset skipped for subscription {doc.id}: {str(conflict)}")
+                    stats['conflicts'] += 1
+                    continue
+                self._update_snapshot_reset_date(doc.to_dict().get('user_id'), updates['reset_date'])
+            return
+
+        for doc, updates in resets:
+            self._update_snapshot_reset_date(doc.to_dict().get('user_id'), updates['reset_date'])
+
+    def _update_snapshot_reset_date(self, user_id: Optional[str], reset_date: datetime):
+        """ユーザードキュメントの概要のリセット日を追従（未移行のユーザーは対象外）"""
+        if not user_id:
+            return
+        try:
+            self.db.collection('users').document(user_id).update({'usage_snapshot.reset_date': reset_date})
+        except NotFound:
+            pass
+        except Exception as e:
+            logger.error(f"Usage snapshot update error for user {user_id}: {str(e)}")
+
+    def _is_reset_due(self, subscription: Dict[str, Any], now: Optional[datetime] = None) -> bool:
+        """月次リセットの期日が来ているか（サブスクリプションプランのみ対象）"""
+        reset_date = subscription.get('reset_date')
+        if not reset_date or not self._is_subscription_plan(subscription.get('plan_type', '')):
+            return False
+        if isinstance(reset_date, str):
+            reset_date = datetime.fromisoformat(reset_date.replace('Z', '+00:00'))
+        if reset_date.tzinfo is None:
+            reset_date = reset_date.replace(tzinfo=timezone.utc)
+        return (now or datetime.now(timezone.utc)) >= reset_date
+
+    @staticmethod
+    def _next_reset_date(reset_date, now: datetime) -> datetime:
+        """旧リセット日から30日単位で進め、now より後の最初の日付を返す"""
+        if isinstance(reset_date, str):
+            reset_date = datetime.fromisoformat(reset_date.replace('Z', '+00:00'))
+        if reset_date.tzinfo is None:
+            reset_date = reset_date.replace(tzinfo=timezone.utc)
+        periods = (now - reset_date) // timedelta(days=30) + 1
+        return reset_date + timedelta(days=30) * periods
     
     def _is_subscription_plan(self, plan_type: str) -> bool:
         """サブスクリプションプラン（月次リセット対象）かどうか判定"""
         subscription_plans = ['light', 'regular', 'heavy', 'basic']
         return plan_type in subscription_plans
     
-    def _reset_monthly_usage(self, subscription_id: str) -> bool:
-        """月次使用量をリセット"""
-        try:
-            next_reset_date = datetime.now() + timedelta(days=30)
-            
-            self.db.collection('subscriptions').document(subscription_id).update({
-                'questions_used': 0,
-                'reset_date': next_reset_date,
-                'updated_at': SERVER_TIMESTAMP
-            })
-            
-            logger.info(f"Monthly usage reset for subscription: {subscription_id}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Monthly usage reset error: {str(e)}")
-            return False
-    
     # ===== サブスクリプション解約機能 =====
     
     def get_subscription_info(self, user_id: str) -> Dict[str, Any]:
@@ -398,6 +635,7 @@ class SubscriptionService:
                 'cancelled_at': SERVER_TIMESTAMP,
                 'updated_at': SERVER_TIMESTAMP
             })
+            self._set_active_subscription(user_id, {**subscription, 'status': 'cancelled'})
             
             logger.info(f"Subscription marked as cancelled for user: {user_id}")
             return True
@@ -21,13 +21,16 @@ class ApplicationPhase:
     deadline: Optional[str] = None
     documents: List[Document] = field(default_factory=list)
     memo: str = ""
+    # 期限の算定ルール（例：{'base_date': '2025-04-01', 'after_months': 6, 'within_months': 2}）
+    deadline_rule: Optional[Dict] = None
     
     def to_dict(self):
         return {
             'required': self.required,
             'deadline': self.deadline,
             'documents': [doc.to_dict() for doc in self.documents],
-            'memo': self.memo
+            'memo': self.memo,
+            'deadline_rule': self.deadline_rule
         }
 
 @dataclass
@@ -80,14 +83,16 @@ class SubsidyMemo:
             required=data.get('plan_application', {}).get('required', False),
             deadline=data.get('plan_application', {}).get('deadline'),
             documents=plan_docs,
-            memo=data.get('plan_application', {}).get('memo', '')
+            memo=data.get('plan_application', {}).get('memo', ''),
+            deadline_rule=data.get('plan_application', {}).get('deadline_rule')
         )
         
         payment_app = ApplicationPhase(
             required=data.get('payment_application', {}).get('required', True),
             deadline=data.get('payment_application', {}).get('deadline'),
             documents=payment_docs,
-            memo=data.get('payment_application', {}).get('memo', '')
+            memo=data.get('payment_application', {}).get('memo', ''),
+            deadline_rule=data.get('payment_application', {}).get('deadline_rule')
         )
         
         chat_history = []
@@ -1,18 +1,69 @@
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
 from google.cloud.firestore import DocumentReference, SERVER_TIMESTAMP
+from google.api_core.exceptions import NotFound
+import os
+import time
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+class UserCache:
+    """ユーザードキュメントの短期キャッシュ（ワーカープロセスごと・UIDがキー）
+
+    認証付きリクエストごとのユーザー読み込みを減らす。更新・停止時は明示的に破棄し、
+    Firestoreコンソール等で直接変更された場合も TTL 経過後には反映される
+    """
+
+    def __init__(self, ttl_seconds: float = 30, max_size: int = 2048):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, uid: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(uid)
+            if not entry:
+                return None
+            user, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[uid]
+                return None
+        # 呼び出し側での書き換えがキャッシュに影響しないようコピーを返す
+        return dict(user)
+
+    def set(self, uid: str, user: Dict[str, Any]):
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                now = time.monotonic()
+                for key in [k for k, (_, expires_at) in self._entries.items() if expires_at <= now]:
+                    del self._entries[key]
+                if len(self._entries) >= self.max_size:
+                    # 期限切れがなければ最も古く登録したものから破棄
+                    del self._entries[next(iter(self._entries))]
+            self._entries[uid] = (dict(user), time.monotonic() + self.ttl_seconds)
+
+    def invalidate(self, uid: str):
+        with self._lock:
+            self._entries.pop(uid, None)
+
+
+user_cache = UserCache(ttl_seconds=float(os.getenv('USER_CACHE_TTL_SECONDS', '30')))
+
+
 class User:
+    """ユーザーは users/{Firebase UID} に保存する（旧形式はランダムIDで user_id フィールドにUID）"""
+
     def __init__(self, firebase_service):
         self.db = firebase_service.get_db()
     
     def create_user(self, user_data: Dict[str, Any]) -> str:
-        """新規ユーザーを作成"""
+        """新規ユーザーを作成（ドキュメントIDはFirebase UID）"""
         try:
-            user_ref = self.db.collection('users').document()
+            user_ref = self.db.collection('users').document(user_data.get('uid'))
             
             user_record = {
                 'user_id': user_data.get('uid'),
@@ -25,6 +76,7 @@ class User:
             }
             
             user_ref.set(user_record)
+            user_cache.invalidate(user_ref.id)
             
             # 初回サブスクリプションも作成（Firebase UIDを使用）
             self.create_initial_subscription(user_data.get('uid'))
@@ -37,21 +89,47 @@ class User:
             raise
     
     def get_user_by_uid(self, uid: str) -> Optional[Dict[str, Any]]:
-        """UIDでユーザーを取得"""
-        try:
-            users = self.db.collection('users').where('user_id', '==', uid).limit(1).get()
-            
-            if users:
-                user_doc = users[0]
-                return {
-                    'id': user_doc.id,
-                    **user_doc.to_dict()
-                }
+        """UIDでユーザーを取得（キャッシュ → users/{uid} のポイント読み取り → 旧形式の検索）"""
+        if not uid:
             return None
+
+        cached = user_cache.get(uid)
+        if cached:
+            return cached
+
+        try:
+            user_doc = self.db.collection('users').document(uid).get()
+            if not user_doc.exists:
+                user_doc = self._migrate_legacy_user(uid)
+                if not user_doc:
+                    return None
+
+            user = {
+                'id': user_doc.id,
+                **user_doc.to_dict()
+            }
+            user_cache.set(uid, user)
+            return dict(user)
             
         except Exception as e:
             logger.error(f"User fetch error: {str(e)}")
             return None
+
+    def _find_legacy_user_doc(self, uid: str):
+        """旧形式（ランダムID）のユーザードキュメントを検索"""
+        users = self.db.collection('users').where('user_id', '==', uid).limit(1).get()
+        return users[0] if users else None
+
+    def _migrate_legacy_user(self, uid: str):
+        """未移行ユーザーを users/{uid} へコピーして返す（一括移行は migrate_users.py）"""
+        legacy_doc = self._find_legacy_user_doc(uid)
+        if not legacy_doc:
+            return None
+
+        user_ref = self.db.collection('users').document(uid)
+        user_ref.set({**legacy_doc.to_dict(), 'legacy_doc_id': legacy_doc.id}, merge=True)
+        logger.info(f"Migrated legacy user document {legacy_doc.id} to users/{uid}")
+        return user_ref.get()
     
     def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
         """ドキュメントIDでユーザーを取得"""
@@ -70,11 +148,18 @@ class User:
             return None
     
     def update_user(self, user_id: str, update_data: Dict[str, Any]) -> bool:
-        """ユーザー情報を更新"""
+        """ユーザー情報を更新（user_id は Firebase UID）"""
         try:
             update_data['updated_at'] = SERVER_TIMESTAMP
             
-            self.db.collection('users').document(user_id).update(update_data)
+            try:
+                self.db.collection('users').document(user_id).update(update_data)
+            except NotFound:
+                # 未移行のユーザーは移行してから更新
+                if not self._migrate_legacy_user(user_id):
+                    raise
+                self.db.collection('users').document(user_id).update(update_data)
+            user_cache.invalidate(user_id)
             
             logger.info(f"User updated successfully: {user_id}")
             return True
@@ -82,6 +167,14 @@ class User:
         except Exception as e:
             logger.error(f"User update error: {str(e)}")
             return False
+
+    def set_user_status(self, user_id: str, status: str, reason: str = '') -> bool:
+        """利用状態を変更（'blocked' で利用停止、'active' で解除）。キャッシュも即時破棄"""
+        return self.update_user(user_id, {
+            'status': status,
+            'status_reason': reason,
+            'status_changed_at': SERVER_TIMESTAMP
+        })
     
     def update_stripe_customer_id(self, user_id: str, stripe_customer_id: str) -> bool:
         """Stripe顧客IDを更新"""
@@ -150,7 +243,17 @@ class User:
                     'updated_at': SERVER_TIMESTAMP
                 }
             
-            self.db.collection('subscriptions').add(subscription_data)
+            _, subscription_ref = self.db.collection('subscriptions').add(subscription_data)
+            
+            # アクティブなサブスクリプションへのポインタをユーザードキュメントに張る
+            from models.subscription import active_subscription_fields
+            try:
+                self.db.collection('users').document(user_id).update(
+                    active_subscription_fields({'id': subscription_ref.id, **subscription_data})
+                )
+            except NotFound:
+                logger.info(f"User document users/{user_id} not found, skipped active subscription pointer")
+            user_cache.invalidate(user_id)
             logger.info(f"Initial subscription created for user {user_id}")
             
         except Exception as e:
@@ -0,0 +1,356 @@
+"""
+賃金台帳CSVの集計（賃金要件チェック用）
+「最低賃金額以上かどうかを確認する方法」に沿って、最低賃金の対象外となる賃金を除いた時間換算額を
+NumPyの列演算でまとめて計算し、事業場内最低賃金・コース別の引上げ対象者数・賃上げ率を集計する。
+エージェントには生データではなく format_payroll_summary() の要約のみを渡す
+"""
+import csv
+import sys
+import logging
+from typing import Dict, IO, List, Optional
+
+import numpy as np
+
+from subsidy_calculator import GYOUMU_KAIZEN_COURSES
+
+logger = logging.getLogger(__name__)
+
+# 入力列名のゆらぎ吸収
+COLUMN_ALIASES = {
+    'employee_id': ['employee_id', 'id', '社員番号', '従業員ID'],
+    'wage_type': ['wage_type', '給与形態', '賃金形態'],
+    'base_wage': ['base_wage', '基本給'],
+    'allowances': ['allowances', '手当', '諸手当'],
+    'commute_allowance': ['commute_allowance', '通勤手当'],
+    'family_allowance': ['family_allowance', '家族手当'],
+    'attendance_allowance': ['attendance_allowance', '精皆勤手当'],
+    'daily_hours': ['daily_hours', '1日の所定労働時間'],
+    'monthly_hours': ['monthly_hours', '1箇月平均所定労働時間', '月平均所定労働時間'],
+    'hours_worked': ['hours_worked', '総労働時間'],
+    'base_wage_after': ['base_wage_after', '引上げ後基本給'],
+    'allowances_after': ['allowances_after', '引上げ後手当'],
+    'allowances_include_excluded': ['allowances_include_excluded', '手当に除外手当を含む'],
+}
+
+TEXT_COLUMNS = ('employee_id', 'wage_type', 'allowances_include_excluded')
+NUMERIC_COLUMNS = [column for column in COLUMN_ALIASES if column not in TEXT_COLUMNS]
+
+# 最低賃金の対象とならない手当。別の列で入力されたものは計算に使わず、
+# allowances_include_excluded が真の行に限り手当（allowances）の合計から差し引く
+EXCLUDED_ALLOWANCES = ['commute_allowance', 'family_allowance', 'attendance_allowance']
+
+# 真とみなすフラグ列の値
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'はい', '含む', '○', '〇'}
+
+# 給与形態の表記ゆらぎ → hourly / daily / monthly / piece
+WAGE_TYPES = {
+    'hourly': 'hourly', '時給': 'hourly', '時間給': 'hourly',
+    'daily': 'daily', '日給': 'daily',
+    'monthly': 'monthly', '月給': 'monthly',
+    'piece': 'piece', '出来高': 'piece', '歩合': 'piece', '歩合給': 'piece',
+}
+
+# キャリアアップ助成金（賃金規定等改定コース）の増額改定率の区分
+RAISE_RATE_BANDS = [0.03, 0.04, 0.05, 0.06]
+
+# 何行ずつ読み込んで配列に変換するか（数千〜数万行でもメモリを一定に保つ）
+READ_CHUNK_ROWS = 5000
+
+
+class PayrollAnalyzer:
+    """賃金台帳CSVの時間換算・賃金要件の集計"""
+
+    def __init__(self, default_daily_hours: float = 8.0, default_monthly_hours: Optional[float] = None):
+        self.default_daily_hours = default_daily_hours
+        self.default_monthly_hours = default_monthly_hours
+
+    def read_columns(self, stream: IO[str]) -> Dict[str, np.ndarray]:
+        """CSVストリームを逐次読み込み、列ごとのNumPy配列に変換"""
+        reader = csv.DictReader(stream)
+        if not reader.fieldnames:
+            raise ValueError("CSVのヘッダー行がありません")
+
+        header = {}
+        for canonical, aliases in COLUMN_ALIASES.items():
+            header[canonical] = next((alias for alias in aliases if alias in reader.fieldnames), None)
+        if header['base_wage'] is None:
+            raise ValueError("基本給（base_wage）の列が必要です")
+
+        numeric_chunks = {column: [] for column in NUMERIC_COLUMNS}
+        text_columns = {'employee_id': [], 'wage_type': [], 'allowances_include_excluded': []}
+        buffer = []
+
+        def flush():
+            for column in NUMERIC_COLUMNS:
+                source = header[column]
+                numeric_chunks[column].append(
+                    self._to_numeric([row.get(source) for row in buffer] if source else [None] * len(buffer))
+                )
+            buffer.clear()
+
+        for index, row in enumerate(reader):
+            employee_id = row.get(header['employee_id']) if header['employee_id'] else None
+            text_columns['employee_id'].append(employee_id or str(index + 1))
+            wage_type = (row.get(header['wage_type']) or '').strip() if header['wage_type'] else ''
+            text_columns['wage_type'].append(WAGE_TYPES.get(wage_type, wage_type or 'monthly'))
+            includes = row.get(header['allowances_include_excluded']) if header['allowances_include_excluded'] else None
+            text_columns['allowances_include_excluded'].append((includes or '').strip().lower() in TRUE_VALUES)
+            buffer.append(row)
+            if len(buffer) >= READ_CHUNK_ROWS:
+                flush()
+        if buffer:
+            flush()
+
+        columns = {column: np.concatenate(chunks) if chunks else np.array([], dtype=np.float64)
+                   for column, chunks in numeric_chunks.items()}
+        columns['employee_id'] = np.array(text_columns['employee_id'], dtype=object)
+        columns['wage_type'] = np.array(text_columns['wage_type'])
+        columns['allowances_include_excluded'] = np.array(text_columns['allowances_include_excluded'], dtype=bool)
+        return columns
+
+    def _to_numeric(self, values: List) -> np.ndarray:
+        """数値列に変換（未入力はNaN。金額のカンマ・円表記は除去）"""
+        numeric = np.full(len(values), np.nan, dtype=np.float64)
+        for index, value in enumerate(values):
+            if value is None or str(value).strip() == '':
+                continue
+            try:
+                numeric[index] = float(str(value).replace(',', '').replace('円', '').strip())
+            except ValueError:
+                continue
+        return numeric
+
+    def hourly_wages(self, columns: Dict[str, np.ndarray], after: bool = False) -> np.ndarray:
+        """最低賃金の対象となる賃金の時間換算額（換算できない行はNaN）"""
+        base = columns['base_wage_after'] if after else columns['base_wage']
+        allowances = columns['allowances_after'] if after else columns['allowances']
+        if after:
+            # 引上げ後の値が未入力の行は引上げ前と同額として扱う
+            base = np.where(np.isnan(base), columns['base_wage'], base)
+            allowances = np.where(np.isnan(allowances), columns['allowances'], allowances)
+
+        # 通勤・家族・精皆勤手当は算入しない。手当の合計に含めて入力された行だけ差し引く
+        monthly_allowances = np.nan_to_num(allowances)
+        includes_excluded = columns['allowances_include_excluded']
+        if includes_excluded.any():
+            excluded = np.zeros_like(base)
+            for column in EXCLUDED_ALLOWANCES:
+                excluded += np.nan_to_num(columns[column])
+            monthly_allowances = np.where(includes_excluded, np.clip(monthly_allowances - excluded, 0, None),
+                                          monthly_allowances)
+
+        daily_hours = np.where(np.isnan(columns['daily_hours']), self.default_daily_hours, columns['daily_hours'])
+        monthly_hours = columns['monthly_hours']
+        if self.default_monthly_hours:
+            monthly_hours = np.where(np.isnan(monthly_hours), self.default_monthly_hours, monthly_hours)
+
+        wage_type = columns['wage_type']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            base_hourly = np.select(
+                [wage_type == 'hourly', wage_type == 'daily', wage_type == 'monthly', wage_type == 'piece'],
+                [base, base / daily_hours, base / monthly_hours, base / columns['hours_worked']],
+                default=np.nan
+            )
+            allowance_hourly = np.where(monthly_allowances > 0, monthly_allowances / monthly_hours, 0.0)
+
+        hourly = base_hourly + allowance_hourly
+        hourly[~np.isfinite(hourly) | (hourly <= 0)] = np.nan
+        return hourly
+
+    def analyze(self, stream: IO[str], regional_min_wage: Optional[float] = None) -> Dict:
+        """事業場内最低賃金・コース別の引上げ対象者数・賃上げ率を集計"""
+        columns = self.read_columns(stream)
+        hourly = self.hourly_wages(columns)
+        valid = ~np.isnan(hourly)
+
+        summary = {
+            'worker_count': int(len(hourly)),
+            'analyzed_count': int(valid.sum()),
+            'invalid_employee_ids': [str(value) for value in columns['employee_id'][~valid][:20]],
+        }
+        if not valid.any():
+            raise ValueError("時間換算できる行がありません（所定労働時間の列・既定値を確認してください）")
+
+        wages = hourly[valid]
+        # 事業場内最低賃金は円未満を切り捨てて判定
+        workplace_min = float(np.floor(wages.min()))
+        summary.update({
+            'workplace_min_wage': workplace_min,
+            'lowest_paid_employee_ids': [str(value) for value in columns['employee_id'][valid][wages < workplace_min + 1][:20]],
+            'hourly_wage_percentiles': {
+                'p10': round(float(np.percentile(wages, 10)), 1),
+                'median': round(float(np.median(wages)), 1),
+                'p90': round(float(np.percentile(wages, 90)), 1),
+            },
+            # 業務改善助成金: 各コースの引上げ後の事業場内最低賃金を下回る（＝引上げが必要な）労働者数
+            'course_thresholds': [
+                {
+                    'course': f"{course}円コース",
+                    'target_wage': workplace_min + course,
+                    'workers_below': int((wages < workplace_min + course).sum()),
+                }
+                for course in sorted(GYOUMU_KAIZEN_COURSES)
+            ],
+        })
+
+        if regional_min_wage:
+            summary['regional_min_wage'] = regional_min_wage
+            summary['workers_below_regional_min'] = int((wages < regional_min_wage).sum())
+            summary['gap_to_regional_min'] = workplace_min - regional_min_wage
+
+        has_after = not (np.isnan(columns['base_wage_after']).all() and np.isnan(columns['allowances_after']).all())
+        if has_after:
+            summary['after_increase'] = self._summarize_increase(hourly, self.hourly_wages(columns, after=True), workplace_min)
+
+        logger.info(f"Payroll analyzed: {summary['analyzed_count']}/{summary['worker_count']} rows")
+        return summary
+
+    def _summarize_increase(self, before: np.ndarray, after: np.ndarray, workplace_min: float) -> Dict:
+        valid = ~np.isnan(before) & ~np.isnan(after)
+        ratios = after[valid] / before[valid]
+        after_min = float(np.floor(after[valid].min()))
+        increase = after_min - workplace_min
+        eligible_courses = [course for course in sorted(GYOUMU_KAIZEN_COURSES) if increase >= course]
+
+        return {
+            'workplace_min_wage': after_min,
+            'min_wage_increase': increase,
+            'gyoumukaizen_course': f"{eligible_courses[-1]}円コース" if eligible_courses else None,
+            'raised_workers': int((after[valid] > before[valid]).sum()),
+            'raise_ratio': {
+                'min': round(float(ratios.min()), 4),
+                'median': round(float(np.median(ratios)), 4),
+            },
+            # キャリアアップ助成金（賃金規定等改定コース）: 増額改定率の区分ごとの人数
+            'workers_by_raise_rate': {
+                f"{int(band * 100)}%以上": int((ratios >= 1 + band - 1e-9).sum()) for band in RAISE_RATE_BANDS
+            },
+            'workers_below_3pct': int((ratios < 1 + RAISE_RATE_BANDS[0] - 1e-9).sum()),
+        }
+
+
+def _number(value, name: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value):
+        raise ValueError(f"{name} は数値で指定してください")
+    return value
+
+
+def _count(value, name: str) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValueError(f"{name} は0以上の整数で指定してください")
+    return value
+
+
+def _course_label(value, name: str) -> str:
+    if value not in {f"{course}円コース" for course in GYOUMU_KAIZEN_COURSES}:
+        raise ValueError(f"{name} が正しくありません")
+    return value
+
+
+def validate_payroll_summary(summary) -> Dict:
+    """クライアントから送られた集計結果（analyze() の出力）を検証し、要約に使う項目だけを返す
+
+    型が合わない・必要な項目がない場合は ValueError
+    """
+    if not isinstance(summary, dict):
+        raise ValueError("payroll_summary はオブジェクトで指定してください")
+
+    validated = {
+        'worker_count': _count(summary.get('worker_count', 0), 'worker_count'),
+        'analyzed_count': _count(summary.get('analyzed_count', 0), 'analyzed_count'),
+        'workplace_min_wage': _number(summary.get('workplace_min_wage'), 'workplace_min_wage'),
+    }
+
+    if summary.get('regional_min_wage') is not None:
+        validated['regional_min_wage'] = _number(summary['regional_min_wage'], 'regional_min_wage')
+        validated['gap_to_regional_min'] = _number(summary.get('gap_to_regional_min'), 'gap_to_regional_min')
+        validated['workers_below_regional_min'] = _count(summary.get('workers_below_regional_min'), 'workers_below_regional_min')
+
+    thresholds = summary.get('course_thresholds') or []
+    if not isinstance(thresholds, list) or len(thresholds) > len(GYOUMU_KAIZEN_COURSES):
+        raise ValueError("course_thresholds が正しくありません")
+    validated['course_thresholds'] = []
+    for threshold in thresholds:
+        if not isinstance(threshold, dict):
+            raise ValueError("course_thresholds が正しくありません")
+        validated['course_thresholds'].append({
+            'course': _course_label(threshold.get('course'), 'course_thresholds.course'),
+            'target_wage': _number(threshold.get('target_wage'), 'course_thresholds.target_wage'),
+            'workers_below': _count(threshold.get('workers_below'), 'course_thresholds.workers_below'),
+        })
+
+    after = summary.get('after_increase')
+    if after is not None:
+        if not isinstance(after, dict) or not isinstance(after.get('raise_ratio'), dict) \
+                or not isinstance(after.get('workers_by_raise_rate'), dict):
+            raise ValueError("after_increase が正しくありません")
+        rate_labels = [f"{int(band * 100)}%以上" for band in RAISE_RATE_BANDS]
+        course = after.get('gyoumukaizen_course')
+        validated['after_increase'] = {
+            'workplace_min_wage': _number(after.get('workplace_min_wage'), 'after_increase.workplace_min_wage'),
+            'min_wage_increase': _number(after.get('min_wage_increase'), 'after_increase.min_wage_increase'),
+            'gyoumukaizen_course': None if course is None else _course_label(course, 'after_increase.gyoumukaizen_course'),
+            'raised_workers': _count(after.get('raised_workers'), 'after_increase.raised_workers'),
+            'raise_ratio': {
+                key: _number(after['raise_ratio'].get(key), f"after_increase.raise_ratio.{key}") for key in ('min', 'median')
+            },
+            'workers_by_raise_rate': {
+                label: _count(after['workers_by_raise_rate'].get(label), 'after_increase.workers_by_raise_rate')
+                for label in rate_labels
+            },
+            'workers_below_3pct': _count(after.get('workers_below_3pct'), 'after_increase.workers_below_3pct'),
+        }
+
+    return validated
+
+
+def format_payroll_summary(summary: Dict) -> str:
+    """エージェントのプロンプトに添付する要約テキスト"""
+    lines = [
+        f"対象労働者数：{summary.get('worker_count', 0)}人（時間換算できた人数：{summary.get('analyzed_count', 0)}人）",
+        f"事業場内最低賃金（時間換算・対象外賃金除外後）：{summary.get('workplace_min_wage', 0):,.0f}円",
+    ]
+    if 'regional_min_wage' in summary:
+        lines.append(f"地域別最低賃金：{summary['regional_min_wage']:,.0f}円（差額{summary['gap_to_regional_min']:,.0f}円、"
+                     f"下回る労働者{summary['workers_below_regional_min']}人）")
+    for threshold in summary.get('course_thresholds', []):
+        lines.append(f"{threshold['course']}：{threshold['target_wage']:,.0f}円未満の労働者{threshold['workers_below']}人")
+
+    after = summary.get('after_increase')
+    if after:
+        lines.append(f"引上げ後の事業場内最低賃金：{after['workplace_min_wage']:,.0f}円（引上げ額{after['min_wage_increase']:,.0f}円、"
+                     f"該当コース：{after['gyoumukaizen_course'] or 'なし'}、引上げ労働者{after['raised_workers']}人）")
+        rates = '、'.join(f"{label}{count}人" for label, count in after['workers_by_raise_rate'].items())
+        lines.append(f"賃上げ率：最小{(after['raise_ratio']['min'] - 1) * 100:.1f}%、中央値{(after['raise_ratio']['median'] - 1) * 100:.1f}%"
+                     f"（{rates}、3%未満{after['workers_below_3pct']}人）")
+
+    return '\n'.join(lines)
+
+
+def main():
+    """CLI: python src/payroll_analytics.py payroll.csv [--regional-min-wage 1055] [--monthly-hours 160]"""
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='賃金台帳CSVの賃金要件チェック')
+    parser.add_argument('input', help='賃金台帳CSV')
+    parser.add_argument('--regional-min-wage', type=float, help='地域別最低賃金（時間額）')
+    parser.add_argument('--daily-hours', type=float, default=8.0, help='1日の所定労働時間の既定値')
+    parser.add_argument('--monthly-hours', type=float, help='1箇月平均所定労働時間の既定値')
+    parser.add_argument('--json', action='store_true', help='集計結果をJSONで出力')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    analyzer = PayrollAnalyzer(default_daily_hours=args.daily_hours, default_monthly_hours=args.monthly_hours)
+    with open(args.input, 'r', encoding='utf-8-sig', newline='') as f:
+        summary = analyzer.analyze(f, regional_min_wage=args.regional_min_wage)
+
+    if args.json:
+        sys.stdout.write(json.dumps(summary, ensure_ascii=False, indent=2) + '\n')
+    else:
+        sys.stdout.write(format_payroll_summary(summary) + '\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+質問回数の月次リセットジョブ
+リセット期日（reset_date）を過ぎたサブスクリプションの使用回数をまとめて0に戻し、次回リセット日を進める。
+期日を過ぎたユーザーが質問した場合は仮押さえ（reserve_question）の書き込みでもリセットされるが、
+質問しないユーザーの使用状況・次回リセット日を進めるため定期的に実行する。
+
+実行方法:
+    python src/quota_reset_job.py [--dry-run]
+    POST /admin/api/jobs/reset-quotas（X-Job-Secret ヘッダーに JOB_SECRET）
+    Cloud Scheduler のジョブ quota-reset がデプロイ時に作成・更新され、10分ごとに呼び出す
+    （.github/workflows/deploy.yml。GitHub のシークレット JOB_SECRET が必要）
+
+何度・複数インスタンスから同時に実行しても結果は同じ（SubscriptionService.reset_due_subscriptions 参照）
+"""
+import hmac
+import os
+import sys
+import logging
+from typing import Dict, Optional
+
+from firebase_config import firebase_service
+from models.subscription import SubscriptionService
+
+logger = logging.getLogger(__name__)
+
+JOB_SECRET_HEADER = 'X-Job-Secret'
+
+
+def run_quota_reset(dry_run: bool = False) -> Dict[str, int]:
+    """期日を過ぎたサブスクリプションをリセットし、件数を返す"""
+    stats = SubscriptionService(firebase_service).reset_due_subscriptions(dry_run=dry_run)
+    logger.info(f"Quota reset finished: {stats}")
+    return stats
+
+
+def is_valid_job_secret(provided: Optional[str]) -> bool:
+    """ジョブ起動用の共有シークレットを検証（JOB_SECRET 未設定時は常に拒否）"""
+    expected = os.getenv('JOB_SECRET')
+    if not expected or not provided:
+        return False
+    return hmac.compare_digest(provided.encode('utf-8'), expected.encode('utf-8'))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='質問回数の月次リセットを実行')
+    parser.add_argument('--dry-run', action='store_true', help='書き込みを行わず件数のみ集計')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if firebase_service.get_db() is None:
+        print("Firestore is not available")
+        sys.exit(1)
+
+    stats = run_quota_reset(dry_run=args.dry_run)
+    print(' '.join(f"{key}={value}" for key, value in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+スライディングウィンドウ方式のレート制限
+キーごとに「現在の窓の回数・直前の窓の回数・窓の開始時刻」だけを保持し、直前の窓の回数を経過割合で
+按分して直近 window 秒の利用回数を近似する（タイムスタンプの一覧は持たないためキーあたりのメモリは一定）。
+
+バックエンド:
+    memory: ワーカープロセス内（キー数の上限つきLRU）
+    sqlite: 同一コンテナ内の全ワーカーで共有（WALモードのSQLiteファイル。Cloud Run では /tmp）
+
+環境変数:
+    RATE_LIMIT_BACKEND           memory / sqlite（既定: sqlite、開けない場合は memory）
+    RATE_LIMIT_SQLITE_PATH       SQLiteファイルのパス（既定: /tmp/rate_limits.sqlite3）
+    RATE_LIMIT_MAX_KEYS          保持するキー数の上限（既定: 10000）
+    RATE_LIMIT_TRUSTED_PROXY_HOPS X-Forwarded-For のうち信頼するプロキシの段数（既定: 1 = Cloud Run のフロントエンド）
+    RATE_LIMIT_TRUSTED_PROXIES   追加で信頼するプロキシのアドレス範囲（カンマ区切りのCIDR）
+"""
+import os
+import time
+import sqlite3
+import logging
+import ipaddress
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import request, jsonify
+
+logger = logging.getLogger(__name__)
+
+
+def _slide(state: Optional[Tuple[float, int, int]], now: float, window: float) -> Tuple[float, int, int]:
+    """保存済みの状態 (窓の開始時刻, 現在の窓の回数, 直前の窓の回数) を現在時刻の窓まで進める"""
+    window_start = now - (now % window)
+    if not state:
+        return window_start, 0, 0
+    saved_start, current, previous = state
+    if saved_start == window_start:
+        return window_start, current, previous
+    if saved_start == window_start - window:
+        return window_start, 0, current
+    return window_start, 0, 0
+
+
+def _evaluate(state: Tuple[float, int, int], now: float, window: float, limit: int) -> Tuple[bool, float, float]:
+    """(許可するか, 直近 window 秒の推定回数, 再試行までの秒数) を返す"""
+    window_start, current, previous = state
+    elapsed_ratio = (now - window_start) / window
+    estimated = previous * (1 - elapsed_ratio) + current
+    if estimated + 1 <= limit:
+        return True, estimated, 0.0
+
+    if current + 1 > limit or previous == 0:
+        retry_after = window_start + window - now
+    else:
+        # 直前の窓の按分が減って1回分の余裕ができる時刻
+        ratio_needed = 1 - (limit - 1 - current) / previous
+        retry_after = window_start + window * ratio_needed - now
+    return False, estimated, max(1.0, retry_after)
+
+
+class RateLimitResult:
+    __slots__ = ('allowed', 'limit', 'remaining', 'retry_after')
+
+    def __init__(self, allowed: bool, limit: int, estimated: float, retry_after: float):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = max(0, int(limit - estimated - (1 if allowed else 0)))
+        self.retry_after = int(retry_after + 0.999)
+
+
+class MemoryBackend:
+    """ワーカープロセス内のバックエンド（キー数が上限を超えたら最も使われていないものから破棄）"""
+
+    name = 'memory'
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[str, Tuple[float, int, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, window: float, now: float) -> RateLimitResult:
+        with self._lock:
+            state = _slide(self._entries.get(key), now, window)
+            allowed, estimated, retry_after = _evaluate(state, now, window, limit)
+            if allowed:
+                state = (state[0], state[1] + 1, state[2])
+            self._entries[key] = state
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+        return RateLimitResult(allowed, limit, estimated, retry_after)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteBackend:
+    """同一ホストの全ワーカーで共有するバックエンド（WALモード・行ロックの代わりに BEGIN IMMEDIATE）"""
+
+    name = 'sqlite'
+    PRUNE_EVERY = 500
+
+    def __init__(self, path: str, max_keys: int = 10000):
+        self.path = path
+        self.max_keys = max_keys
+        self._local = threading.local()
+        self._hits = 0
+        self._hits_lock = threading.Lock()
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS rate_limits ('
+            ' key TEXT PRIMARY KEY, window_start REAL, current INTEGER, previous INTEGER, expires_at REAL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS rate_limits_expires_at ON rate_limits (expires_at)')
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key: str, limit: int, window: float, now: float) -> RateLimitResult:
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT window_start, current, previous FROM rate_limits WHERE key = ?', (key,)
+            ).fetchone()
+            state = _slide(row, now, window)
+            allowed, estimated, retry_after = _evaluate(state, now, window, limit)
+            if allowed:
+                state = (state[0], state[1] + 1, state[2])
+            conn.execute(
+                'INSERT OR REPLACE INTO rate_limits (key, window_start, current, previous, expires_at)'
+                ' VALUES (?, ?, ?, ?, ?)',
+                (key, state[0], state[1], state[2], state[0] + 2 * window)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        with self._hits_lock:
+            self._hits += 1
+            should_prune = self._hits % self.PRUNE_EVERY == 0
+        if should_prune:
+            self.prune(now)
+        return RateLimitResult(allowed, limit, estimated, retry_after)
+
+    def prune(self, now: Optional[float] = None):
+        """窓を2つ過ぎたキーを削除し、上限を超えた分は期限の近いものから削除"""
+        conn = self._connection()
+        conn.execute('DELETE FROM rate_limits WHERE expires_at <= ?', (now or time.time(),))
+        conn.execute(
+            'DELETE FROM rate_limits WHERE key IN ('
+            ' SELECT key FROM rate_limits ORDER BY expires_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_keys,)
+        )
+
+    def size(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM rate_limits').fetchone()[0]
+
+
+def _parse_networks(value: str) -> List:
+    networks = []
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        try:
+            networks.append(ipaddress.ip_network(item, strict=False))
+        except ValueError:
+            logger.warning(f"Ignoring invalid trusted proxy network: {item}")
+    return networks
+
+
+def _valid_ip(value: str) -> Optional[str]:
+    try:
+        return str(ipaddress.ip_address(value.strip()))
+    except ValueError:
+        return None
+
+
+class RateLimiter:
+    def __init__(self, backend, trusted_proxy_hops: int = 1, trusted_proxies: Optional[List] = None):
+        self.backend = backend
+        self.trusted_proxy_hops = trusted_proxy_hops
+        self.trusted_proxies = trusted_proxies or []
+        self._stats = {'allowed': 0, 'limited': 0, 'errors': 0}
+        self._lock = threading.Lock()
+
+    def _is_trusted(self, address: str) -> bool:
+        ip = ipaddress.ip_address(address)
+        return any(ip in network for network in self.trusted_proxies)
+
+    def client_ip(self, environ: Optional[Dict] = None) -> str:
+        """信頼するプロキシを右から除いた X-Forwarded-For の最初のアドレス（クライアントが付けた値は信用しない）"""
+        environ = environ if environ is not None else request.environ
+        remote_addr = environ.get('REMOTE_ADDR', '') or ''
+        forwarded = environ.get('HTTP_X_FORWARDED_FOR', '')
+        if not forwarded or self.trusted_proxy_hops <= 0:
+            return remote_addr
+
+        hops = [_valid_ip(part) for part in forwarded.split(',')]
+        index = len(hops) - self.trusted_proxy_hops
+        if index < 0:
+            return remote_addr
+        # 追加で信頼するプロキシ（ロードバランサ等）が付けたアドレスはさらに読み飛ばす
+        while index > 0 and hops[index] and self._is_trusted(hops[index]):
+            index -= 1
+        return hops[index] or remote_addr
+
+    def hit(self, key: str, limit: int, window: float) -> RateLimitResult:
+        try:
+            result = self.backend.hit(key, limit, window, time.time())
+        except Exception as e:
+            # 制限用ストアの障害でサービス全体を止めない
+            logger.error(f"Rate limiter backend error: {str(e)}")
+            with self._lock:
+                self._stats['errors'] += 1
+            return RateLimitResult(True, limit, 0, 0)
+        with self._lock:
+            self._stats['allowed' if result.allowed else 'limited'] += 1
+        return result
+
+    def limit(self, limit: int, per_seconds: float, scope: Optional[str] = None,
+              key_func: Optional[Callable[[], Optional[str]]] = None,
+              error_message: str = 'リクエストが多すぎます。しばらく時間をおいて再度お試しください。',
+              extra: Optional[Dict] = None):
+        """エンドポイント用デコレータ（既定ではクライアントIPごと。key_func で認証ユーザーごと等に変更）"""
+        def decorator(f):
+            endpoint_scope = scope or f.__name__
+
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                identity = (key_func() if key_func else None) or self.client_ip()
+                result = self.hit(f"{endpoint_scope}:{identity}", limit, per_seconds)
+                if not result.allowed:
+                    logger.warning(f"Rate limit exceeded: scope={endpoint_scope} identity={identity}")
+                    response = jsonify({
+                        'error': error_message,
+                        'code': 'RATE_LIMITED',
+                        'retry_after': result.retry_after,
+                        **(extra or {})
+                    })
+                    response.status_code = 429
+                    response.headers['Retry-After'] = str(result.retry_after)
+                    return response
+                return f(*args, **kwargs)
+
+            return decorated_function
+        return decorator
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['backend'] = self.backend.name
+        try:
+            stats['keys'] = self.backend.size()
+        except Exception:
+            stats['keys'] = None
+        return stats
+
+
+def create_rate_limiter() -> RateLimiter:
+    """環境変数の設定でレートリミッターを生成"""
+    max_keys = int(os.getenv('RATE_LIMIT_MAX_KEYS', '10000'))
+    backend_name = os.getenv('RATE_LIMIT_BACKEND', 'sqlite')
+    backend = None
+    if backend_name == 'sqlite':
+        path = os.getenv('RATE_LIMIT_SQLITE_PATH', '/tmp/rate_limits.sqlite3')
+        try:
+            backend = SQLiteBackend(path, max_keys=max_keys)
+        except Exception as e:
+            logger.error(f"SQLite rate limit store unavailable ({path}), using in-process store: {str(e)}")
+    if backend is None:
+        backend = MemoryBackend(max_keys=max_keys)
+
+    return RateLimiter(
+        backend,
+        trusted_proxy_hops=int(os.getenv('RATE_LIMIT_TRUSTED_PROXY_HOPS', '1')),
+        trusted_proxies=_parse_networks(os.getenv('RATE_LIMIT_TRUSTED_PROXIES', ''))
+    )
+
+
+rate_limiter = create_rate_limiter()
@@ -0,0 +1,96 @@
+"""
+リクエスト処理の小さな依存関係つきパイプライン
+互いに依存しない処理（Firestoreの読み書き・プロンプト組み立て等）をスレッドプールで並行実行し、
+各ステージの所要時間を Server-Timing ヘッダーで返す。
+
+ステージ関数は完了済みステージの結果の辞書を1引数で受け取る。ワーカースレッドでは Flask の
+request / g を参照できないため、必要な値はパイプライン組み立て時に引数として渡すこと。
+
+    pipeline = RequestPipeline()
+    pipeline.stage('prompt', lambda r: build_prompt(data))
+    pipeline.stage('quota', lambda r: reserve(user))
+    pipeline.stage('llm', lambda r: call_llm(r['prompt']), 'prompt', 'quota')
+    results = pipeline.run()
+
+run() は追加済みで未実行のステージだけを実行するので、途中でリクエストスレッド側の処理
+（g への設定・エラー応答の判定など）を挟みながら段階的にステージを追加・実行できる。
+"""
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SERVER_TIMING_HEADER = 'Server-Timing'
+
+# ワーカープロセスで共有するスレッドプール（I/O待ちが中心のためCPU数より多めでよい）
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('PIPELINE_WORKERS', '8')),
+    thread_name_prefix='pipeline'
+)
+
+
+class RequestPipeline:
+    def __init__(self, executor: Optional[ThreadPoolExecutor] = None):
+        self._executor = executor or _executor
+        self._stages: List[Tuple[str, Callable[[Dict[str, Any]], Any], Tuple[str, ...]]] = []
+        self._started = time.perf_counter()
+        self.results: Dict[str, Any] = {}
+        self.timings: Dict[str, float] = {}
+
+    def stage(self, name: str, fn: Callable[[Dict[str, Any]], Any], *depends_on: str) -> 'RequestPipeline':
+        known = {stage_name for stage_name, _, _ in self._stages}
+        missing = [dep for dep in depends_on if dep not in known]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on undefined stages: {missing}")
+        self._stages.append((name, fn, depends_on))
+        return self
+
+    def _timed(self, name: str, fn: Callable[[Dict[str, Any]], Any], results: Dict[str, Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            return fn(results)
+        finally:
+            self.timings[name] = (time.perf_counter() - started) * 1000
+
+    def run(self) -> Dict[str, Any]:
+        """未実行のステージを依存関係が満たされたものから並行実行し、これまでの全ステージの結果を返す
+
+        いずれかのステージが例外を出した場合は新しいステージを開始せず、実行中のものの完了を待ってから再送出する
+        """
+        results = self.results
+        pending = [entry for entry in self._stages if entry[0] not in results and entry[0] not in self.timings]
+        running = {}
+        error = None
+
+        while pending or running:
+            if error is None:
+                for entry in [entry for entry in pending if all(dep in results for dep in entry[2])]:
+                    pending.remove(entry)
+                    name, fn, _ = entry
+                    # 結果の辞書はコピーを渡す（他のステージの完了による変更を見せない）
+                    running[self._executor.submit(self._timed, name, fn, dict(results))] = name
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    logger.error(f"Pipeline stage '{name}' failed: {str(e)}")
+                    error = error or e
+
+        self.timings['total'] = (time.perf_counter() - self._started) * 1000
+        if error is not None:
+            raise error
+        return results
+
+    def server_timing(self) -> str:
+        """Server-Timing ヘッダーの値（ブラウザの開発者ツールで確認できる）"""
+        timings = {name: duration for name, duration in self.timings.items() if name != 'total'}
+        timings['total'] = self.timings.get('total', (time.perf_counter() - self._started) * 1000)
+        return ', '.join(f"{name};dur={duration:.1f}" for name, duration in timings.items())
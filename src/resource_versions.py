@@ -0,0 +1,45 @@
+"""
+ユーザーごとのリソースの変更カウンタ
+resource_versions/{user_id} に { conversations: n, subsidies: n, ai_results: n } を持ち、
+各サービスが書き込みの後に該当するカウンタを1つ進める。
+
+一覧APIはカウンタ1つ（フィールドマスクつきの小さな読み取り）で ETag を決められるので、
+変更がなければ一覧のクエリもレスポンスの組み立ても行わずに 304 を返せる（conditional_response.py）。
+"""
+import logging
+from datetime import datetime
+from typing import Optional
+
+from firebase_admin import firestore
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_COLLECTION = 'resource_versions'
+
+CONVERSATIONS = 'conversations'
+SUBSIDIES = 'subsidies'
+AI_RESULTS = 'ai_results'
+
+
+class ResourceVersions:
+    def __init__(self, db):
+        self.db = db
+
+    def bump(self, user_id: str, resource: str):
+        """書き込みの後に呼ぶ。失敗しても書き込み自体は成功させる（次の変更で追いつく）"""
+        try:
+            self.db.collection(VERSIONS_COLLECTION).document(user_id).set({
+                resource: firestore.Increment(1),
+                'updated_at': datetime.utcnow()
+            }, merge=True)
+        except Exception as e:
+            logger.error(f"Failed to bump {resource} version for user {user_id}: {str(e)}")
+
+    def get(self, user_id: str, resource: str) -> Optional[int]:
+        """現在のカウンタ（まだ一度も変更がなければ 0）。読み取りに失敗した場合は None"""
+        try:
+            doc = self.db.collection(VERSIONS_COLLECTION).document(user_id).get(field_paths=[resource])
+            return (doc.to_dict() or {}).get(resource, 0) if doc.exists else 0
+        except Exception as e:
+            logger.warning(f"Failed to read {resource} version for user {user_id}: {str(e)}")
+            return None
@@ -0,0 +1,130 @@
+"""
+プロセス全体で共有するサービスのコンテナ
+各サービスはワーカープロセスごとに1回だけ生成する（生成はロックで保護し、同時リクエストでも二重生成しない）。
+起動時に warm() で事前生成しておけば、リクエスト処理中にモジュールの import やクライアント生成は発生しない。
+
+使い方:
+    from service_container import services
+    services.get('subscription').get_usage_stats(uid)
+"""
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """名前をキーにファクトリを登録し、初回取得時に1回だけ生成するコンテナ（スレッドセーフ）"""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            # ロック待ちの間に他のスレッドが生成済みならそれを使う
+            instance = self._instances.get(name)
+            if instance is None:
+                if name not in self._factories:
+                    raise KeyError(f"Service not registered: {name}")
+                started = time.perf_counter()
+                instance = self._factories[name]()
+                self._instances[name] = instance
+                logger.info(f"Service '{name}' initialized in {(time.perf_counter() - started) * 1000:.1f}ms")
+            return instance
+
+    def warm(self, names: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+        """登録済み（または指定）のサービスを事前生成。失敗したものは初回取得時に再試行する"""
+        results = {}
+        for name in list(names or self._factories):
+            try:
+                self.get(name)
+                results[name] = True
+            except Exception as e:
+                logger.error(f"Service '{name}' warm-up failed: {str(e)}")
+                results[name] = False
+        return results
+
+    def reset(self, name: Optional[str] = None):
+        """生成済みインスタンスを破棄（設定変更後の再生成用）"""
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+
+
+def _firebase():
+    from firebase_config import firebase_service
+    return firebase_service
+
+
+def _claude_service():
+    from claude_service import ClaudeService
+    return ClaudeService()
+
+
+def _stripe_service():
+    from stripe_service import StripeService
+    return StripeService()
+
+
+def _user_service():
+    from models.user import User
+    return User(_firebase())
+
+
+def _subscription_service():
+    from models.subscription import SubscriptionService
+    return SubscriptionService(_firebase())
+
+
+def _auth_service():
+    from auth_middleware import AuthService
+    return AuthService()
+
+
+def _subsidy_service():
+    from subsidy_service import SubsidyService
+    return SubsidyService(_firebase().get_db())
+
+
+def _conversation_service():
+    from integrated_conversation_service import IntegratedConversationService
+    return IntegratedConversationService(_firebase().get_db())
+
+
+def _resource_versions():
+    from resource_versions import ResourceVersions
+    return ResourceVersions(_firebase().get_db())
+
+
+services = ServiceContainer()
+services.register('claude', _claude_service)
+services.register('stripe', _stripe_service)
+services.register('user', _user_service)
+services.register('subscription', _subscription_service)
+services.register('auth', _auth_service)
+services.register('subsidy', _subsidy_service)
+services.register('conversation', _conversation_service)
+services.register('resource_versions', _resource_versions)
+
+
+def warm_services_on_boot() -> Optional[Dict[str, bool]]:
+    """SERVICE_WARMUP=0 でなければ全サービスを事前生成（app の読み込み時に呼ぶ）"""
+    if os.getenv('SERVICE_WARMUP', '1') == '0':
+        return None
+    return services.warm()
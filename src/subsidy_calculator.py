@@ -0,0 +1,253 @@
+"""
+助成金額の算定（令和7年度）
+交付要綱・支給要領の支給額表をテーブル化し、モデルを介さずに支給額・上限額を計算する
+- 業務改善助成金: 交付要綱 別表第１（コース×引上げ労働者数×事業場規模）・別表第２（特例事業者）
+- キャリアアップ助成金: 正社員化／賃金規定等改定／賃金規定等共通化／賞与・退職金制度導入コースと各加算
+"""
+import inspect
+from typing import Dict, List, Optional, Tuple
+
+# === 業務改善助成金 ===
+
+# コース（引上げ額・円）→ [(引上げ労働者数の上限, 上限額, 30人未満の事業場の上限額)]
+# 引上げ労働者数の上限が None の行は「7人以上」
+GYOUMU_KAIZEN_COURSES: Dict[int, List[Tuple[Optional[int], int, int]]] = {
+    30: [(1, 300_000, 600_000), (3, 500_000, 900_000), (6, 700_000, 1_000_000), (None, 1_000_000, 1_200_000)],
+    45: [(1, 450_000, 800_000), (3, 700_000, 1_100_000), (6, 1_000_000, 1_400_000), (None, 1_500_000, 1_600_000)],
+    60: [(1, 600_000, 1_100_000), (3, 900_000, 1_600_000), (6, 1_500_000, 1_900_000), (None, 2_300_000, 2_300_000)],
+    90: [(1, 900_000, 1_700_000), (3, 1_500_000, 2_400_000), (6, 2_700_000, 2_900_000), (None, 4_500_000, 4_500_000)],
+}
+
+# 別表第２: 特例事業者で引上げ労働者10人以上の場合の上限額（通常, 30人未満の事業場）
+GYOUMU_KAIZEN_SPECIAL_CAPS: Dict[int, Tuple[int, int]] = {
+    30: (1_200_000, 1_300_000),
+    45: (1_800_000, 1_800_000),
+    60: (3_000_000, 3_000_000),
+    90: (6_000_000, 6_000_000),
+}
+GYOUMU_KAIZEN_SPECIAL_MIN_WORKERS = 10
+
+# 助成率: 事業場内最低賃金 1,000円未満は4/5、1,000円以上は3/4
+GYOUMU_KAIZEN_RATE_THRESHOLD = 1000
+GYOUMU_KAIZEN_MIN_COST = 100_000  # 助成対象経費の下限
+SMALL_WORKPLACE_LIMIT = 30
+
+
+def _floor_thousand(amount: float) -> int:
+    """1,000円未満の端数切り捨て"""
+    return int(amount // 1000) * 1000
+
+
+def calculate_gyoumukaizen(wage_increase: int, raised_workers: int, workplace_employees: int,
+                           current_min_wage: Optional[int] = None, eligible_cost: Optional[int] = None,
+                           special_business: bool = False) -> Dict:
+    """業務改善助成金の上限額・助成額
+
+    wage_increase: 事業場内最低賃金の引上げ額（円）。該当する最も高いコースを適用
+    raised_workers: 引上げ労働者数
+    workplace_employees: 事業場規模（30人未満なら（ ）内の上限額）
+    current_min_wage: 引上げ前の事業場内最低賃金（助成率の判定に使用）
+    eligible_cost: 助成対象経費（指定時は 経費×助成率 と上限額の低い方を助成額とする）
+    special_business: 特例事業者（物価高騰等）に該当するか
+    """
+    eligible_courses = [course for course in sorted(GYOUMU_KAIZEN_COURSES) if wage_increase >= course]
+    if not eligible_courses:
+        raise ValueError("引上げ額が30円未満のため対象コースがありません")
+    if raised_workers < 1:
+        raise ValueError("引上げ労働者数は1人以上で指定してください")
+
+    course = eligible_courses[-1]
+    small_workplace = workplace_employees < SMALL_WORKPLACE_LIMIT
+
+    for max_workers, cap, small_cap in GYOUMU_KAIZEN_COURSES[course]:
+        if max_workers is None or raised_workers <= max_workers:
+            break
+    upper_limit = small_cap if small_workplace else cap
+
+    applied_special = special_business and raised_workers >= GYOUMU_KAIZEN_SPECIAL_MIN_WORKERS
+    if applied_special:
+        special_cap, special_small_cap = GYOUMU_KAIZEN_SPECIAL_CAPS[course]
+        upper_limit = special_small_cap if small_workplace else special_cap
+
+    result = {
+        'subsidy': 'gyoumukaizen',
+        'course': f"{course}円コース",
+        'raised_workers': raised_workers,
+        'workplace_size': '30人未満' if small_workplace else '30人以上',
+        'special_business': applied_special,
+        'upper_limit': upper_limit,
+    }
+    explanation = [f"{course}円コース・引上げ労働者{raised_workers}人・事業場規模{result['workplace_size']}"
+                   f"{'・特例事業者（別表第２）' if applied_special else ''}の上限額：{upper_limit:,}円"]
+
+    if current_min_wage is not None:
+        rate_numerator, rate_denominator = (4, 5) if current_min_wage < GYOUMU_KAIZEN_RATE_THRESHOLD else (3, 4)
+        result['subsidy_rate'] = f"{rate_numerator}/{rate_denominator}"
+        explanation.append(f"事業場内最低賃金{current_min_wage:,}円のため助成率{rate_numerator}/{rate_denominator}")
+
+        if eligible_cost is not None:
+            if eligible_cost < GYOUMU_KAIZEN_MIN_COST:
+                raise ValueError(f"助成対象経費は{GYOUMU_KAIZEN_MIN_COST:,}円以上である必要があります")
+            by_rate = _floor_thousand(eligible_cost * rate_numerator / rate_denominator)
+            result['amount'] = min(by_rate, upper_limit)
+            explanation.append(f"経費{eligible_cost:,}円×{rate_numerator}/{rate_denominator}={by_rate:,}円と"
+                               f"上限額の低い方：{result['amount']:,}円")
+
+    result['explanation'] = '。'.join(explanation)
+    return result
+
+
+# === キャリアアップ助成金 ===
+
+# 正社員化コース（1人当たり・第1期と第2期の合計）: (中小企業, 大企業)
+SEISHAIN_AMOUNTS = {
+    ('yuki', True): (800_000, 600_000),    # 有期→正規・重点支援対象者
+    ('muki', True): (400_000, 300_000),    # 無期→正規・重点支援対象者
+    ('yuki', False): (400_000, 300_000),   # 有期→正規・重点支援対象者以外
+    ('muki', False): (200_000, 150_000),   # 無期→正規・重点支援対象者以外
+}
+SEISHAIN_ADDITIONS = {
+    'new_conversion_system': (200_000, 150_000),   # 正社員転換制度を新たに規定（1事業所当たり）
+    'diverse_regular_system': (400_000, 300_000),  # 多様な正社員制度を新たに規定（1事業所当たり）
+}
+SEISHAIN_MAX_WORKERS = 20  # 1年度1適用事業所当たりの支給申請上限人数
+
+# 賃金規定等改定コース（1人当たり）: (増額率の下限%, 中小企業, 大企業)
+CHINGIN_KAITEI_AMOUNTS = [
+    (6, 70_000, 46_000),
+    (5, 65_000, 43_000),
+    (4, 50_000, 33_000),
+    (3, 40_000, 26_000),
+]
+CHINGIN_KAITEI_ADDITIONS = {
+    'job_evaluation': (200_000, 150_000),   # 職務評価加算
+    'raise_system': (200_000, 150_000),     # 昇給制度加算
+}
+CHINGIN_KAITEI_MAX_WORKERS = 100  # 1年度1適用事業所当たりの上限人数
+
+KYOTSUKA_AMOUNT = (600_000, 450_000)               # 賃金規定等共通化コース（1事業所当たり）
+SHOYO_TAISHOKU_AMOUNT = (400_000, 300_000)         # 賞与・退職金制度導入コース（1事業所当たり）
+SHOYO_TAISHOKU_BOTH_ADDITION = (168_000, 126_000)  # 賞与・退職金を同時に導入した場合の加算
+
+ADDITION_LABELS = {
+    'new_conversion_system': '正社員転換制度の新規規定加算',
+    'diverse_regular_system': '多様な正社員制度の新規規定加算',
+    'job_evaluation': '職務評価加算',
+    'raise_system': '昇給制度加算',
+    'both_introduced': '賞与・退職金同時導入加算',
+}
+
+
+def _by_size(amounts: Tuple[int, int], is_sme: bool) -> int:
+    return amounts[0] if is_sme else amounts[1]
+
+
+def _apply_additions(table: Dict[str, Tuple[int, int]], additions: Optional[List[str]], is_sme: bool,
+                     breakdown: List[Dict]):
+    for key in additions or []:
+        if key not in table:
+            raise ValueError(f"このコースでは利用できない加算です: {key}")
+        amount = _by_size(table[key], is_sme)
+        breakdown.append({'item': ADDITION_LABELS[key], 'amount': amount})
+
+
+def calculate_career_up(course: str, is_sme: bool = True, workers: int = 1, conversion_type: str = 'yuki',
+                        priority_target: bool = False, raise_rate: Optional[float] = None,
+                        additions: Optional[List[str]] = None) -> Dict:
+    """キャリアアップ助成金の支給額
+
+    course: seishain（正社員化）/ chingin_kaitei（賃金規定等改定）/ kyotsuka（賃金規定等共通化）/ shoyo_taishoku（賞与・退職金制度導入）
+    conversion_type: 正社員化コースの転換区分 yuki（有期→正規）/ muki（無期→正規）
+    raise_rate: 賃金規定等改定コースの増額改定率（%）
+    additions: 加算（new_conversion_system, diverse_regular_system, job_evaluation, raise_system, both_introduced）
+    """
+    size_label = '中小企業' if is_sme else '大企業'
+    breakdown = []
+    notes = []
+
+    if course == 'seishain':
+        key = (conversion_type, priority_target)
+        if key not in SEISHAIN_AMOUNTS:
+            raise ValueError(f"転換区分が正しくありません: {conversion_type}")
+        counted = min(workers, SEISHAIN_MAX_WORKERS)
+        per_person = _by_size(SEISHAIN_AMOUNTS[key], is_sme)
+        label = '有期→正規' if conversion_type == 'yuki' else '無期→正規'
+        target = '重点支援対象者' if priority_target else '重点支援対象者以外'
+        breakdown.append({'item': f"{label}（{target}）{per_person:,}円×{counted}人", 'amount': per_person * counted})
+        if workers > SEISHAIN_MAX_WORKERS:
+            notes.append(f"1年度の支給申請上限{SEISHAIN_MAX_WORKERS}人を超える{workers - SEISHAIN_MAX_WORKERS}人は対象外")
+        _apply_additions(SEISHAIN_ADDITIONS, additions, is_sme, breakdown)
+        course_name = '正社員化コース'
+
+    elif course == 'chingin_kaitei':
+        if raise_rate is None:
+            raise ValueError("賃金規定等改定コースには増額改定率（raise_rate）が必要です")
+        band = next((row for row in CHINGIN_KAITEI_AMOUNTS if raise_rate >= row[0]), None)
+        if band is None:
+            raise ValueError("増額改定率が3%未満のため対象外です")
+        counted = min(workers, CHINGIN_KAITEI_MAX_WORKERS)
+        per_person = band[1] if is_sme else band[2]
+        breakdown.append({'item': f"{band[0]}%以上の増額改定 {per_person:,}円×{counted}人", 'amount': per_person * counted})
+        if workers > CHINGIN_KAITEI_MAX_WORKERS:
+            notes.append(f"1年度の上限{CHINGIN_KAITEI_MAX_WORKERS}人を超える{workers - CHINGIN_KAITEI_MAX_WORKERS}人は対象外")
+        _apply_additions(CHINGIN_KAITEI_ADDITIONS, additions, is_sme, breakdown)
+        course_name = '賃金規定等改定コース'
+
+    elif course == 'kyotsuka':
+        breakdown.append({'item': '共通の賃金規定等の規定・適用（1事業所当たり）', 'amount': _by_size(KYOTSUKA_AMOUNT, is_sme)})
+        course_name = '賃金規定等共通化コース'
+
+    elif course == 'shoyo_taishoku':
+        breakdown.append({'item': '賞与・退職金制度の導入（1事業所当たり）', 'amount': _by_size(SHOYO_TAISHOKU_AMOUNT, is_sme)})
+        _apply_additions({'both_introduced': SHOYO_TAISHOKU_BOTH_ADDITION}, additions, is_sme, breakdown)
+        course_name = '賞与・退職金制度導入コース'
+
+    else:
+        raise ValueError(f"Unknown career-up course: {course}")
+
+    total = sum(item['amount'] for item in breakdown)
+    return {
+        'subsidy': 'career_up',
+        'course': course_name,
+        'company_size': size_label,
+        'amount': total,
+        'breakdown': breakdown,
+        'notes': notes,
+        'explanation': f"{course_name}（{size_label}）：" + '、'.join(
+            f"{item['item']} {item['amount']:,}円" for item in breakdown
+        ) + f"。合計{total:,}円" + ''.join(f"（{note}）" for note in notes)
+    }
+
+
+# 真偽値で受け取る入力項目（JSONの "false" などの文字列は真と評価されてしまうため受け付けない）
+BOOLEAN_PARAMS = ('is_sme', 'special_business', 'priority_target')
+
+
+def calculate(subsidy: str, **params) -> Dict:
+    """ツール呼び出し・/api/calc の共通入口（他の助成金用の入力項目は無視する）"""
+    for name in BOOLEAN_PARAMS:
+        value = params.get(name)
+        if value is not None and not isinstance(value, bool):
+            raise ValueError(f"{name} は true または false で指定してください")
+
+    calculators = {
+        'gyoumukaizen': calculate_gyoumukaizen,
+        'career_up': calculate_career_up,
+    }
+    if subsidy not in calculators:
+        raise ValueError(f"Unknown subsidy: {subsidy}")
+
+    calculator = calculators[subsidy]
+    accepted = inspect.signature(calculator).parameters
+    return calculator(**{key: value for key, value in params.items() if key in accepted and value is not None})
+
+
+def gyoumukaizen_course_summary(workplace_employees: int) -> List[str]:
+    """事業場規模に応じた各コースの上限額の範囲（「30～130万円」形式）"""
+    small_workplace = workplace_employees < SMALL_WORKPLACE_LIMIT
+    lines = []
+    for course, bands in sorted(GYOUMU_KAIZEN_COURSES.items()):
+        caps = [small_cap if small_workplace else cap for _, cap, small_cap in bands]
+        special = GYOUMU_KAIZEN_SPECIAL_CAPS[course][1 if small_workplace else 0]
+        lines.append(f"{course}円コース: {caps[0] // 10000}～{max(caps[-1], special) // 10000}万円")
+    return lines
@@ -5,23 +5,26 @@ import uuid
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict
 import logging
+from logging_config import log_event
 from firebase_admin import firestore
+from message_codec import encode_text, decode_text
+from resource_versions import ResourceVersions, SUBSIDIES, AI_RESULTS
 from models.subsidy_memo import SubsidyMemo, ApplicationPhase, Document, ChatHistory, TempDiagnosis
+from deadline_calculator import resolve_deadline_rule
 
 logger = logging.getLogger(__name__)
 
 class SubsidyService:
     def __init__(self, db):
         self.db = db
+        self.versions = ResourceVersions(db)
     
     # === 助成金メモ関連 ===
     
     def create_subsidy_memo(self, user_id: str, memo_data: Dict) -> SubsidyMemo:
         """新規助成金メモを作成"""
         try:
-            logger.info(f"SERVICE: Creating memo for user_id: '{user_id}'")
-            logger.info(f"SERVICE: user_id type: {type(user_id)}")
-            logger.info(f"SERVICE: user_id length: {len(user_id) if user_id else 0}")
+            logger.debug("Creating memo for user_id: %r", user_id)
             
             # 入力検証
             if not user_id or not isinstance(user_id, str) or len(user_id.strip()) == 0:
@@ -36,19 +39,8 @@ class SubsidyService:
             plan_app_data = memo_data.get('plan_application', {})
             payment_app_data = memo_data.get('payment_application', {})
             
-            plan_app = ApplicationPhase(
-                required=plan_app_data.get('required', False),
-                deadline=plan_app_data.get('deadline'),
-                documents=[Document(**doc) for doc in plan_app_data.get('documents', [])],
-                memo=plan_app_data.get('memo', '')
-            )
-            
-            payment_app = ApplicationPhase(
-                required=payment_app_data.get('required', True),
-                deadline=payment_app_data.get('deadline'),
-                documents=[Document(**doc) for doc in payment_app_data.get('documents', [])],
-                memo=payment_app_data.get('memo', '')
-            )
+            plan_app = self._build_phase(plan_app_data, default_required=False)
+            payment_app = self._build_phase(payment_app_data, default_required=True)
             
             memo = SubsidyMemo(
                 id=memo_id,
@@ -65,10 +57,10 @@ class SubsidyService:
             doc_ref = self.db.collection('users').document(user_id).collection('subsidies').document(memo_id)
             memo_dict = memo.to_dict()
             
-            logger.info(f"Saving memo to path: users/{user_id}/subsidies/{memo_id}")
-            logger.info(f"Memo data keys: {list(memo_dict.keys())}")
+            logger.debug("Saving memo to path: users/%s/subsidies/%s", user_id, memo_id)
             
             doc_ref.set(memo_dict)
+            self.versions.bump(user_id, SUBSIDIES)
             
             # 保存確認
             saved_doc = doc_ref.get()
@@ -83,13 +75,32 @@ class SubsidyService:
             logger.error(f"Error creating subsidy memo: {str(e)}")
             raise
     
+    def _build_phase(self, phase_data: Dict, default_required: bool) -> ApplicationPhase:
+        """申請フェーズを構築。deadline_rule があれば期限日を計算して deadline に設定"""
+        deadline = phase_data.get('deadline')
+        deadline_rule = phase_data.get('deadline_rule')
+
+        if deadline_rule:
+            try:
+                deadline = resolve_deadline_rule(deadline_rule) or deadline
+            except (TypeError, ValueError) as e:
+                # 不正なルールは保存せずに無視（メモの作成・更新自体は続ける）
+                logger.warning(f"Invalid deadline_rule {deadline_rule!r}: {str(e)}")
+                deadline_rule = None
+
+        return ApplicationPhase(
+            required=phase_data.get('required', default_required),
+            deadline=deadline,
+            documents=[Document(**doc) for doc in phase_data.get('documents', [])],
+            memo=phase_data.get('memo', ''),
+            deadline_rule=deadline_rule
+        )
+    
     def get_user_subsidies(self, user_id: str) -> List[SubsidyMemo]:
         """ユーザーの全助成金メモを取得"""
         try:
             subsidies = []
-            logger.info(f"SERVICE: Fetching subsidies for user_id: '{user_id}'")
-            logger.info(f"SERVICE: user_id type: {type(user_id)}")
-            logger.info(f"SERVICE: user_id length: {len(user_id) if user_id else 0}")
+            logger.debug("Fetching subsidies for user_id: %r", user_id)
             
             # 入力検証
             if not user_id or not isinstance(user_id, str) or len(user_id.strip()) == 0:
@@ -98,10 +109,6 @@ class SubsidyService:
             
             user_id = user_id.strip()  # 余分な空白を除去
             
-            # デバッグ: コレクションパスを確認
-            collection_path = f'users/{user_id}/subsidies'
-            logger.info(f"SERVICE: Collection path: {collection_path}")
-            
             # コレクション参照を取得
             collection_ref = self.db.collection('users').document(user_id).collection('subsidies')
             docs = collection_ref.stream()
@@ -109,9 +116,7 @@ class SubsidyService:
             doc_count = 0
             for doc in docs:
                 doc_count += 1
-                logger.info(f"Found document: {doc.id}")
-                data = doc.to_dict()
-                logger.info(f"Document data keys: {list(data.keys()) if data else 'None'}")
+                data = self._decode_chat_history(doc.to_dict())
                 data['id'] = doc.id
                 try:
                     subsidies.append(SubsidyMemo.from_dict(data))
@@ -119,7 +124,8 @@ class SubsidyService:
                     logger.error(f"Error parsing document {doc.id}: {str(parse_error)}")
                     continue
             
-            logger.info(f"Total documents found: {doc_count}, Successfully parsed: {len(subsidies)}")
+            log_event(logger, 'subsidies.fetched', level=logging.DEBUG,
+                      user_id=user_id, documents=doc_count, parsed=len(subsidies))
             
             # 更新日時でソート（新しい順）
             subsidies.sort(key=lambda x: x.updated_at, reverse=True)
@@ -137,7 +143,7 @@ class SubsidyService:
             doc = self.db.collection('users').document(user_id).collection('subsidies').document(subsidy_id).get()
             
             if doc.exists:
-                data = doc.to_dict()
+                data = self._decode_chat_history(doc.to_dict())
                 data['id'] = doc.id
                 return SubsidyMemo.from_dict(data)
             
@@ -152,10 +158,16 @@ class SubsidyService:
         try:
             doc_ref = self.db.collection('users').document(user_id).collection('subsidies').document(subsidy_id)
             
+            # フェーズ全体を更新する場合は deadline_rule から期限日を再計算
+            for phase_key, default_required in (('plan_application', False), ('payment_application', True)):
+                if isinstance(updates.get(phase_key), dict) and updates[phase_key].get('deadline_rule'):
+                    updates[phase_key] = self._build_phase(updates[phase_key], default_required).to_dict()
+
             # 更新日時を追加
             updates['updated_at'] = datetime.now().isoformat()
             
             doc_ref.update(updates)
+            self.versions.bump(user_id, SUBSIDIES)
             logger.info(f"Updated subsidy memo: {subsidy_id}")
             return True
             
@@ -188,6 +200,7 @@ class SubsidyService:
                     (memo.plan_application.documents if phase == 'plan' else memo.payment_application.documents)],
                 'updated_at': datetime.now().isoformat()
             })
+            self.versions.bump(user_id, SUBSIDIES)
             
             return True
             
@@ -204,10 +217,15 @@ class SubsidyService:
             )
             
             doc_ref = self.db.collection('users').document(user_id).collection('subsidies').document(subsidy_id)
+            # 長い本文は圧縮して保存（読み出し時に _decode_chat_history で戻す）
+            entry = chat_entry.to_dict()
+            entry['content'] = encode_text(entry['content'])
+            
             doc_ref.update({
-                'chat_history': firestore.ArrayUnion([chat_entry.to_dict()]),
+                'chat_history': firestore.ArrayUnion([entry]),
                 'updated_at': datetime.now().isoformat()
             })
+            self.versions.bump(user_id, SUBSIDIES)
             
             return True
             
@@ -215,10 +233,17 @@ class SubsidyService:
             logger.error(f"Error adding chat history: {str(e)}")
             return False
     
+    @staticmethod
+    def _decode_chat_history(data: Dict) -> Dict:
+        for entry in data.get('chat_history') or []:
+            entry['content'] = decode_text(entry.get('content'))
+        return data
+    
     def delete_subsidy_memo(self, user_id: str, subsidy_id: str) -> bool:
         """助成金メモを削除"""
         try:
             self.db.collection('users').document(user_id).collection('subsidies').document(subsidy_id).delete()
+            self.versions.bump(user_id, SUBSIDIES)
             logger.info(f"Deleted subsidy memo: {subsidy_id}")
             return True
             
@@ -294,6 +319,7 @@ class SubsidyService:
                 'plan_application': {
                     'required': first_subsidy.get('plan_required', False),
                     'deadline': first_subsidy.get('plan_deadline'),
+                    'deadline_rule': first_subsidy.get('plan_deadline_rule'),
                     'documents': [{'name': doc, 'completed': False} 
                                 for doc in first_subsidy.get('plan_documents', [])],
                     'memo': first_subsidy.get('plan_memo', '')
@@ -301,6 +327,7 @@ class SubsidyService:
                 'payment_application': {
                     'required': True,
                     'deadline': first_subsidy.get('payment_deadline'),
+                    'deadline_rule': first_subsidy.get('payment_deadline_rule'),
                     'documents': [{'name': doc, 'completed': False} 
                                 for doc in first_subsidy.get('payment_documents', [])],
                     'memo': first_subsidy.get('payment_memo', '')
@@ -396,17 +423,17 @@ class SubsidyService:
     
     # === AI診断結果関連 ===
     
-    def save_ai_result(self, user_id: str, result_data: Dict) -> str:
-        """AI診断結果をFirestoreに保存"""
+    def save_ai_result(self, user_id: str, result_data: Dict, result_id: Optional[str] = None) -> str:
+        """AI診断結果をFirestoreに保存（result_id 指定時はそのIDで保存）"""
         try:
-            result_id = str(uuid.uuid4())
+            result_id = result_id or str(uuid.uuid4())
             
             doc_data = {
                 'id': result_id,
                 'user_id': user_id,
                 'timestamp': datetime.now().isoformat(),
                 'type': result_data.get('type', 'diagnosis'),
-                'content': result_data.get('content'),
+                'content': encode_text(result_data.get('content')),
                 'title': result_data.get('title', 'AI診断結果'),
                 'agent_name': result_data.get('agentName'),
                 'summary': result_data.get('summary')
@@ -415,6 +442,7 @@ class SubsidyService:
             # Firestoreに保存
             doc_ref = self.db.collection('users').document(user_id).collection('ai_results').document(result_id)
             doc_ref.set(doc_data)
+            self.versions.bump(user_id, AI_RESULTS)
             
             logger.info(f"Saved AI result: {result_id} for user: {user_id}")
             return result_id
@@ -435,6 +463,7 @@ class SubsidyService:
             for doc in docs:
                 data = doc.to_dict()
                 data['id'] = doc.id
+                data['content'] = decode_text(data.get('content'))
                 results.append(data)
             
             logger.info(f"Retrieved {len(results)} AI results for user: {user_id}")
@@ -0,0 +1,132 @@
+"""
+検証済みFirebase IDトークンのキャッシュ
+ダッシュボードは1回の表示で同じトークンによる認証付きAPIを複数回呼ぶため、
+検証結果をトークンのハッシュをキーに exp（有効期限）まで保持して auth.verify_id_token の呼び出しを減らす
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 有効期限ぎりぎりのトークンをキャッシュから返さないための余裕（秒）
+EXPIRY_SKEW_SECONDS = 30
+
+
+class VerifiedTokenCache:
+    """上限付きLRUの検証済みトークンキャッシュ（スレッドセーフ）
+
+    revocation_check_seconds > 0 の場合、キャッシュヒット時でもその間隔ごとに
+    失効チェック付きで再検証する（ログアウト・アカウント停止の反映用）
+    """
+
+    def __init__(self, verifier: Callable[..., Optional[dict]], max_size: int = 1024,
+                 revocation_check_seconds: float = 0):
+        self._verifier = verifier
+        self.max_size = max_size
+        self.revocation_check_seconds = revocation_check_seconds
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0,
+            'revocation_checks': 0,
+            'revoked': 0,
+            'verification_failures': 0,
+        }
+
+    @staticmethod
+    def _key(id_token: str) -> str:
+        # トークン本体はメモリ上にも保持しない
+        return hashlib.sha256(id_token.encode('utf-8')).hexdigest()
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def verify(self, id_token: str) -> Optional[dict]:
+        """キャッシュ済みなら検証結果を返し、なければ検証してキャッシュする"""
+        key = self._key(id_token)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry['exp'] - EXPIRY_SKEW_SECONDS <= now:
+                del self._entries[key]
+                self._stats['expired'] += 1
+                entry = None
+            if entry:
+                self._entries.move_to_end(key)
+                needs_revocation_check = (
+                    self.revocation_check_seconds > 0
+                    and now - entry['checked_at'] >= self.revocation_check_seconds
+                )
+                if not needs_revocation_check:
+                    self._stats['hits'] += 1
+                    return entry['decoded']
+
+        if entry:
+            # 失効チェックはキャッシュのロック外で行う
+            self._count('revocation_checks')
+            decoded = self._verifier(id_token, check_revoked=True)
+            if not decoded:
+                self._count('revoked')
+                self.invalidate(id_token)
+                return None
+            entry['checked_at'] = now
+            self._count('hits')
+            return entry['decoded']
+
+        self._count('misses')
+        decoded = self._verifier(id_token, check_revoked=self.revocation_check_seconds > 0)
+        if not decoded:
+            self._count('verification_failures')
+            return None
+
+        exp = decoded.get('exp')
+        if exp:
+            self._store(key, decoded, float(exp), now)
+        return decoded
+
+    def _store(self, key: str, decoded: dict, exp: float, now: float):
+        with self._lock:
+            self._entries[key] = {'decoded': decoded, 'exp': exp, 'checked_at': now}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, id_token: str):
+        with self._lock:
+            self._entries.pop(self._key(id_token), None)
+
+    def invalidate_uid(self, uid: str):
+        """ユーザー停止時などに該当ユーザーのトークンをすべて破棄"""
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry['decoded'].get('uid') == uid]:
+                del self._entries[key]
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        stats['max_size'] = self.max_size
+        stats['revocation_check_seconds'] = self.revocation_check_seconds
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def create_token_cache(verifier: Callable[..., Optional[dict]]) -> VerifiedTokenCache:
+    """環境変数の設定でキャッシュを生成（AUTH_TOKEN_CACHE_SIZE, AUTH_TOKEN_REVOCATION_CHECK_SECONDS）"""
+    return VerifiedTokenCache(
+        verifier,
+        max_size=int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '1024')),
+        revocation_check_seconds=float(os.getenv('AUTH_TOKEN_REVOCATION_CHECK_SECONDS', '0'))
+    )
@@ -0,0 +1,191 @@
+"""
+書き込みの後回し（write-behind）キュー
+会話履歴・AI診断結果・メモのチャット履歴など、応答に必要のないFirestoreへの書き込みを
+レスポンス送信後にバックグラウンドで行う。失敗時は指数バックオフで再試行する。
+
+- キーごとに同じワーカーへ振り分けるので、同じ会話への書き込みは投入順に実行される
+- キューが満杯のときは呼び出し元のスレッドでそのまま実行する（書き込みは捨てない）
+- 終了時（SIGTERM・プロセス終了）は残りを WRITE_BEHIND_FLUSH_SECONDS まで書き出してから終了する
+
+環境変数:
+    WRITE_BEHIND_ENABLED        0 で無効（すべて同期実行）
+    WRITE_BEHIND_WORKERS        ワーカースレッド数（既定: 2）
+    WRITE_BEHIND_QUEUE_SIZE     ワーカーごとのキューの上限（既定: 500）
+    WRITE_BEHIND_MAX_RETRIES    再試行回数（既定: 3）
+    WRITE_BEHIND_FLUSH_SECONDS  終了時に書き出しを待つ最大秒数（既定: 10）
+"""
+import os
+import time
+import queue
+import atexit
+import signal
+import logging
+import threading
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Task:
+    __slots__ = ('name', 'fn', 'args', 'kwargs', 'attempts')
+
+    def __init__(self, name: str, fn: Callable, args: tuple, kwargs: dict):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.attempts = 0
+
+
+class WriteBehindQueue:
+    """ワーカーごとに上限つきキューを持つ書き込みキュー
+
+    タスクは例外を送出するか False を返すと失敗とみなし、max_retries 回まで再試行する
+    """
+
+    def __init__(self, workers: int = 2, queue_size: int = 500, max_retries: int = 3,
+                 base_backoff: float = 0.5, enabled: bool = True):
+        self.enabled = enabled
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in range(max(1, workers))]
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._in_flight = 0
+        self._stopping = False
+        self._stats = {'enqueued': 0, 'completed': 0, 'retried': 0, 'failed': 0, 'dropped': 0, 'inline': 0}
+        self._threads: List[threading.Thread] = []
+        if enabled:
+            for index, task_queue in enumerate(self._queues):
+                thread = threading.Thread(target=self._worker, args=(task_queue,),
+                                          name=f"write-behind-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def submit(self, name: str, fn: Callable, *args, key: Optional[str] = None, **kwargs) -> bool:
+        """書き込みを投入。キューに積めた場合は True、その場で実行した場合はその結果を返す
+
+        key が同じ書き込み（同じ会話など）は同じワーカーで投入順に実行される
+        """
+        task = _Task(name, fn, args, kwargs)
+        if self.enabled and not self._stopping:
+            task_queue = self._queues[zlib.crc32((key or name).encode('utf-8')) % len(self._queues)]
+            with self._lock:
+                # 投入と同時に未完了数へ加算（flush が取り出し前のタスクを見落とさないように）
+                self._in_flight += 1
+            try:
+                task_queue.put_nowait(task)
+                self._count('enqueued')
+                return True
+            except queue.Full:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._idle.notify_all()
+                logger.warning(f"Write-behind queue full, writing inline: {name}")
+        self._count('inline')
+        return self._run(task, retry=False)
+
+    def _run(self, task: _Task, retry: bool = True) -> bool:
+        while True:
+            task.attempts += 1
+            try:
+                if task.fn(*task.args, **task.kwargs) is not False:
+                    self._count('completed')
+                    return True
+                error = 'returned False'
+            except Exception as e:
+                error = str(e)
+
+            if not retry or task.attempts > self.max_retries or self._stopping:
+                logger.error(f"Write-behind task '{task.name}' failed after {task.attempts} attempt(s): {error}")
+                self._count('failed')
+                return False
+
+            self._count('retried')
+            time.sleep(self.base_backoff * (2 ** (task.attempts - 1)))
+
+    def _worker(self, task_queue: queue.Queue):
+        while True:
+            task = task_queue.get()
+            try:
+                self._run(task)
+            except Exception as e:
+                logger.error(f"Write-behind worker error: {str(e)}")
+            finally:
+                task_queue.task_done()
+                with self._lock:
+                    self._in_flight -= 1
+                    self._idle.notify_all()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """投入済みの書き込みがすべて終わるまで待つ（タイムアウトした場合は False）"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while self._in_flight > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def shutdown(self, timeout: float = 10.0):
+        """新規の投入を同期実行に切り替え、残りを書き出す。書き出せなかった件数は dropped に数える"""
+        if self._stopping or not self.enabled:
+            return
+        flushed = self.flush(timeout)
+        self._stopping = True
+        if not flushed:
+            with self._lock:
+                pending = self._in_flight
+                self._stats['dropped'] += pending
+            logger.error(f"Write-behind shutdown timed out, {pending} write(s) not persisted")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = self._in_flight
+        stats['depth'] = sum(task_queue.qsize() for task_queue in self._queues)
+        stats['workers'] = len(self._threads)
+        stats['enabled'] = self.enabled
+        return stats
+
+
+def _install_shutdown_hooks(write_queue: WriteBehindQueue, timeout: float):
+    atexit.register(write_queue.shutdown, timeout)
+
+    # gunicorn のワーカーは SIGTERM で graceful shutdown する。既存のハンドラの前に書き出しを行う
+    if threading.current_thread() is not threading.main_thread():
+        return
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def handle_sigterm(signum, frame):
+        write_queue.shutdown(timeout)
+        if callable(previous):
+            previous(signum, frame)
+        elif previous == signal.SIG_DFL:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    try:
+        signal.signal(signal.SIGTERM, handle_sigterm)
+    except ValueError:
+        pass
+
+
+def create_write_behind_queue() -> WriteBehindQueue:
+    write_queue = WriteBehindQueue(
+        workers=int(os.getenv('WRITE_BEHIND_WORKERS', '2')),
+        queue_size=int(os.getenv('WRITE_BEHIND_QUEUE_SIZE', '500')),
+        max_retries=int(os.getenv('WRITE_BEHIND_MAX_RETRIES', '3')),
+        enabled=os.getenv('WRITE_BEHIND_ENABLED', '1') != '0'
+    )
+    _install_shutdown_hooks(write_queue, float(os.getenv('WRITE_BEHIND_FLUSH_SECONDS', '10')))
+    return write_queue
+
+
+write_behind = create_write_behind_queue()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""助成金一括スクリーニング（bulk_screening）のテスト"""
+
+import os
+import sys
+import json
+
+# srcディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import pytest
+
+from bulk_screening import BulkScreeningService, OUTPUT_COLUMNS
+
+
+@pytest.fixture
+def service():
+    return BulkScreeningService()
+
+
+def test_parse_csv_with_bom_and_aliases(service):
+    text = '\ufeff顧問先ID,会社名,従業員数\nA1,株式会社A,"1,200人"\n,株式会社B,5\n'
+    columns = service.parse_profiles(text)
+
+    assert columns['company_id'] == ['A1', '2']
+    assert columns['company_name'] == ['株式会社A', '株式会社B']
+    assert columns['employee_count'] == ['1,200人', '5']
+
+
+def test_parse_jsonl_is_detected(service):
+    text = '{"id": "x", "totalEmployees": 12}\n\n{"name": "C", "従業員数": 40}\n'
+    columns = service.parse_profiles(text)
+
+    assert columns['company_id'] == ['x', '2']
+    assert columns['employee_count'] == [12, 40]
+
+
+def test_unsupported_input_format(service):
+    with pytest.raises(ValueError):
+        service.parse_profiles('a,b\n1,2\n', input_format='xml')
+
+
+def test_evaluate_thresholds(service):
+    columns = service.parse_profiles('id,従業員数\na,0\nb,29\nc,30\nd,300\ne,301\nf,不明\n')
+    rows = list(service.iter_results(columns, service.evaluate(columns)))
+    by_id = {row['company_id']: row for row in rows}
+
+    # 未入力・不正値は0人として扱う
+    assert by_id['a']['career_up_status'] == '情報不足'
+    assert by_id['a']['recommended_agents'] == 'gyoumukaizen'
+    assert by_id['f']['employee_count'] == 0
+
+    assert by_id['b']['workplace_size'] == '30人未満'
+    assert by_id['c']['workplace_size'] == '30人以上'
+    assert by_id['d']['gyoumukaizen_status'] == '適用可能'
+    assert by_id['d']['recommended_agents'] == 'gyoumukaizen career-up'
+    assert by_id['e']['gyoumukaizen_status'] == '要件不適合'
+    assert by_id['e']['recommended_agents'] == 'career-up'
+
+
+def test_stream_csv_output(service):
+    output = ''.join(service.stream_results('id,従業員数\na,10\nb,500\n'))
+    lines = output.strip().splitlines()
+
+    assert lines[0] == ','.join(OUTPUT_COLUMNS)
+    assert len(lines) == 3
+    assert lines[2].startswith('b,,500,30人以上,要件不適合,可能性あり,career-up')
+
+
+def test_stream_jsonl_output_is_chunked(service, monkeypatch):
+    import bulk_screening
+    monkeypatch.setattr(bulk_screening, 'STREAM_CHUNK_ROWS', 2)
+
+    text = 'id,従業員数\n' + ''.join(f"c{i},{i}\n" for i in range(5))
+    chunks = list(service.stream_results(text, output_format='jsonl'))
+    rows = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+
+    assert len(chunks) == 3
+    assert [row['company_id'] for row in rows] == [f"c{i}" for i in range(5)]
+
+
+def test_unsupported_output_format(service):
+    with pytest.raises(ValueError):
+        service.stream_results('id,従業員数\na,1\n', output_format='xlsx')
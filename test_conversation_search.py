@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""会話履歴の全文検索インデックス（conversation_search）のテスト"""
+
+import os
+import sys
+from datetime import datetime
+
+# srcディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import pytest
+
+pytest.importorskip('firebase_admin')
+
+from conversation_search import (ConversationSearchIndex, MAX_FIELD_TRANSFORMS, SEARCH_COLLECTION,
+                                 normalize, bigrams, token_field, make_snippet)
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, ref, data, merge=False):
+        self.writes.append((ref, data, merge))
+
+    def commit(self):
+        self.db.commits.append(self.writes)
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+
+    def document(self, doc_id):
+        return f"{self.name}/{doc_id}"
+
+
+class FakeDB:
+    """バッチで書き込んだ内容をコミット単位で記録する"""
+
+    def __init__(self):
+        self.commits = []
+
+    def collection(self, name):
+        return FakeCollection(name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+# === 正規化 ===
+
+def test_normalize_width_case_and_symbols():
+    # NFKC で全角英数・半角カナをそろえ、小文字にする
+    assert normalize('ＡＢＣ１２３') == 'abc123'
+    assert normalize('ｷｬﾘｱｱｯﾌﾟ') == 'キャリアアップ'
+    # 記号・空白・句読点は除く
+    assert normalize('助成金、「申請」。 期限！') == '助成金申請期限'
+    assert normalize(None) == ''
+
+
+def test_normalize_strips_markdown():
+    assert normalize('## **業務改善**助成金\n- `30円` コース\n> [要件](url)') == '業務改善助成金30円コース要件url'
+
+
+def test_bigrams():
+    assert bigrams('助成金') == {'助成', '成金'}
+    assert bigrams('Ａ-b') == {'ab'}
+    assert token_field('ab') == 't6162'
+
+
+# === スニペット ===
+
+def test_snippet_maps_normalized_offsets_back_to_original():
+    # 正規化で長さが変わる文字（㍿ → 株式会社、ﬁ → fi）の後ろでも元の位置を切り出す
+    text = '㍿ﬁle の **正社員化** コース'
+    assert make_snippet(text, '正社員化', radius=0) == '…正社員化…'
+    assert make_snippet(text, '株式会社', radius=0) == '㍿…'
+    assert make_snippet(text, '会社fi', radius=0) == '㍿ﬁ…'
+    assert make_snippet(text, 'ＦＩＬＥ', radius=0) == '…ﬁle…'
+    # 記号をまたいだ検索語も元の文字列の範囲で返す
+    assert make_snippet('**業務**改善', '業務改善', radius=0) == '…業務**改善'
+
+
+def test_snippet_radius_and_ellipsis():
+    text = 'あ' * 50 + '助成金' + 'い' * 50
+    snippet = make_snippet(text, '助成金', radius=5)
+    assert snippet == '…あああああ助成金いいいいい…'
+    assert make_snippet(text, '補助金') is None
+    assert make_snippet(text, '！？') is None
+
+
+# === インデックス ===
+
+def test_single_character_query_has_no_candidates():
+    # 1文字ではバイグラムが作れないので Firestore を読まずに空を返す
+    index = ConversationSearchIndex(db=None, buckets=4)
+    assert index.candidates('user', '金') == []
+    assert index.candidates('user', '「」') == []
+
+
+def test_index_entries_splits_transforms_per_document():
+    db = FakeDB()
+    index = ConversationSearchIndex(db, buckets=1)
+    # 重複しない漢字の並び: 1,199 個のバイグラムがすべて同じバケットに入る
+    text = ''.join(chr(0x4e00 + i) for i in range(MAX_FIELD_TRANSFORMS * 2 + 200))
+    tokens = bigrams(text)
+
+    written = index.index_entries('user', 'conv', [(1, text)], when=datetime(2025, 4, 1))
+
+    assert written == 1
+    assert len(db.commits) == 3
+    fields = set()
+    for writes in db.commits:
+        # 1回のコミットで同じ文書を書き込むのは1回だけ、フィールド変換は上限以下
+        assert len(writes) == 1
+        ref, data, merge = writes[0]
+        assert ref == f"{SEARCH_COLLECTION}/user_202504_00"
+        assert merge
+        assert (data['user_id'], data['month'], data['bucket']) == ('user', '202504', 0)
+        assert len(data['p']) <= MAX_FIELD_TRANSFORMS
+        fields.update(data['p'])
+    assert fields == {token_field(token) for token in tokens}
+
+
+def test_index_entries_writes_each_bucket_once_per_commit():
+    db = FakeDB()
+    index = ConversationSearchIndex(db, buckets=8)
+
+    written = index.index_entries('user', 'conv', [(0, '助成金の申請'), (1, '業務改善助成金')])
+
+    assert len(db.commits) == 1
+    refs = [ref for ref, _, _ in db.commits[0]]
+    assert len(refs) == len(set(refs)) == written
+    assert index.index_entries('user', 'conv', [(1, '。')]) == 0
+    assert len(db.commits) == 1
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""期間・期限計算（deadline_calculator）のテスト"""
+
+import os
+import sys
+from datetime import date, datetime
+
+# srcディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import pytest
+
+import deadline_calculator as dc
+
+
+@pytest.mark.parametrize('value', ['2025-04-01', '2025/04/01', '2025年4月1日', '2025-04-01T09:30:00',
+                                   date(2025, 4, 1), datetime(2025, 4, 1, 9, 30)])
+def test_parse_date_formats(value):
+    assert dc.parse_date(value) == date(2025, 4, 1)
+
+
+def test_parse_date_invalid():
+    with pytest.raises(ValueError):
+        dc.parse_date('4月1日')
+
+
+def test_previous_and_next_day_cross_month():
+    assert dc.previous_day('2025-03-01') == date(2025, 2, 28)
+    assert dc.previous_day('2024-03-01') == date(2024, 2, 29)
+    assert dc.next_day('2025-12-31') == date(2026, 1, 1)
+
+
+def test_add_months_clamps_to_month_end():
+    assert dc.add_months('2025-01-31', 1) == date(2025, 2, 28)
+    assert dc.add_months('2024-01-31', 1) == date(2024, 2, 29)
+    assert dc.add_months('2025-11-15', 3) == date(2026, 2, 15)
+    assert dc.add_months('2025-03-31', -1) == date(2025, 2, 28)
+
+
+def test_within_excludes_base_day():
+    # 1月31日から1ヶ月以内: 起算日2月1日 → 3月1日の前日に満了
+    assert dc.calculate_within('2025-01-31', months=1) == (date(2025, 2, 1), date(2025, 2, 28))
+    # 起算日1月31日、2月に応当日がないので2月末日に満了
+    assert dc.calculate_within('2025-01-30', months=1) == (date(2025, 1, 31), date(2025, 2, 28))
+    assert dc.calculate_within('2025-04-01', days=10) == (date(2025, 4, 2), date(2025, 4, 11))
+
+
+def test_within_including_base_day():
+    assert dc.calculate_within('2025-04-01', months=2, include_base_day=True) == (date(2025, 4, 1), date(2025, 5, 31))
+
+
+def test_within_months_and_days():
+    start, end = dc.calculate_within('2025-04-01', months=1, days=5)
+    assert start == date(2025, 4, 2)
+    assert end == date(2025, 5, 6)
+
+
+def test_window_after_months():
+    # 6ヶ月経過後2ヶ月以内（docstring の例）
+    assert dc.calculate_window('2024-01-15', 6, 2) == (date(2024, 7, 16), date(2024, 9, 15))
+
+
+def test_calculate_results_and_explanations():
+    result = dc.calculate('within', '2025-01-31', months=1)
+    assert result['start_date'] == '2025-02-01'
+    assert result['deadline'] == '2025-02-28'
+    assert '2025年2月28日' in result['explanation']
+
+    result = dc.calculate('previous_day', '2025年4月1日')
+    assert result['date'] == '2025-03-31'
+    assert result['base_date_ja'] == '2025年4月1日'
+
+    result = dc.calculate('window', '2024-01-15', after_months=6, within_months=2)
+    assert (result['start_date'], result['deadline']) == ('2024-07-16', '2024-09-15')
+
+
+def test_calculate_unknown_operation():
+    with pytest.raises(ValueError):
+        dc.calculate('end_of_month', '2025-04-01')
+
+
+def test_resolve_deadline_rule():
+    assert dc.resolve_deadline_rule(None) is None
+    assert dc.resolve_deadline_rule({'months': 1}) is None
+    assert dc.resolve_deadline_rule({'base_date': '2025-01-31', 'months': '1'}) == '2025-02-28'
+    # after_months があれば window として扱う
+    assert dc.resolve_deadline_rule({'base_date': '2024-01-15', 'after_months': 6, 'within_months': 2}) == '2024-09-15'
+    assert dc.resolve_deadline_rule({'base_date': '2025-04-01', 'operation': 'next_day'}) == '2025-04-02'
+
+
+@pytest.mark.parametrize('rule', ['2025-04-01', ['2025-04-01'], 30])
+def test_resolve_deadline_rule_rejects_non_dict(rule):
+    with pytest.raises(ValueError):
+        dc.resolve_deadline_rule(rule)
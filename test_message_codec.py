@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""メッセージ本文の圧縮保存（message_codec）のテスト"""
+
+import os
+import sys
+import zlib
+
+# srcディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import pytest
+
+from message_codec import MessageCodec, FORMAT_ZLIB, FORMAT_ZSTD, ZSTD_ENABLED
+
+# 繰り返しの多い長いMarkdown（よく縮む）
+LONG_TEXT = '## 業務改善助成金の申請要件\n\n- 事業場内最低賃金を30円以上引き上げること\n' * 50
+
+
+def test_below_threshold_is_stored_as_is():
+    codec = MessageCodec(min_bytes=1024)
+    text = 'こんにちは' * 10  # 150バイト
+    assert codec.encode(text) is text
+
+
+def test_non_string_and_disabled_pass_through():
+    codec = MessageCodec(min_bytes=1)
+    assert codec.encode(None) is None
+    assert codec.encode(123) == 123
+    assert MessageCodec(algorithm='none', min_bytes=1).encode(LONG_TEXT) is LONG_TEXT
+
+
+def test_zlib_round_trip_with_flag_byte():
+    codec = MessageCodec(algorithm='zlib', min_bytes=1024)
+    encoded = codec.encode(LONG_TEXT)
+
+    assert isinstance(encoded, bytes)
+    assert encoded[0] == FORMAT_ZLIB
+    assert zlib.decompress(encoded[1:]).decode('utf-8') == LONG_TEXT
+    assert len(encoded) < len(LONG_TEXT.encode('utf-8'))
+    assert codec.decode(encoded) == LONG_TEXT
+    # Firestore から読んだ値（bytearray / memoryview）でも戻せる
+    assert codec.decode(bytearray(encoded)) == LONG_TEXT
+    assert codec.decode(memoryview(encoded)) == LONG_TEXT
+
+
+def test_incompressible_text_falls_back_to_string():
+    # 短い本文は zlib のヘッダー分だけ大きくなる
+    text = '助成金'
+    codec = MessageCodec(algorithm='zlib', min_bytes=1)
+    assert len(bytes([FORMAT_ZLIB]) + zlib.compress(text.encode('utf-8'))) >= len(text.encode('utf-8'))
+    assert codec.encode(text) is text
+
+
+def test_unknown_flag_raises_value_error():
+    codec = MessageCodec()
+    with pytest.raises(ValueError):
+        codec.decode(bytes([0x7f]) + b'payload')
+
+
+def test_decode_legacy_string_value():
+    codec = MessageCodec()
+    # 圧縮導入前に保存された文字列・空の値はそのまま返す
+    assert codec.decode('従来の本文') == '従来の本文'
+    assert codec.decode(None) is None
+    assert codec.decode(b'') == ''
+
+
+@pytest.mark.skipif(ZSTD_ENABLED, reason='zstandard がインストールされている')
+def test_zstd_falls_back_to_zlib_without_zstandard():
+    codec = MessageCodec(algorithm='zstd', min_bytes=1024)
+    assert codec.algorithm == 'zlib'
+    assert codec.encode(LONG_TEXT)[0] == FORMAT_ZLIB
+    with pytest.raises(ValueError):
+        codec.decode(bytes([FORMAT_ZSTD]) + b'payload')
+
+
+@pytest.mark.skipif(not ZSTD_ENABLED, reason='zstandard が必要')
+def test_zstd_round_trip_with_flag_byte():
+    codec = MessageCodec(algorithm='zstd', min_bytes=1024)
+    encoded = codec.encode(LONG_TEXT)
+    assert encoded[0] == FORMAT_ZSTD
+    assert codec.decode(encoded) == LONG_TEXT
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""賃金台帳CSVの集計（payroll_analytics）のテスト"""
+
+import io
+import os
+import sys
+import json
+
+# srcディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import numpy as np
+import pytest
+
+from payroll_analytics import PayrollAnalyzer, format_payroll_summary, validate_payroll_summary
+
+HEADER = 'employee_id,wage_type,base_wage,allowances,commute_allowance,family_allowance,attendance_allowance,' \
+         'daily_hours,monthly_hours,hours_worked,allowances_include_excluded\n'
+
+
+def hourly_of(rows, analyzer=None):
+    analyzer = analyzer or PayrollAnalyzer()
+    columns = analyzer.read_columns(io.StringIO(HEADER + ''.join(row + '\n' for row in rows)))
+    return analyzer.hourly_wages(columns)
+
+
+@pytest.mark.parametrize('row, expected', [
+    # 月給制: 通勤手当は別の列なので基本給から差し引かない
+    ('m1,monthly,200000,,,,,,160,,', 1250.0),
+    ('m2,monthly,200000,,10000,,,,160,,', 1250.0),
+    ('m3,monthly,200000,16000,10000,5000,3000,,160,,', 1350.0),
+    # 手当の合計に除外手当を含めて入力した行だけ差し引く
+    ('m4,monthly,200000,26000,10000,,,,160,,はい', 1350.0),
+    ('m5,monthly,200000,8000,10000,,,,160,,1', 1250.0),
+    # 時給制: 手当がなければ月の所定労働時間がなくても換算できる
+    ('h1,hourly,1100,,,,,,,,', 1100.0),
+    ('h2,hourly,1100,,5000,,,,,,', 1100.0),
+    ('h3,hourly,1100,16000,5000,,,,160,,', 1200.0),
+    # 日給制（1日の所定労働時間の既定値は8時間）
+    ('d1,daily,9600,,,,,,,,', 1200.0),
+    ('d2,daily,9600,,3000,2000,,7.5,,,', 1280.0),
+    ('d3,daily,9600,8000,3000,,,,160,,', 1250.0),
+    # 出来高払制: 総労働時間で割る
+    ('p1,piece,180000,,,,,,,150,', 1200.0),
+    ('p2,piece,180000,,10000,,,,,150,', 1200.0),
+    ('p3,piece,180000,16000,10000,,,,160,150,含む', 1237.5),
+])
+def test_hourly_wages_by_wage_type(row, expected):
+    assert hourly_of([row])[0] == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('row', [
+    'x1,monthly,200000,,,,,,,,',          # 月の所定労働時間がない
+    'x2,hourly,1100,16000,,,,,,,',        # 手当はあるが月の所定労働時間がない
+    'x3,piece,180000,,,,,,,,',            # 総労働時間がない
+    'x4,hourly,0,,,,,,,,',
+])
+def test_hourly_wages_invalid_rows(row):
+    assert np.isnan(hourly_of([row])[0])
+
+
+def test_default_monthly_hours():
+    analyzer = PayrollAnalyzer(default_monthly_hours=160)
+    assert hourly_of(['m1,monthly,200000,,,,,,,,', 'h1,hourly,1100,16000,,,,,,,'], analyzer) == pytest.approx([1250.0, 1200.0])
+
+
+def test_japanese_headers_and_wage_types():
+    csv_text = '社員番号,給与形態,基本給,手当,通勤手当,月平均所定労働時間\n' \
+               'A,月給,"200,000円",,"10,000",160\n' \
+               'B,時給,1100,,5000,\n'
+    analyzer = PayrollAnalyzer()
+    hourly = analyzer.hourly_wages(analyzer.read_columns(io.StringIO(csv_text)))
+    assert hourly == pytest.approx([1250.0, 1100.0])
+
+
+def test_missing_base_wage_column():
+    with pytest.raises(ValueError):
+        PayrollAnalyzer().read_columns(io.StringIO('employee_id,allowances\n1,100\n'))
+
+
+def test_analyze_summary():
+    csv_text = HEADER + 'a,hourly,1000,,5000,,,,,,\n' \
+                        'b,hourly,1020,,,,,,,,\n' \
+                        'c,monthly,200000,,10000,,,,160,,\n' \
+                        'd,monthly,200000,,,,,,,,\n'
+    summary = PayrollAnalyzer().analyze(io.StringIO(csv_text), regional_min_wage=1010)
+
+    assert summary['worker_count'] == 4
+    assert summary['analyzed_count'] == 3
+    assert summary['invalid_employee_ids'] == ['d']
+    assert summary['workplace_min_wage'] == 1000
+    assert summary['lowest_paid_employee_ids'] == ['a']
+    assert summary['workers_below_regional_min'] == 1
+    assert summary['gap_to_regional_min'] == -10
+    thresholds = {item['course']: item['workers_below'] for item in summary['course_thresholds']}
+    assert thresholds == {'30円コース': 2, '45円コース': 2, '60円コース': 2, '90円コース': 2}
+
+    text = format_payroll_summary(summary)
+    assert '事業場内最低賃金（時間換算・対象外賃金除外後）：1,000円' in text
+
+
+def test_analyze_after_increase():
+    csv_text = 'employee_id,wage_type,base_wage,base_wage_after,monthly_hours\n' \
+               'a,hourly,1000,1045,\n' \
+               'b,hourly,1100,,\n' \
+               'c,monthly,200000,208000,160\n'
+    after = PayrollAnalyzer().analyze(io.StringIO(csv_text))['after_increase']
+
+    assert after['workplace_min_wage'] == 1045
+    assert after['min_wage_increase'] == 45
+    assert after['gyoumukaizen_course'] == '45円コース'
+    assert after['raised_workers'] == 2
+    assert after['workers_by_raise_rate']['4%以上'] == 2
+    assert after['workers_below_3pct'] == 1
+
+
+def test_analyze_without_valid_rows():
+    with pytest.raises(ValueError):
+        PayrollAnalyzer().analyze(io.StringIO(HEADER + 'a,monthly,200000,,,,,,,,\n'))
+
+
+def test_validate_payroll_summary_round_trip():
+    csv_text = 'employee_id,wage_type,base_wage,base_wage_after\na,hourly,1000,1045\nb,hourly,1100,\n'
+    summary = PayrollAnalyzer().analyze(io.StringIO(csv_text), regional_min_wage=1000)
+    # クライアントを経由した値（JSON）でも同じ要約になる
+    received = json.loads(json.dumps(summary))
+    received['note'] = '無視される項目'
+
+    validated = validate_payroll_summary(received)
+    assert 'note' not in validated
+    assert format_payroll_summary(validated) == format_payroll_summary(summary)
+
+
+@pytest.mark.parametrize('summary', [
+    'not a dict',
+    {'worker_count': 3},
+    {'workplace_min_wage': '1000'},
+    {'workplace_min_wage': 1000, 'worker_count': -1},
+    {'workplace_min_wage': 1000, 'regional_min_wage': 1055},
+    {'workplace_min_wage': 1000, 'course_thresholds': [{'course': '1000円コース', 'target_wage': 1, 'workers_below': 1}]},
+    {'workplace_min_wage': 1000, 'after_increase': {'workplace_min_wage': 1045}},
+])
+def test_validate_payroll_summary_rejects_bad_input(summary):
+    with pytest.raises(ValueError):
+        validate_payroll_summary(summary)
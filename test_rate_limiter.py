@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""スライディングウィンドウ方式のレート制限（rate_limiter）のテスト"""
+
+import os
+import sys
+import ipaddress
+
+# srcディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import pytest
+
+pytest.importorskip('flask')
+
+from rate_limiter import MemoryBackend, SQLiteBackend, RateLimiter
+
+WINDOW = 60.0
+LIMIT = 3
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryBackend()
+    return SQLiteBackend(str(tmp_path / 'rate_limits.sqlite3'))
+
+
+def hits(backend, key, now, count):
+    return [backend.hit(key, LIMIT, WINDOW, now) for _ in range(count)]
+
+
+def test_limit_within_one_window(backend):
+    results = hits(backend, 'k', 120.0, LIMIT + 1)
+
+    assert [result.allowed for result in results] == [True, True, True, False]
+    assert [result.remaining for result in results] == [2, 1, 0, 0]
+    # 現在の窓だけで上限に達しているので窓の終わりまで待つ
+    assert results[-1].retry_after == 60
+
+
+def test_previous_window_is_weighted_by_elapsed_ratio(backend):
+    hits(backend, 'k', 120.0, LIMIT)
+
+    # 次の窓の半分: 直前の窓の3回 × 0.5 = 1.5回と数える
+    first, second = hits(backend, 'k', 210.0, 2)
+    assert first.allowed
+    assert not second.allowed
+    # 直前の窓の按分が 3 × (1 - 2/3) = 1 になる 220秒まで待つ
+    assert second.retry_after == 10
+
+
+def test_counts_expire_after_two_windows(backend):
+    hits(backend, 'k', 120.0, LIMIT)
+    assert backend.hit('k', LIMIT, WINDOW, 240.0).allowed
+    assert backend.hit('k', LIMIT, WINDOW, 240.0).remaining == 1
+
+
+def test_keys_are_independent(backend):
+    hits(backend, 'a', 120.0, LIMIT)
+    assert not backend.hit('a', LIMIT, WINDOW, 120.0).allowed
+    assert backend.hit('b', LIMIT, WINDOW, 120.0).allowed
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_keys=2)
+    hits(backend, 'a', 120.0, LIMIT)
+    backend.hit('b', LIMIT, WINDOW, 120.0)
+    backend.hit('a', LIMIT, WINDOW, 120.0)
+    backend.hit('c', LIMIT, WINDOW, 120.0)
+
+    assert backend.size() == 2
+    # a は直前に使われたので残り、上限に達したまま
+    assert not backend.hit('a', LIMIT, WINDOW, 120.0).allowed
+    # b は破棄されたので最初から数え直す
+    assert backend.hit('b', LIMIT, WINDOW, 120.0).remaining == 2
+
+
+class FailingBackend:
+    name = 'failing'
+
+    def hit(self, key, limit, window, now):
+        raise RuntimeError('store unavailable')
+
+    def size(self):
+        raise RuntimeError('store unavailable')
+
+
+def test_backend_errors_fail_open():
+    limiter = RateLimiter(FailingBackend())
+    result = limiter.hit('k', LIMIT, WINDOW)
+
+    assert result.allowed
+    stats = limiter.get_stats()
+    assert stats['errors'] == 1
+    assert stats['keys'] is None
+
+
+@pytest.mark.parametrize('forwarded, hops, trusted, expected', [
+    ('', 1, [], '192.0.2.1'),
+    ('198.51.100.7', 1, [], '198.51.100.7'),
+    # クライアントが付けた先頭の値は信用しない
+    ('203.0.113.9, 198.51.100.7', 1, [], '198.51.100.7'),
+    ('198.51.100.7', 2, [], '192.0.2.1'),
+    ('198.51.100.7', 0, [], '192.0.2.1'),
+    # 追加で信頼するプロキシのアドレスは読み飛ばす
+    ('203.0.113.9, 198.51.100.7, 10.0.0.5', 1, ['10.0.0.0/8'], '198.51.100.7'),
+    ('not-an-ip', 1, [], '192.0.2.1'),
+])
+def test_client_ip(forwarded, hops, trusted, expected):
+    limiter = RateLimiter(MemoryBackend(), trusted_proxy_hops=hops,
+                          trusted_proxies=[ipaddress.ip_network(network) for network in trusted])
+    environ = {'REMOTE_ADDR': '192.0.2.1', 'HTTP_X_FORWARDED_FOR': forwarded}
+    assert limiter.client_ip(environ) == expected
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""助成金額の算定（subsidy_calculator）のテスト"""
+
+import os
+import sys
+
+# srcディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import pytest
+
+import subsidy_calculator as sc
+
+
+# === 業務改善助成金 ===
+
+@pytest.mark.parametrize('wage_increase, raised_workers, employees, expected_course, expected_limit', [
+    (30, 1, 10, '30円コース', 600_000),
+    (50, 3, 10, '45円コース', 1_100_000),      # 該当する最も高いコース
+    (50, 4, 10, '45円コース', 1_400_000),
+    (60, 7, 40, '60円コース', 2_300_000),      # 7人以上
+    (90, 6, 30, '90円コース', 2_700_000),      # 30人ちょうどは30人以上
+])
+def test_gyoumukaizen_upper_limit(wage_increase, raised_workers, employees, expected_course, expected_limit):
+    result = sc.calculate_gyoumukaizen(wage_increase, raised_workers, employees)
+    assert result['course'] == expected_course
+    assert result['upper_limit'] == expected_limit
+    assert 'amount' not in result
+
+
+def test_gyoumukaizen_special_business_needs_ten_workers():
+    assert sc.calculate_gyoumukaizen(90, 10, 40, special_business=True)['upper_limit'] == 6_000_000
+    assert sc.calculate_gyoumukaizen(30, 10, 10, special_business=True)['upper_limit'] == 1_300_000
+
+    result = sc.calculate_gyoumukaizen(90, 9, 40, special_business=True)
+    assert result['special_business'] is False
+    assert result['upper_limit'] == 4_500_000
+
+
+def test_gyoumukaizen_rate_and_amount():
+    # 1,000円未満は4/5、上限額で頭打ち
+    result = sc.calculate_gyoumukaizen(30, 1, 10, current_min_wage=950, eligible_cost=1_000_000)
+    assert result['subsidy_rate'] == '4/5'
+    assert result['amount'] == 600_000
+
+    result = sc.calculate_gyoumukaizen(30, 1, 10, current_min_wage=950, eligible_cost=500_000)
+    assert result['amount'] == 400_000
+
+    # 1,000円以上は3/4、1,000円未満の端数は切り捨て
+    result = sc.calculate_gyoumukaizen(30, 1, 10, current_min_wage=1000, eligible_cost=150_999)
+    assert result['subsidy_rate'] == '3/4'
+    assert result['amount'] == 113_000
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'wage_increase': 29, 'raised_workers': 1, 'workplace_employees': 10},
+    {'wage_increase': 30, 'raised_workers': 0, 'workplace_employees': 10},
+    {'wage_increase': 30, 'raised_workers': 1, 'workplace_employees': 10, 'current_min_wage': 950, 'eligible_cost': 99_999},
+])
+def test_gyoumukaizen_invalid_input(kwargs):
+    with pytest.raises(ValueError):
+        sc.calculate_gyoumukaizen(**kwargs)
+
+
+def test_gyoumukaizen_course_summary():
+    assert sc.gyoumukaizen_course_summary(10)[0] == '30円コース: 60～130万円'
+    assert sc.gyoumukaizen_course_summary(40)[-1] == '90円コース: 90～600万円'
+
+
+# === キャリアアップ助成金 ===
+
+def test_career_up_seishain_caps_workers_and_adds_system():
+    result = sc.calculate_career_up('seishain', workers=25, priority_target=True,
+                                    additions=['new_conversion_system'])
+    assert result['amount'] == 800_000 * 20 + 200_000
+    assert len(result['notes']) == 1
+
+    result = sc.calculate_career_up('seishain', is_sme=False, conversion_type='muki', workers=2)
+    assert result['amount'] == 150_000 * 2
+    assert result['company_size'] == '大企業'
+
+
+def test_career_up_chingin_kaitei_rate_bands():
+    assert sc.calculate_career_up('chingin_kaitei', raise_rate=3)['amount'] == 40_000
+    assert sc.calculate_career_up('chingin_kaitei', raise_rate=4.5, is_sme=False, workers=2)['amount'] == 66_000
+    assert sc.calculate_career_up('chingin_kaitei', raise_rate=10, workers=3,
+                                  additions=['job_evaluation', 'raise_system'])['amount'] == 70_000 * 3 + 400_000
+
+
+def test_career_up_flat_courses():
+    assert sc.calculate_career_up('kyotsuka')['amount'] == 600_000
+    assert sc.calculate_career_up('shoyo_taishoku', is_sme=False)['amount'] == 300_000
+    assert sc.calculate_career_up('shoyo_taishoku', additions=['both_introduced'])['amount'] == 568_000
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'course': 'chingin_kaitei'},
+    {'course': 'chingin_kaitei', 'raise_rate': 2.9},
+    {'course': 'seishain', 'conversion_type': 'haken'},
+    {'course': 'seishain', 'additions': ['job_evaluation']},
+    {'course': 'unknown'},
+])
+def test_career_up_invalid_input(kwargs):
+    with pytest.raises(ValueError):
+        sc.calculate_career_up(**kwargs)
+
+
+# === 共通入口 ===
+
+def test_calculate_ignores_unrelated_and_empty_params():
+    result = sc.calculate('career_up', course='kyotsuka', wage_increase=30, is_sme=None)
+    assert result['amount'] == 600_000
+
+    result = sc.calculate('gyoumukaizen', wage_increase=45, raised_workers=2, workplace_employees=5, course='seishain')
+    assert result['upper_limit'] == 1_100_000
+
+
+def test_calculate_unknown_subsidy():
+    with pytest.raises(ValueError):
+        sc.calculate('koyou_chousei')
+
+
+@pytest.mark.parametrize('params', [
+    {'subsidy': 'career_up', 'course': 'seishain', 'is_sme': 'false'},
+    {'subsidy': 'career_up', 'course': 'seishain', 'priority_target': 1},
+    {'subsidy': 'gyoumukaizen', 'wage_increase': 90, 'raised_workers': 10, 'workplace_employees': 40,
+     'special_business': 'true'},
+])
+def test_calculate_rejects_non_boolean_flags(params):
+    with pytest.raises(ValueError):
+        sc.calculate(**params)
+
+
+def test_calculate_accepts_boolean_flags():
+    assert sc.calculate('career_up', course='seishain', is_sme=False)['amount'] == 300_000